@@ -0,0 +1,129 @@
+"""
+Benchmark ALS training time and memory against the number of tracked views.
+
+For every event volume, a fresh process generates synthetic views over a synthetic
+catalog (see synthetic.py) and reports the time to build the sparse user x item matrix,
+the training time, the peak RSS added by training, and the latency of the item -> item
+and fold-in user -> item queries. Users have a taste for one cluster of videos and
+video popularity is Zipf-like, so the matrix has the skew of real view logs.
+
+    python -m benchmarks.bench_als [--events 10000,100000,1000000] [--catalog 100000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_EVENTS = '10000,100000,1000000'
+# Average views per user, and videos per taste cluster
+VIEWS_PER_USER = 20
+CLUSTER_SIZE = 200
+# Share of a user's views taken from their cluster (the rest follows global popularity)
+CLUSTER_SHARE = 0.8
+
+
+def synthetic_views(n_events, n_videos, seed=0):
+    """(user index, catalog row) of `n_events` views."""
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_events // VIEWS_PER_USER)
+    # Heavy users watch much more than the median user
+    activity = rng.lognormal(0, 1, size=n_users)
+    users = rng.choice(n_users, size=n_events, p=activity / activity.sum())
+    popularity = 1 / np.arange(1, n_videos + 1) ** 0.8
+    popular = rng.permutation(n_videos)[rng.choice(n_videos, size=n_events, p=popularity / popularity.sum())]
+    n_clusters = max(1, n_videos // CLUSTER_SIZE)
+    clusters = rng.permutation(n_videos)[:n_clusters * CLUSTER_SIZE].reshape(n_clusters, -1)
+    taste = rng.integers(n_clusters, size=n_users)
+    in_cluster = clusters[taste[users], rng.integers(clusters.shape[1], size=n_events)]
+    rows = np.where(rng.random(n_events) < CLUSTER_SHARE, in_cluster, popular)
+    return users, rows
+
+
+def measure(n_events, n_videos, factors, iterations, queries, seed=0):
+    """Metrics of one event volume, in the process this runs in."""
+    from benchmarks.synthetic import generate_catalog
+    from src.services import als
+    from src.services.catalog import Catalog
+    from src.services.neighbors import peak_rss_mb
+
+    catalog = Catalog.from_frame(generate_catalog(n_videos, seed))
+    users, rows = synthetic_views(n_events, len(catalog), seed)
+    user_ids = [f'user-{user}' for user in users]
+    video_ids = np.array(catalog.video_id_list(), dtype=object)[rows].tolist()
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    user_names, item_rows, interactions = als.build_interactions(user_ids, video_ids, catalog)
+    matrix_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    user_factors, item_factors = als.train_als(interactions, factors=factors, iterations=iterations, seed=seed)
+    train_seconds = time.perf_counter() - start
+    peak_rss = peak_rss_mb()
+    model = als.ALSModel(user_names, user_factors, item_rows, item_factors, interactions, catalog)
+
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(item_rows, size=queries)
+    start = time.perf_counter()
+    for row in sources:
+        model.similar_items([row], 10)
+    similar_ms = (time.perf_counter() - start) / queries * 1000
+    start = time.perf_counter()
+    for i in range(queries):
+        model.recommend_from_rows(rng.choice(item_rows, size=VIEWS_PER_USER), 10)
+    fold_in_ms = (time.perf_counter() - start) / queries * 1000
+    return {
+        'events': n_events,
+        'views': int(interactions.nnz),
+        'users': len(user_names),
+        'items': len(item_rows),
+        'matrix_seconds': matrix_seconds,
+        'train_seconds': train_seconds,
+        'train_rss_mb': peak_rss - rss_before,
+        'peak_rss_mb': peak_rss,
+        'similar_items_ms': similar_ms,
+        'fold_in_ms': fold_in_ms,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', default=DEFAULT_EVENTS, help="Comma-separated numbers of views")
+    parser.add_argument('--catalog', type=int, default=100_000, help="Videos in the synthetic catalog")
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200, help="Queries timed per query type")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Also write the results as JSON")
+    parser.add_argument('--measure', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure, args.catalog, args.factors, args.iterations, args.queries, args.seed)))
+        return 0
+
+    print(f"catalog={args.catalog} factors={args.factors} iterations={args.iterations}")
+    results = []
+    for n_events in [int(n) for n in args.events.split(',')]:
+        # A fresh process per volume, so the peak RSS is that of this volume alone
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.bench_als', '--measure', str(n_events),
+                                '--catalog', str(args.catalog), '--factors', str(args.factors),
+                                '--iterations', str(args.iterations), '--queries', str(args.queries),
+                                '--seed', str(args.seed)], check=True, stdout=subprocess.PIPE, text=True)
+        metrics = json.loads(child.stdout.strip().splitlines()[-1])
+        results.append(metrics)
+        print(f"  events={n_events:>9} views={metrics['views']:>9} users={metrics['users']:>7} "
+              f"items={metrics['items']:>6} matrix={metrics['matrix_seconds']:.2f}s "
+              f"train={metrics['train_seconds']:.2f}s (+{metrics['train_rss_mb']:.0f}MB RSS) "
+              f"similar={metrics['similar_items_ms']:.2f}ms fold-in={metrics['fold_in_ms']:.2f}ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,85 @@
+"""
+Recall/latency benchmark for the IVF semantic index.
+
+For a sample of query rows, compares IVFIndex.search at several nprobe values with an
+exact brute-force scan over the same embeddings and reports recall@k and per-query
+latency. Every embedding store (float32, and the float16 / int8 codes whose shortlist is
+re-ranked in full precision, see quantization.py) is measured over the same inverted
+lists, with the memory of the vectors its coarse pass scans. Uses the built artifacts,
+or a synthetic clustered catalog with --synthetic N.
+
+    python -m benchmarks.bench_ann [--k 10] [--nprobe 1,2,4,8,16,32] [--queries 500] [--synthetic 100000]
+                                   [--stores float32,float16,int8]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.services.ann import IVFIndex, brute_force_search
+from src.services.encoders import normalize_rows
+from src.services.quantization import quantize
+
+
+def synthetic_embeddings(n_rows, dim=384, n_topics=200, seed=0):
+    """Unit vectors scattered around random topic centers, like embeddings of a real catalog."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(n_topics, size=n_rows)] + 0.6 * rng.standard_normal((n_rows, dim)).astype(np.float32)
+    return normalize_rows(vectors)
+
+
+def _latency(fn, queries):
+    timings = np.empty(len(queries))
+    results = []
+    for i, row in enumerate(queries):
+        start = time.perf_counter()
+        results.append(fn(row))
+        timings[i] = time.perf_counter() - start
+    return results, timings * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', default='1,2,4,8,16,32')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--synthetic', type=int, default=0, help='benchmark a synthetic catalog of N rows')
+    parser.add_argument('--stores', default='float32,float16,int8', help='embedding stores to compare')
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_embeddings(args.synthetic)
+        start = time.perf_counter()
+        index = IVFIndex.build(vectors)
+        print(f"built IVF index (nlist={index.nlist}) for {len(vectors)} rows in {time.perf_counter() - start:.1f}s")
+    else:
+        from src.services.artifacts import load_or_build_artifacts
+        index = load_or_build_artifacts()['semantic_index']
+        vectors = index.vectors
+    print(f"rows={len(vectors)} dim={vectors.shape[1]} nlist={index.nlist} k={args.k}")
+
+    queries = np.random.default_rng(1).choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    exact, exact_ms = _latency(lambda row: brute_force_search(vectors, vectors[row], args.k, exclude=row)[0], queries)
+    print(f"  brute force      recall=1.000  p50={np.percentile(exact_ms, 50):7.3f}ms  "
+          f"p99={np.percentile(exact_ms, 99):7.3f}ms")
+
+    for store in args.stores.split(','):
+        codes = quantize(np.asarray(vectors), store) if store != 'float32' else None
+        store_index = IVFIndex(vectors, index.centroids, index.offsets, index.rows, codes=codes)
+        store_mb = (codes.nbytes if codes is not None else vectors.nbytes) / (1024 * 1024)
+        print(f"  store={store} ({store_mb:.1f}MB scanned vectors)")
+        for nprobe in [int(n) for n in args.nprobe.split(',')]:
+            if nprobe > index.nlist:
+                break
+            approx, approx_ms = _latency(
+                lambda row: store_index.search(vectors[row], args.k, nprobe=nprobe, exclude=row)[0], queries)
+            recall = np.mean([len(np.intersect1d(a, e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+            print(f"    nprobe={nprobe:<4d}    recall={recall:.3f}  p50={np.percentile(approx_ms, 50):7.3f}ms  "
+                  f"p99={np.percentile(approx_ms, 99):7.3f}ms  "
+                  f"speedup={np.median(exact_ms) / np.median(approx_ms):5.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
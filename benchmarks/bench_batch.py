@@ -0,0 +1,62 @@
+"""
+Benchmark batch recommendations against one call per video.
+
+Measures the per-item cost of batch_hybrid_recommendation for several batch sizes
+against the same ids requested through hybrid_recommendation one at a time, and the
+end-to-end cost of POST /api/recommendations/batch through the Flask test client.
+Caches are bypassed so every item is computed.
+
+    python -m benchmarks.bench_batch [--sizes 100,1000,10000] [--top-n 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.services import recommendation as rec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--skip-http', action='store_true')
+    args = parser.parse_args(argv)
+
+    # Expire every cached entry immediately so each item is computed
+    rec.CACHE_EXPIRATION = -1
+    catalog = rec.get_snapshot().catalog
+    rng = np.random.default_rng(0)
+    client = None
+    if not args.skip_http:
+        import server
+        client = server.app.test_client()
+
+    print(f"catalog={len(catalog)} top_n={args.top_n}")
+    for size in [int(n) for n in args.sizes.split(',')]:
+        video_ids = rng.choice(catalog.video_id_list(), size=size).tolist()
+
+        start = time.perf_counter()
+        for video_id in video_ids:
+            rec.hybrid_recommendation(video_id, args.top_n)
+        single = (time.perf_counter() - start) / size * 1e6
+
+        start = time.perf_counter()
+        for _ in rec.batch_hybrid_recommendation(video_ids, args.top_n):
+            pass
+        batch = (time.perf_counter() - start) / size * 1e6
+
+        line = (f"  batch={size:6d} single={single:8.1f}us/item batch={batch:8.1f}us/item "
+                f"({single / batch:.1f}x)")
+        if client is not None and size <= server.MAX_BATCH_SIZE:
+            start = time.perf_counter()
+            response = client.post('/api/recommendations/batch', json={'video_ids': video_ids, 'limit': args.top_n})
+            lines = response.get_data().count(b'\n')
+            http = (time.perf_counter() - start) / size * 1e6
+            line += f" http={http:8.1f}us/item ({lines} lines)"
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark the streaming feature extraction of the artifact build against catalog size and workers.
+
+For every catalog size and worker count, a fresh process streams a synthetic catalog CSV
+(see synthetic.py) through features.extract_features: chunked reading, hashed TF-IDF and
+embeddings in worker processes. It reports the wall time, rows per second, and the peak
+RSS of the parent and of the busiest worker. The parent's RSS grows with the build output
+(matrices and embeddings), a worker's with the chunk size only.
+
+    python -m benchmarks.bench_build [--sizes 10000,100000] [--workers 1,2,4] [--chunk-rows 5000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.synthetic import write_catalog
+
+DEFAULT_SIZES = '10000,100000'
+DEFAULT_WORKERS = '1,2,4'
+DEFAULT_WORK_DIR = os.path.join('data', 'bench')
+
+
+def measure(csv_path, workers, chunk_rows, encoder):
+    """Metrics of one extraction, in the process this runs in."""
+    from src.services.encoders import get_encoder
+    from src.services.features import extract_features
+    from src.services.neighbors import peak_rss_mb
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    features = extract_features(csv_path, get_encoder(encoder), workers, chunk_rows)
+    seconds = time.perf_counter() - start
+    rows = len(features['engagement_rate'])
+    return {
+        'rows': rows,
+        'workers': workers,
+        'chunk_rows': chunk_rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds > 0 else float('inf'),
+        'tfidf_nnz': int(features['tfidf_matrix'].nnz),
+        'parent_rss_mb': peak_rss_mb() - rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'worker_peak_rss_mb': features['stats']['worker_peak_rss_mb'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated catalog sizes")
+    parser.add_argument('--workers', default=DEFAULT_WORKERS, help="Comma-separated worker counts")
+    parser.add_argument('--chunk-rows', type=int, default=5000)
+    parser.add_argument('--encoder', default='hashing')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Also write the results as JSON")
+    parser.add_argument('--measure', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--measure-workers', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure, args.measure_workers, args.chunk_rows, args.encoder)))
+        return 0
+
+    print(f"chunk_rows={args.chunk_rows} encoder={args.encoder} cpus={os.cpu_count()}")
+    results = []
+    for size in [int(n) for n in args.sizes.split(',')]:
+        csv_path = write_catalog(size, os.path.join(args.work_dir, f'catalog-{size}-seed{args.seed}.csv'), args.seed)
+        for workers in [int(n) for n in args.workers.split(',')]:
+            # A fresh process per run, so the peak RSS is that of this run alone
+            child = subprocess.run([sys.executable, '-m', 'benchmarks.bench_build', '--measure', csv_path,
+                                    '--measure-workers', str(workers), '--chunk-rows', str(args.chunk_rows),
+                                    '--encoder', args.encoder], check=True, stdout=subprocess.PIPE, text=True)
+            metrics = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(metrics)
+            print(f"  rows={metrics['rows']:>8} workers={workers:>2} {metrics['seconds']:.2f}s "
+                  f"({metrics['rows_per_sec']:.0f} rows/s) parent +{metrics['parent_rss_mb']:.0f}MB RSS, "
+                  f"worker peak {metrics['worker_peak_rss_mb']:.0f}MB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""
+Concurrency benchmark for the recommendation path.
+
+1. In-process: uncached hybrid_recommendation calls from 1..N threads reading the
+   shared immutable snapshot (no global lock).
+2. Pre-fork: /api/recommendations throughput against `server.py --workers W` for
+   several worker counts, driven by a pool of HTTP client threads.
+
+    python -m benchmarks.bench_concurrency [--seconds 5] [--workers 1,2,4] [--clients 16]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def _run_for(seconds, threads, fn):
+    """Call fn(rng) from `threads` threads for `seconds`; returns completed calls per second."""
+    stop = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(slot):
+        rng = np.random.default_rng(slot)
+        while time.perf_counter() < stop:
+            fn(rng)
+            counts[slot] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts) / seconds
+
+
+def bench_threads(seconds, thread_counts):
+    from src.services import recommendation as rec
+
+    # Expire every cached entry immediately so each call does the full computation
+    rec.CACHE_EXPIRATION = -1
+    video_ids = rec.get_snapshot().catalog.video_ids
+
+    def call(rng):
+        rec.hybrid_recommendation(video_ids[rng.integers(len(video_ids))], int(rng.integers(1, 21)))
+
+    print("in-process hybrid_recommendation (uncached):")
+    base = None
+    for threads in thread_counts:
+        rate = _run_for(seconds, threads, call)
+        base = base or rate
+        print(f"  threads={threads:3d} {rate:9.1f} req/s ({rate / base:.2f}x)")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def bench_prefork(seconds, worker_counts, clients, video_ids):
+    print(f"pre-fork /api/recommendations ({clients} client threads):")
+    base = None
+    for workers in worker_counts:
+        port = _free_port()
+        server = subprocess.Popen([sys.executable, 'server.py', '--workers', str(workers), '--port', str(port)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_for_port(port)
+
+            def call(rng):
+                video_id = video_ids[rng.integers(len(video_ids))]
+                url = (f"http://127.0.0.1:{port}/api/recommendations?video_id={video_id}"
+                       f"&limit={rng.integers(1, 21)}&page={rng.integers(1, 3)}")
+                with urllib.request.urlopen(url) as response:
+                    response.read()
+
+            rate = _run_for(seconds, clients, call)
+            base = base or rate
+            print(f"  workers={workers:3d} {rate:9.1f} req/s ({rate / base:.2f}x)")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--skip-prefork', action='store_true')
+    args = parser.parse_args(argv)
+
+    print(f"cpus={os.cpu_count()}")
+    bench_threads(args.seconds, [int(n) for n in args.threads.split(',')])
+    if not args.skip_prefork:
+        from src.services.recommendation import get_snapshot
+        video_ids = get_snapshot().catalog.video_id_list()
+        bench_prefork(args.seconds, [int(n) for n in args.workers.split(',')], args.clients, video_ids)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
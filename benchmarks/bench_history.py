@@ -0,0 +1,101 @@
+"""
+Watch-history store benchmark.
+
+Drives WatchHistoryStore.add from several threads for a fixed time and reports sustained
+writes per second, counting only views that reached the backend (the final flush is
+included). The legacy dict-of-lists update (linear duplicate check and full re-sort per
+append) is measured for comparison, along with read latency for resident and evicted users.
+
+    python -m benchmarks.bench_history [--seconds 5] [--threads 4] [--users 100000] [--backend sqlite]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from src.services.history import HISTORY_LENGTH, SQLiteBackend, WatchHistoryStore, get_history_backend
+
+
+def legacy_add(user_watch_history, user_id, video):
+    """The original track_view update, for comparison."""
+    if user_id not in user_watch_history:
+        user_watch_history[user_id] = []
+    if not any(v.get('id') == video['id'] for v in user_watch_history[user_id]):
+        video['watched_at'] = datetime.now().isoformat()
+        user_watch_history[user_id].append(video)
+        user_watch_history[user_id] = sorted(
+            user_watch_history[user_id], key=lambda x: x.get('watched_at', ''), reverse=True)[:HISTORY_LENGTH]
+
+
+def _drive(seconds, threads, users, videos, add):
+    stop = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(slot):
+        rng = np.random.default_rng(slot)
+        while time.perf_counter() < stop:
+            user_id = f"user-{rng.integers(users)}"
+            video_id = f"video-{rng.integers(videos)}"
+            add(user_id, {'id': video_id, 'title': video_id})
+            counts[slot] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--videos', type=int, default=5_000)
+    parser.add_argument('--capacity', type=int, default=10_000, help='users kept in memory')
+    parser.add_argument('--backend', default='sqlite')
+    args = parser.parse_args(argv)
+
+    legacy = {}
+    legacy_lock = threading.Lock()
+
+    def legacy_call(user_id, video):
+        with legacy_lock:
+            legacy_add(legacy, user_id, video)
+
+    calls = _drive(args.seconds, args.threads, args.users, args.videos, legacy_call)
+    print(f"legacy dict of lists (in memory only): {calls / args.seconds:10.0f} views/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = (SQLiteBackend(os.path.join(tmp, 'history.db')) if args.backend == 'sqlite'
+                   else get_history_backend(args.backend))
+        store = WatchHistoryStore(backend, capacity=args.capacity)
+        start = time.perf_counter()
+        calls = _drive(args.seconds, args.threads, args.users, args.videos, store.add)
+        store.flush()
+        elapsed = time.perf_counter() - start
+        print(f"WatchHistoryStore ({backend.name}, durable):  {calls / elapsed:10.0f} views/s "
+              f"({calls} views, {args.threads} threads, {args.capacity} resident users)")
+
+        rng = np.random.default_rng(0)
+        user_ids = [f"user-{u}" for u in rng.integers(args.users, size=2000)]
+        for label, prepare in (('resident', lambda: None), ('evicted', store._users.clear)):
+            timings = []
+            for user_id in user_ids:
+                prepare()
+                t = time.perf_counter()
+                store.get(user_id)
+                timings.append(time.perf_counter() - t)
+            timings = np.array(timings) * 1e6
+            print(f"  get() {label:8s} p50={np.percentile(timings, 50):8.1f}us p99={np.percentile(timings, 99):8.1f}us")
+        backend.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark the content scoring stage of hybrid_recommendation.
+
+Compares the previous per-dict implementation (Python loops for the
+channel/category/compatibility boosts, sort of dicts) against the array implementation
+(_apply_boosts + argpartition top-k, dicts built only for the winners), checks that both
+produce the same ranking, and times full hybrid_recommendation calls.
+
+    python -m benchmarks.bench_hybrid_scoring [--requests 500] [--top-n 10]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from src.services import recommendation as rec
+
+
+def legacy_content_stage(video_id, top_n):
+    """The pre-vectorization content stage: one dict per candidate, boosts applied per dict."""
+    snapshot = rec.get_snapshot()
+    catalog = snapshot.catalog
+    idx = catalog.row_of(video_id)
+    current_video_category = catalog.category_of(idx)
+    current_video_channel = catalog.channel_of(idx)
+    current_video_channel_id = catalog.channel_id_of(idx)
+    is_political = current_video_category in rec.SENSITIVE_CATEGORIES['POLITICAL']
+    is_ai = current_video_category in rec.SENSITIVE_CATEGORIES['AI']
+
+    neighbor_rows, neighbor_scores = snapshot.neighbor_index.neighbors(idx, top_n * 2)
+    content_scores = list(zip(neighbor_rows.tolist(), neighbor_scores.tolist()))
+    recs = [dict(catalog.record(i[0]), score=float(i[1])) for i in content_scores[1:top_n*2]]
+    if current_video_channel or current_video_channel_id:
+        for r in recs:
+            if (current_video_channel and r['channel_name'] == current_video_channel) or \
+               (current_video_channel_id and r['channel_id'] == current_video_channel_id):
+                r['score'] *= 1.5
+    for r in recs:
+        if r['category'] == current_video_category:
+            r['score'] *= 1.3
+        if current_video_category in rec.CATEGORY_COMPATIBILITY:
+            r['score'] *= rec.CATEGORY_COMPATIBILITY.get(current_video_category, {}).get(r['category'], 0.5)
+        else:
+            if is_ai and r['category'] in rec.SENSITIVE_CATEGORIES['POLITICAL']:
+                r['score'] *= 0.3
+            if is_political and r['category'] not in rec.SENSITIVE_CATEGORIES['POLITICAL'] \
+                    and r['category'] not in rec.SENSITIVE_CATEGORIES['AI']:
+                r['score'] *= 0.5
+    return [(r['id'], r['score']) for r in sorted(recs, key=lambda x: x['score'], reverse=True)[:top_n]]
+
+
+def vectorized_content_stage(video_id, top_n):
+    """The array content stage used by hybrid_recommendation."""
+    snapshot = rec.get_snapshot()
+    idx = snapshot.catalog.row_of(video_id)
+    neighbor_rows, neighbor_scores = snapshot.neighbor_index.neighbors(idx, top_n * 2)
+    rows = np.asarray(neighbor_rows[1:top_n*2], dtype=np.int64)
+    scores = rec._apply_boosts(rows, np.asarray(neighbor_scores[1:top_n*2], dtype=np.float64),
+                               idx, snapshot.content_category_matrix, snapshot.catalog)
+    rows, scores = rec._top_rows(rows, scores, top_n)
+    return [(snapshot.catalog.video_ids[r], float(s)) for r, s in zip(rows, scores)]
+
+
+def _time_calls(fn, video_ids, top_n):
+    samples = []
+    results = []
+    for video_id in video_ids:
+        start = time.perf_counter()
+        results.append(fn(video_id, top_n))
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, results
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        'mean_ms': statistics.mean(ordered),
+        'p50_ms': ordered[len(ordered) // 2],
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--top-n', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    video_ids = rng.choice(rec.get_snapshot().catalog.video_id_list(), size=args.requests).tolist()
+
+    legacy_samples, legacy_results = _time_calls(legacy_content_stage, video_ids, args.top_n)
+    vector_samples, vector_results = _time_calls(vectorized_content_stage, video_ids, args.top_n)
+    mismatches = sum(1 for a, b in zip(legacy_results, vector_results) if a != b)
+
+    def uncached_hybrid(video_id, top_n):
+        rec.recommendation_cache.clear()
+        return rec.hybrid_recommendation(video_id, top_n)
+
+    hybrid_samples, _ = _time_calls(uncached_hybrid, video_ids, args.top_n)
+
+    legacy, vector, hybrid = _summary(legacy_samples), _summary(vector_samples), _summary(hybrid_samples)
+    print(f"catalog={len(rec.get_snapshot().catalog)} requests={args.requests} top_n={args.top_n}")
+    for name, stats in [('legacy content stage', legacy), ('array content stage', vector),
+                        ('hybrid_recommendation (uncached)', hybrid)]:
+        print(f"  {name:34s} mean={stats['mean_ms']:.3f}ms p50={stats['p50_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms")
+    print(f"  content stage speedup: {legacy['mean_ms'] / vector['mean_ms']:.1f}x (mean), "
+          f"ranking mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+"""
+Benchmark keyword search (search.py) against catalog size.
+
+For every size, a synthetic catalog (see synthetic.py) is built with the hashing encoder,
+then a fresh process runs the same kind of queries (1 to 3 words of random titles) through:
+
+- the impact-ordered index with threshold-algorithm early termination (what /api/search runs)
+- an exhaustive scan scoring every row (the reference, and what builds without an index do)
+
+It reports p50/p99 latency of both, the postings read and rows scored per query against
+the total length of the query's posting lists, and how many top-k score lists differ from
+the exhaustive ones (should be 0).
+
+    python -m benchmarks.bench_search [--sizes 10000,100000] [--queries 300] [--k 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.bench_hybrid_scoring import _summary, _time_calls
+from benchmarks.synthetic import write_catalog
+
+DEFAULT_SIZES = '1000,10000,100000'
+DEFAULT_WORK_DIR = os.path.join('data', 'bench')
+
+
+def _queries(catalog, n, rng):
+    """`n` queries of 1 to 3 consecutive words of random titles."""
+    queries = []
+    for row in rng.integers(len(catalog), size=n):
+        words = str(catalog.record(int(row))['title']).split()
+        length = int(rng.integers(1, 4))
+        start = int(rng.integers(max(1, len(words) - length + 1)))
+        queries.append(' '.join(words[start:start + length]))
+    return queries
+
+
+def measure(queries, k, seed):
+    """Metrics of the build selected by the environment, in the process this runs in."""
+    from src.services import recommendation as rec
+    from src.services import search
+
+    snapshot = rec.get_snapshot()
+    queries = _queries(snapshot.catalog, queries, np.random.default_rng(seed))
+    vectors = {query: search.query_vector(query, snapshot) for query in queries}
+    # Warm-up pass (page faults on the mapped index) is not measured
+    for query in queries[:20]:
+        search.search(query, k, snapshot)
+
+    stats = []
+    indexed_samples, indexed = _time_calls(lambda query, k: search.search(query, k, snapshot), queries, k)
+    exhaustive_samples, exhaustive = _time_calls(
+        lambda query, k: search._exhaustive(*vectors[query], k, snapshot, None), queries, k)
+    mismatches = 0
+    for query, (rows, scores, query_stats), (_, reference) in zip(queries, indexed, exhaustive):
+        starts, ends = snapshot.search_index.postings(vectors[query][0])
+        query_stats['posting_lengths'] = int((ends - starts).sum())
+        stats.append(query_stats)
+        if len(scores) != len(reference) or not np.allclose(scores, reference):
+            mismatches += 1
+    total = sum(s['posting_lengths'] for s in stats)
+    return {
+        'rows': len(snapshot.catalog),
+        'queries': len(queries),
+        'k': k,
+        'index_mb': snapshot.search_index.nbytes / 2**20,
+        'indexed': _summary(indexed_samples),
+        'exhaustive': _summary(exhaustive_samples),
+        'postings_read': float(np.mean([s['postings'] for s in stats])),
+        'rows_scored': float(np.mean([s['scored'] for s in stats])),
+        'posting_lengths': total / len(stats),
+        'postings_read_fraction': sum(s['postings'] for s in stats) / max(total, 1),
+        'rounds': float(np.mean([s['rounds'] for s in stats])),
+        'mismatches': mismatches,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated catalog sizes")
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=10, help="Results per query")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR)
+    parser.add_argument('--output', default=None, help="Also write the results as JSON")
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        # Child mode: loading prints, so the metrics go on the last line
+        print(json.dumps(measure(args.queries, args.k, args.seed)))
+        return 0
+
+    print(f"queries={args.queries} k={args.k}")
+    results = []
+    for size in [int(n) for n in args.sizes.split(',')]:
+        csv_path = write_catalog(size, os.path.join(args.work_dir, f'catalog-{size}-seed{args.seed}.csv'), args.seed)
+        out_dir = os.path.join(args.work_dir, f'search-{size}', 'artifacts')
+        env = dict(os.environ, YUGI_CSV_PATH=csv_path, YUGI_ARTIFACT_DIR=out_dir, YUGI_ENCODER='hashing',
+                   YUGI_HISTORY_BACKEND='memory')
+        subprocess.run([sys.executable, '-m', 'src.services.artifacts', 'build-artifacts', '--force',
+                        '--csv', csv_path, '--out', out_dir, '--encoder', 'hashing'],
+                       env=env, check=True, stdout=subprocess.DEVNULL)
+        # A fresh process per size, so every catalog starts from cold caches
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.bench_search', '--measure',
+                                '--queries', str(args.queries), '--k', str(args.k), '--seed', str(args.seed)],
+                               env=env, check=True, stdout=subprocess.PIPE, text=True)
+        metrics = json.loads(child.stdout.strip().splitlines()[-1])
+        results.append(metrics)
+        print(f"  rows={metrics['rows']:>8} index={metrics['index_mb']:.1f}MB "
+              f"indexed p50={metrics['indexed']['p50_ms']:.2f}ms p99={metrics['indexed']['p99_ms']:.2f}ms | "
+              f"exhaustive p50={metrics['exhaustive']['p50_ms']:.2f}ms p99={metrics['exhaustive']['p99_ms']:.2f}ms | "
+              f"read {metrics['postings_read']:.0f} of {metrics['posting_lengths']:.0f} postings "
+              f"({metrics['postings_read_fraction']:.1%}), scored {metrics['rows_scored']:.0f} rows, "
+              f"{metrics['mismatches']} mismatches")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+"""
+Benchmark building the JSON body of a recommendation page.
+
+Compares the previous path (a dict per result from Catalog.record, copied and extended with
+the display fields, then the whole response serialized like jsonify) against joining the
+pre-serialized fragments of the build (see fragments.py) with the per-request scores.
+Both run on the same random pages of the build selected by the environment; the bodies are
+checked to hold the same results (apart from the placeholder views/age, which the old path
+derived from the per-process salted hash()).
+
+Reported per page size: mean and p99 time per body, and the peak memory allocated while
+building one (tracemalloc, measured in a separate pass since tracing slows everything down).
+
+    python -m benchmarks.bench_serialization [--limits 5,20] [--requests 2000]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.bench_hybrid_scoring import _summary
+from src.services import recommendation as rec
+from src.services.fragments import FRAGMENT_COLUMN, response_body, result
+
+
+def legacy_format_recommendation(recommendation, catalog):
+    """server.format_recommendation before the fragments: a copy of the dict plus the display fields."""
+    formatted_rec = recommendation.copy()
+    formatted_rec["thumbnail"] = f"https://img.youtube.com/vi/{recommendation['id']}/mqdefault.jpg"
+    if 'channel_name' in recommendation and recommendation['channel_name']:
+        formatted_rec["channel"] = recommendation['channel_name']
+    else:
+        row = catalog.row_of(recommendation['id'])
+        channel = catalog.channel_of(row) if row is not None else None
+        formatted_rec["channel"] = channel or "YouTube Creator"
+    if 'channel_name' in formatted_rec:
+        del formatted_rec['channel_name']
+    if 'description' in formatted_rec and formatted_rec['description']:
+        formatted_rec["description"] = formatted_rec["description"][:200]
+    formatted_rec["views"] = f"{(hash(recommendation['id']) % 200) + 10}K views"
+    formatted_rec["timestamp"] = f"{(hash(recommendation['id']) % 30) + 1} days ago"
+    return formatted_rec
+
+
+def _payload(limit):
+    return {"pagination": {"page": 1, "limit": limit, "total_results": limit, "next_cursor": None}, "session": "s"}
+
+
+def legacy_body(catalog, rows, scores):
+    results = [legacy_format_recommendation(rec.build_recommendation(row, score, catalog), catalog)
+               for row, score in zip(rows, scores)]
+    # What jsonify writes outside debug mode
+    return json.dumps({"results": results, **_payload(len(rows))}, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def fragment_body(catalog, rows, scores):
+    return response_body([result(catalog, row, score) for row, score in zip(rows, scores)], _payload(len(rows)))
+
+
+def _normalized(body):
+    """Results of a body without the hash-derived placeholders (missing texts are "" in both)."""
+    results = json.loads(body)['results']
+    for item in results:
+        del item['views'], item['timestamp']
+        item['description'] = item['description'] or ""
+        item['tags'] = item['tags'] or ""
+    return results
+
+
+def _time(build, catalog, pages):
+    samples = []
+    for rows, scores in pages:
+        start = time.perf_counter()
+        build(catalog, rows, scores)
+        samples.append((time.perf_counter() - start) * 1000)
+    return _summary(samples)
+
+
+def _peak_bytes(build, catalog, pages):
+    """Mean peak of the memory allocated while building one body."""
+    peaks = []
+    tracemalloc.start()
+    for rows, scores in pages:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        build(catalog, rows, scores)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    return float(np.mean(peaks))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--limits', default='5,20', help="Comma-separated results per page")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    catalog = rec.get_snapshot().catalog
+    if FRAGMENT_COLUMN not in catalog.columns:
+        print("This build has no fragments (built before them): both paths encode every result")
+    rng = np.random.default_rng(args.seed)
+    print(f"rows={len(catalog)} requests={args.requests}")
+    results = []
+    for limit in [int(n) for n in args.limits.split(',')]:
+        pages = [(rng.integers(len(catalog), size=limit), rng.random(limit)) for _ in range(args.requests)]
+        mismatches = sum(_normalized(legacy_body(catalog, *page)) != _normalized(fragment_body(catalog, *page))
+                         for page in pages[:200])
+        # Warm-up pass (page faults on the mapped columns) is not measured
+        for page in pages[:50]:
+            legacy_body(catalog, *page)
+            fragment_body(catalog, *page)
+        metrics = {
+            'limit': limit,
+            'legacy': _time(legacy_body, catalog, pages),
+            'fragments': _time(fragment_body, catalog, pages),
+            'legacy_peak_bytes': _peak_bytes(legacy_body, catalog, pages[:500]),
+            'fragments_peak_bytes': _peak_bytes(fragment_body, catalog, pages[:500]),
+            'body_bytes': float(np.mean([len(fragment_body(catalog, *page)) for page in pages[:500]])),
+            'mismatches': mismatches,
+        }
+        results.append(metrics)
+        print(f"  limit={limit:>3} body={metrics['body_bytes'] / 1024:.1f}KB | "
+              f"legacy mean={metrics['legacy']['mean_ms'] * 1000:.0f}us p99={metrics['legacy']['p99_ms'] * 1000:.0f}us "
+              f"peak={metrics['legacy_peak_bytes'] / 1024:.1f}KB | "
+              f"fragments mean={metrics['fragments']['mean_ms'] * 1000:.0f}us "
+              f"p99={metrics['fragments']['p99_ms'] * 1000:.0f}us peak={metrics['fragments_peak_bytes'] / 1024:.1f}KB | "
+              f"{metrics['mismatches']} mismatches")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+"""
+Benchmark the sharded catalog (shards.py) against one process holding the whole model.
+
+The build selected by the environment (YUGI_ARTIFACT_DIR, YUGI_CSV_PATH) is split into each
+shard count, one shard server per shard is started on localhost, and a Coordinator answers
+the same random videos as recommendation._score_content on the whole snapshot (without
+its top-N table, which shards do not have). It reports:
+
+- agreement: content rankings with the same rows as the unsharded one, and the overlap of
+  both (with YUGI_SEMANTIC_WEIGHT=0 they differ only on exact ties; otherwise also where
+  the unsharded ANN index misses a semantic neighbor the shards find by exact scan)
+- p50/p99 latency of the content ranking and of the full hybrid recommendation through the
+  coordinator, against the in-process content ranking
+- the RSS of every shard process after the run
+
+    python -m benchmarks.bench_shards [--shards 1,2,4] [--requests 300] [--top-n 10]
+"""
+import argparse
+import json
+import secrets
+
+import numpy as np
+
+from benchmarks.bench_hybrid_scoring import _summary, _time_calls
+from src.services import recommendation as rec
+from src.services import shards
+from src.services.artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH
+from src.services.snapshot import ModelSnapshot
+
+
+def _without_topn(snapshot):
+    """The snapshot with live content scoring (shards have no top-N table)."""
+    names = ('catalog', 'neighbor_index', 'tfidf', 'tfidf_matrix', 'embeddings', 'semantic_index',
+             'content_category_matrix', 'collaborative_category_matrix', 'explore_pool', 'version', 'stage',
+             'search_index')
+    return ModelSnapshot(**{name: getattr(snapshot, name) for name in names}, topn_table=None)
+
+
+def measure(n_shards, video_ids, top_n, snapshot):
+    shard_dirs = shards.split_build(DEFAULT_ARTIFACT_DIR, n_shards, DEFAULT_CSV_PATH)
+    # A fresh key per run: the shards only listen on localhost for the benchmark
+    authkey = secrets.token_hex(16)
+    processes, addresses = shards.start_local_shards(shard_dirs, authkey=authkey)
+    try:
+        coordinator = shards.Coordinator(addresses, authkey)
+        catalog = snapshot.catalog
+        # Warm-up pass (connections, page faults on the mapped shards) is not measured
+        for video_id in video_ids[:20]:
+            coordinator.hybrid_recommendation(video_id, top_n)
+
+        local_samples, local = _time_calls(
+            lambda video_id, n: rec._score_content(catalog.row_of(video_id), n, snapshot), video_ids, top_n)
+        sharded_samples, sharded = _time_calls(coordinator.content_ranking, video_ids, top_n)
+        hybrid_samples, _ = _time_calls(coordinator.hybrid_recommendation, video_ids, top_n)
+        identical, overlap = 0, []
+        for (rows, scores), (sharded_rows, sharded_scores, _) in zip(local, sharded):
+            if np.array_equal(rows, sharded_rows) and np.allclose(scores, sharded_scores):
+                identical += 1
+            overlap.append(len(set(rows.tolist()) & set(sharded_rows.tolist())) / max(len(rows), 1))
+        infos = coordinator.scatter('info')
+        coordinator.close()
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+    return {
+        'shards': n_shards,
+        'rows_per_shard': [info['n_rows'] for info in infos],
+        'shard_rss_mb': [info['rss_mb'] for info in infos],
+        'local_content': _summary(local_samples),
+        'sharded_content': _summary(sharded_samples),
+        'sharded_hybrid': _summary(hybrid_samples),
+        'identical_rankings': identical / len(video_ids),
+        'overlap': float(np.mean(overlap)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shards', default='1,2,4', help="Comma-separated shard counts")
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    snapshot = _without_topn(rec.get_snapshot())
+    rng = np.random.default_rng(args.seed)
+    video_ids = rng.choice(snapshot.catalog.video_id_list(), size=args.requests).tolist()
+    print(f"rows={len(snapshot.catalog)} requests={args.requests} top_n={args.top_n}")
+    results = []
+    for n_shards in [int(n) for n in args.shards.split(',')]:
+        metrics = measure(n_shards, video_ids, args.top_n, snapshot)
+        results.append(metrics)
+        print(f"  shards={n_shards} "
+              f"local content p50={metrics['local_content']['p50_ms']:.2f}ms "
+              f"p99={metrics['local_content']['p99_ms']:.2f}ms | "
+              f"sharded content p50={metrics['sharded_content']['p50_ms']:.2f}ms "
+              f"p99={metrics['sharded_content']['p99_ms']:.2f}ms | "
+              f"sharded hybrid p50={metrics['sharded_hybrid']['p50_ms']:.2f}ms "
+              f"p99={metrics['sharded_hybrid']['p99_ms']:.2f}ms | "
+              f"identical {metrics['identical_rankings']:.1%}, overlap {metrics['overlap']:.1%} | "
+              f"shard RSS {', '.join(f'{rss:.0f}' for rss in metrics['shard_rss_mb'])}MB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+"""
+Benchmark time-to-first-response of a freshly started server.
+
+Every run starts `server.py --no-reload` on a free port and polls it, reporting the
+seconds from launch until:
+
+- /healthz answers (the process is up, the model may not be loaded yet)
+- /api/recommendations first answers 200, and the warm-up stage it was served from
+- /readyz answers 200 (the full model is served)
+
+along with the per-stage times the server reports in /healthz (measured from its own
+process start). The environment selects the build (YUGI_ARTIFACT_DIR, YUGI_CSV_PATH).
+
+    python -m benchmarks.bench_startup [--runs 3] [--timeout 300]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from benchmarks.bench_concurrency import _free_port
+
+POLL_INTERVAL = 0.02
+
+
+def _get(port, path):
+    """(status, JSON body) of a GET, or (None, None) while the server is not listening."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except OSError:
+        return None, None
+
+
+def measure(timeout):
+    """Milestones of one server start, in seconds since launch."""
+    port = _free_port()
+    launched = time.perf_counter()
+    server = subprocess.Popen([sys.executable, 'server.py', '--no-reload', '--port', str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    milestones = {}
+    try:
+        while 'ready' not in milestones:
+            elapsed = time.perf_counter() - launched
+            if elapsed > timeout or server.poll() is not None:
+                raise RuntimeError(f"server did not become ready (milestones so far: {milestones})")
+            if 'healthz' not in milestones:
+                if _get(port, '/healthz')[0] == 200:
+                    milestones['healthz'] = elapsed
+            elif 'first_response' not in milestones:
+                if _get(port, '/api/recommendations?limit=10')[0] == 200:
+                    milestones['first_response'] = elapsed
+            elif _get(port, '/readyz')[0] == 200:
+                milestones['ready'] = elapsed
+                status = _get(port, '/healthz')[1]
+                milestones['first_response_stage'] = status['first_response']['stage']
+                milestones['server_stages'] = status['stages_reached_seconds']
+            time.sleep(POLL_INTERVAL)
+    finally:
+        server.terminate()
+        server.wait()
+    return milestones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=300, help="Seconds to wait for readiness per run")
+    parser.add_argument('--output', default=None, help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    print(f"artifacts={os.environ.get('YUGI_ARTIFACT_DIR', 'default')} runs={args.runs} cpus={os.cpu_count()}")
+    results = []
+    for run in range(args.runs):
+        # Each run is a new process: nothing is imported or loaded yet
+        milestones = measure(args.timeout)
+        results.append(milestones)
+        stages = ' '.join(f"{stage}={seconds:.2f}s" for stage, seconds in milestones['server_stages'].items())
+        print(f"  run {run + 1}: healthz {milestones['healthz']:.2f}s, first response {milestones['first_response']:.2f}s "
+              f"({milestones['first_response_stage']}), ready {milestones['ready']:.2f}s [server: {stages}]")
+    for key in ('healthz', 'first_response', 'ready'):
+        print(f"  median {key}: {np.median([r[key] for r in results]):.2f}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
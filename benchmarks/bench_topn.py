@@ -0,0 +1,54 @@
+"""
+Benchmark the materialized top-N table against live content scoring.
+
+Scores the same videos with the current snapshot (which must have a table, see
+`python -m src.services.topn`) and with a copy of it without the table, and reports the
+latency of the content stage and how much the two rankings overlap.
+
+    python -m benchmarks.bench_topn [--requests 500] [--top-n 10]
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.bench_hybrid_scoring import _summary, _time_calls
+from src.services import recommendation as rec
+from src.services.snapshot import ModelSnapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--top-n', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    snapshot = rec.get_snapshot()
+    if snapshot.topn_table is None:
+        print("The current build has no top-N table; run `python -m src.services.topn` first")
+        return 1
+    live = ModelSnapshot(**{name: getattr(snapshot, name) for name in (
+        'catalog', 'neighbor_index', 'tfidf', 'tfidf_matrix', 'embeddings', 'semantic_index',
+        'content_category_matrix', 'collaborative_category_matrix', 'explore_pool', 'version')})
+
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(snapshot.catalog), size=args.requests).tolist()
+    table_samples, table_results = _time_calls(lambda row, top_n: rec._score_content(row, top_n, snapshot)[0],
+                                               rows, args.top_n)
+    live_samples, live_results = _time_calls(lambda row, top_n: rec._score_content(row, top_n, live)[0],
+                                             rows, args.top_n)
+    identical = sum(1 for a, b in zip(table_results, live_results) if a.tolist() == b.tolist())
+    overlap = np.mean([len(set(a.tolist()) & set(b.tolist())) / max(1, len(b))
+                       for a, b in zip(table_results, live_results)])
+
+    table, live_stats = _summary(table_samples), _summary(live_samples)
+    print(f"catalog={len(snapshot.catalog)} table size={snapshot.topn_table.size} "
+          f"requests={args.requests} top_n={args.top_n}")
+    for name, stats in [('top-N table content stage', table), ('live content stage', live_stats)]:
+        print(f"  {name:26s} mean={stats['mean_ms']:.3f}ms p50={stats['p50_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms")
+    print(f"  speedup: {live_stats['mean_ms'] / table['mean_ms']:.1f}x (mean), identical rankings: "
+          f"{identical / len(rows):.1%}, overlap with live: {overlap:.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
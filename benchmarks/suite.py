@@ -0,0 +1,217 @@
+"""
+Benchmark suite over synthetic catalogs of several sizes.
+
+For every size, a synthetic catalog with the YT_data.csv schema (see synthetic.py) is
+built into its own artifact directory, then a fresh server process measures:
+
+- startup: seconds to import the server and finish its warm-up (memory-map the build, build the snapshot)
+  and the RSS after it; bench_startup.py measures the stages and time-to-first-response over HTTP
+- peak RSS of the serving process
+- uncached hybrid_recommendation p50/p99 latency
+- /api/recommendations throughput through the Flask test client from concurrent client threads
+
+The artifact build time is reported too. Results are written as JSON and compared with a
+stored baseline: a metric worse than the baseline by more than --threshold (a fraction)
+fails the run. Embeddings come from the hashing encoder by default, so the suite runs
+offline without the SentenceTransformer model.
+
+    python -m benchmarks.suite [--sizes 1000,10000,100000] [--threshold 0.2] [--update-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import write_catalog
+
+DEFAULT_SIZES = '1000,10000,100000'
+DEFAULT_WORK_DIR = os.path.join('data', 'bench')
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+DEFAULT_THRESHOLD = 0.2
+WARMUP_REQUESTS = 50
+
+# Metric -> whether lower values are better
+METRICS = {
+    'build_seconds': True,
+    'startup_seconds': True,
+    'startup_rss_mb': True,
+    'peak_rss_mb': True,
+    'latency_p50_ms': True,
+    'latency_p99_ms': True,
+    'throughput_rps': False,
+}
+
+
+def measure(requests, clients, seconds, top_n, seed=0):
+    """Metrics of the server process this runs in (the environment selects the build)."""
+    from benchmarks.bench_concurrency import _run_for
+    from src.services.neighbors import peak_rss_mb
+
+    from src.services import recommendation as rec
+
+    start = time.perf_counter()
+    import server
+    # The server warms up in the background; startup is until the full model is served
+    rec.wait_until_ready()
+    startup = time.perf_counter() - start
+    startup_rss = peak_rss_mb()
+
+    video_ids = rec.get_snapshot().catalog.video_id_list()
+
+    # Expire every cached entry immediately so each call does the full computation
+    cache_expiration, rec.CACHE_EXPIRATION = rec.CACHE_EXPIRATION, -1
+    rng = np.random.default_rng(seed)
+    # Warm-up calls first (page faults on the mapped build, first-call costs) are not measured
+    for video_id in rng.choice(video_ids, size=WARMUP_REQUESTS):
+        rec.hybrid_recommendation(video_id, top_n)
+    samples = np.empty(requests)
+    for i, video_id in enumerate(rng.choice(video_ids, size=requests)):
+        call_start = time.perf_counter()
+        rec.hybrid_recommendation(video_id, top_n)
+        samples[i] = (time.perf_counter() - call_start) * 1000
+    rec.CACHE_EXPIRATION = cache_expiration
+
+    # Uniformly random videos, so the response cache helps less as the catalog grows
+    errors = []
+
+    def call(rng):
+        response = server.app.test_client().get(
+            f"/api/recommendations?video_id={video_ids[rng.integers(len(video_ids))]}"
+            f"&limit={rng.integers(1, 21)}&page={rng.integers(1, 3)}")
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    throughput = _run_for(seconds, clients, call)
+    return {
+        'rows': len(video_ids),
+        'startup_seconds': startup,
+        'startup_rss_mb': startup_rss,
+        'peak_rss_mb': peak_rss_mb(),
+        'latency_p50_ms': float(np.percentile(samples, 50)),
+        'latency_p99_ms': float(np.percentile(samples, 99)),
+        'throughput_rps': throughput,
+        'api_cache_hit_ratio': server.api_cache.stats()['hit_ratio'],
+        'errors': len(errors),
+    }
+
+
+def run_size(size, args):
+    """Generate, build and measure one catalog size in child processes; returns its metrics."""
+    size_dir = os.path.join(args.work_dir, str(size))
+    csv_path = write_catalog(size, os.path.join(args.work_dir, f'catalog-{size}-seed{args.seed}.csv'), args.seed)
+    out_dir = os.path.join(size_dir, 'artifacts')
+    shutil.rmtree(out_dir, ignore_errors=True)
+    env = dict(os.environ, YUGI_CSV_PATH=csv_path, YUGI_ARTIFACT_DIR=out_dir, YUGI_ENCODER=args.encoder,
+               YUGI_HISTORY_BACKEND='memory', YUGI_HISTORY_DB=os.path.join(size_dir, 'watch_history.db'),
+               YUGI_SNAPSHOT_REFRESH_INTERVAL='1e9')
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'src.services.artifacts', 'build-artifacts', '--force',
+                    '--csv', csv_path, '--out', out_dir, '--encoder', args.encoder],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+    build_seconds = time.perf_counter() - start
+
+    # A fresh process per size, so startup time and peak RSS are those of this catalog alone
+    child = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--measure',
+                            '--requests', str(args.requests), '--clients', str(args.clients),
+                            '--seconds', str(args.seconds), '--top-n', str(args.top_n)],
+                           env=env, check=True, stdout=subprocess.PIPE, text=True)
+    metrics = json.loads(child.stdout.strip().splitlines()[-1])
+    metrics['build_seconds'] = build_seconds
+    return metrics
+
+
+def compare(results, baseline, threshold):
+    """Print every metric against the baseline; returns the regressions as (size, metric, change)."""
+    regressions = []
+    for size, metrics in results['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is None:
+            print(f"  size={size}: no baseline")
+            continue
+        for name, lower_is_better in METRICS.items():
+            if not base.get(name) or name not in metrics:
+                continue
+            change = metrics[name] / base[name] - 1
+            worse = change > threshold if lower_is_better else change < -threshold
+            if worse:
+                regressions.append((size, name, change))
+            print(f"  size={size:>7} {name:16s} {base[name]:12.3f} -> {metrics[name]:12.3f} "
+                  f"({change:+7.1%}){'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated catalog sizes (1000 to 500000)")
+    parser.add_argument('--requests', type=int, default=300, help="hybrid_recommendation calls for the latency")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent client threads for the throughput")
+    parser.add_argument('--seconds', type=float, default=5, help="Duration of the throughput run")
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--encoder', default='hashing', help="Embedding encoder (hashing runs offline)")
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help="Synthetic catalogs and their builds")
+    parser.add_argument('--output', default=None, help="Results JSON (default: <work dir>/results-<time>.json)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Largest tolerated relative slowdown before a metric counts as a regression")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        # Child mode: the server prints while loading, so the metrics go on the last line
+        print(json.dumps(measure(args.requests, args.clients, args.seconds, args.top_n, args.seed)))
+        return 0
+
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'encoder': args.encoder,
+        'sizes': {},
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        print(f"size={size}: generating, building and measuring...")
+        metrics = results['sizes'][str(size)] = run_size(size, args)
+        print(f"  build={metrics['build_seconds']:.1f}s startup={metrics['startup_seconds']:.2f}s "
+              f"rss={metrics['startup_rss_mb']:.0f}MB peak={metrics['peak_rss_mb']:.0f}MB "
+              f"p50={metrics['latency_p50_ms']:.2f}ms p99={metrics['latency_p99_ms']:.2f}ms "
+              f"throughput={metrics['throughput_rps']:.0f} req/s (cache hit ratio "
+              f"{metrics['api_cache_hit_ratio']:.2f}, {metrics['errors']} errors)")
+
+    output = args.output or os.path.join(args.work_dir, f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"against {args.baseline} (threshold {args.threshold:.0%}):")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): " +
+                  ', '.join(f"{name}@{size} {change:+.1%}" for size, name, change in regressions))
+            status = 1
+    elif not args.update_baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one")
+    if any(metrics['errors'] for metrics in results['sizes'].values()):
+        status = 1
+    if args.update_baseline:
+        shutil.copyfile(output, args.baseline)
+        print(f"Updated baseline {args.baseline}")
+    return status
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+"""
+Synthetic catalog generator with the schema of data/YT_data.csv.
+
+Videos are drawn from topics: every topic has its own vocabulary, and every channel posts
+mostly about one topic in one category, so titles, descriptions and tags cluster the way a
+real catalog does (TF-IDF and embedding neighbors are meaningful, channel and category
+groups have realistic sizes). Categories follow the distribution of the bundled CSV and
+engagement rates are log-normal. The same size and seed always give the same CSV.
+
+    python -m benchmarks.synthetic 100000 data/bench/catalog-100000.csv [--seed 0]
+"""
+import argparse
+import os
+import string
+
+import numpy as np
+import pandas as pd
+
+# Category distribution of data/YT_data.csv
+CATEGORY_WEIGHTS = {
+    27: 325, 28: 152, 22: 103, 24: 72, 25: 49, 17: 46, 26: 45, 19: 41, 10: 32, 1: 12, 23: 10, 29: 8, 2: 3, 20: 2,
+}
+N_TOPICS = 200
+TOPIC_VOCABULARY = 300
+SHARED_VOCABULARY = 2000
+# Average videos per channel (the bundled CSV has about 1.5; large catalogs have bigger channels)
+VIDEOS_PER_CHANNEL = 8
+TITLE_WORDS = (4, 14)
+DESCRIPTION_WORDS = (10, 120)
+TAGS = (3, 12)
+# Share of words drawn from the topic vocabulary (the rest is shared filler)
+TOPIC_WORD_SHARE = 0.6
+
+
+def _vocabulary(rng, size, length=(3, 10)):
+    """`size` distinct random lowercase words, sorted."""
+    letters = np.array(list(string.ascii_lowercase))
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters, rng.integers(*length))))
+    return np.array(sorted(words))
+
+
+def _texts(rng, topics, topic_words, shared_words, length):
+    """One text per row: words from the row's topic vocabulary mixed with shared filler."""
+    counts = rng.integers(*length, size=len(topics))
+    total = int(counts.sum())
+    owners = np.repeat(np.arange(len(topics)), counts)
+    from_topic = rng.random(total) < TOPIC_WORD_SHARE
+    words = np.where(from_topic,
+                     topic_words[topics[owners], rng.integers(topic_words.shape[1], size=total)],
+                     shared_words[rng.integers(len(shared_words), size=total)])
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    return [' '.join(words[bounds[i]:bounds[i + 1]]) for i in range(len(topics))]
+
+
+def generate_catalog(n_rows, seed=0):
+    """
+    A synthetic catalog DataFrame with the columns of data/YT_data.csv.
+
+    Args:
+        n_rows (int): Number of videos.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: One row per video (unique v_id).
+    """
+    rng = np.random.default_rng(seed)
+    topic_words = rng.permutation(_vocabulary(rng, N_TOPICS * TOPIC_VOCABULARY)).reshape(N_TOPICS, TOPIC_VOCABULARY)
+    shared_words = _vocabulary(rng, SHARED_VOCABULARY, length=(2, 8))
+
+    # Channels have a home topic and category; channel sizes are skewed (a few large channels)
+    n_channels = max(1, n_rows // VIDEOS_PER_CHANNEL)
+    categories = np.array(list(CATEGORY_WEIGHTS))
+    category_p = np.array(list(CATEGORY_WEIGHTS.values()), dtype=np.float64)
+    channel_topic = rng.integers(N_TOPICS, size=n_channels)
+    channel_category = rng.choice(categories, size=n_channels, p=category_p / category_p.sum())
+    channel_weight = rng.pareto(1.5, size=n_channels) + 1
+    channel = rng.choice(n_channels, size=n_rows, p=channel_weight / channel_weight.sum())
+    # Most videos follow their channel's topic, some wander off
+    topics = np.where(rng.random(n_rows) < 0.8, channel_topic[channel], rng.integers(N_TOPICS, size=n_rows))
+
+    alphabet = np.array(list(string.ascii_letters + string.digits + '-_'))
+    video_ids = [''.join(chars) for chars in rng.choice(alphabet, size=(n_rows, 11))]
+    channel_ids = np.array(['UC' + ''.join(chars) for chars in rng.choice(alphabet, size=(n_channels, 22))])
+    channel_names = np.array([f'Channel {i}' for i in range(n_channels)])
+    subscribers = (rng.lognormal(12, 2.5, size=n_channels)).astype(np.int64)
+
+    views = rng.lognormal(13, 2.5, size=n_rows).astype(np.int64) + 1
+    engagement = np.clip(rng.lognormal(np.log(0.03), 0.8, size=n_rows), 0, 1).round(4)
+    likes = (views * engagement * 0.9).astype(np.int64)
+    comments = (views * engagement * 0.1).astype(np.int64)
+    published = pd.Timestamp('2025-03-01') - pd.to_timedelta(rng.integers(0, 5 * 365 * 86400, size=n_rows), unit='s')
+    seconds = rng.integers(30, 3 * 3600, size=n_rows)
+
+    tag_lists = _texts(rng, topics, topic_words, shared_words, TAGS)
+    return pd.DataFrame({
+        'v_id': video_ids,
+        'v_title': _texts(rng, topics, topic_words, shared_words, TITLE_WORDS),
+        'channel_name': channel_names[channel],
+        'channel_id': channel_ids[channel],
+        'published_at': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'v_description': _texts(rng, topics, topic_words, shared_words, DESCRIPTION_WORDS),
+        'view_count': views,
+        'like_count': likes,
+        'comment_count': comments,
+        'engagement_rate': engagement,
+        'duration': [f'{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}' for s in seconds],
+        'category_id': channel_category[channel],
+        'tags': [tags.replace(' ', ', ') for tags in tag_lists],
+        'subscribers': subscribers[channel],
+        'channel_url': np.char.add('https://www.youtube.com/channel/', channel_ids[channel]),
+    }).drop_duplicates(subset='v_id', ignore_index=True)
+
+
+def write_catalog(n_rows, path, seed=0):
+    """Write a synthetic catalog CSV (reused when it already exists) and return its path."""
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        generate_catalog(n_rows, seed).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('rows', type=int)
+    parser.add_argument('path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.path):
+        os.remove(args.path)
+    write_catalog(args.rows, args.path, args.seed)
+    print(f"Wrote a synthetic catalog of {args.rows} videos to {args.path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,231 +1,511 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context, g
 from flask_cors import CORS
 import os
-import pandas as pd
 import numpy as np
 import json
+import hashlib
 import time
+import argparse
+import gc
+import signal
+import socket
 from functools import wraps
-import threading
-# Import the recommendation function from the recommendation module
-from src.services.recommendation import hybrid_recommendation, df, cosine_sim
+# Import the recommendation function from the recommendation module (the model itself is loaded by start_warmup)
+from src.services.recommendation import (batch_hybrid_recommendation, ensure_snapshot_watcher, get_snapshot,
+                                         invalidation_hooks, recommendation_cache, stage_seconds, start_warmup,
+                                         wait_until_ready, warmup_state)
+from src.services.pagination import decode_cursor, encode_cursor, get_ranking, ranking_cache
+from src.services.fragments import response_body, result as result_json
+from src.services.personalization import record_view, for_you_recommendation
+from src.services.search import MAX_QUERY_LENGTH, MAX_SEARCH_RESULTS, search as search_catalog
+from src.services.cache import ShardedLRUCache
+from src.services.history import WatchHistoryStore
+from src.services.explore import explore_rows, new_session
+from src.services.als import ensure_retraining as ensure_als_retraining
+from src.services.metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, gauge, histogram, process_start_time,
+                                  register_cache, render as render_metrics)
+from src.services.profiler import profiler
+from src.services.shards import SHARD_ADDRESSES, shard_authkey
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# We're now importing df and cosine_sim from recommendation.py
+# The model (catalog, neighbor index, ...) is loaded in background stages, so the server answers
+# health checks right away and serves from whatever stage is loaded (see recommendation.start_warmup)
+start_warmup()
+# Sharded mode (YUGI_SHARDS): video rankings come from the shard servers (see pagination.get_ranking);
+# without their key every ranking would fail, so refuse to start
+if SHARD_ADDRESSES:
+    shard_authkey()
+# Stage /readyz waits for: 'catalog' (explore feed), 'content' (content-only recommendations) or 'ready'
+READY_STAGE = os.environ.get('YUGI_READY_STAGE', 'ready')
+WARMUP_STAGES = ('starting', 'catalog', 'content', 'ready')
 
-# Store user watch history
-user_watch_history = {}
+# Store user watch history (recent views in memory, persisted to SQLite in the background)
+watch_history = WatchHistoryStore()
 
-# API response cache with improved structure and memory management
-from collections import OrderedDict
+# API response cache: lock-striped LRU of serialized responses, bounded in entries and bytes
+API_CACHE_EXPIRATION = 600  # 10 minutes - increased cache duration
+API_CACHE_MAX_BYTES = int(os.environ.get('YUGI_API_CACHE_BYTES', 64 * 1024 * 1024))
+api_cache = ShardedLRUCache(1000, max_bytes=API_CACHE_MAX_BYTES, sizeof=lambda entry: len(entry['body']))
+register_cache('api', api_cache)
+
+# Handler latency per endpoint and status (stages of the recommendation path are in yugi_recommendation_stage_seconds)
+request_seconds = histogram('yugi_request_seconds', 'Time to handle a request', ('endpoint', 'status'))
+first_response_seconds = gauge('yugi_time_to_first_response_seconds',
+                               'Seconds from process start until the first successful API response')
+# Seconds from process start until the first successful /api/ response, and the model stage it was served from
+first_response = {}
+
+# Largest number of video_ids accepted by /api/recommendations/batch
+MAX_BATCH_SIZE = int(os.environ.get('YUGI_MAX_BATCH_SIZE', 10000))
+
+# Shared secret for /api/admin/ingest (the endpoint is disabled when unset)
+ADMIN_TOKEN = os.environ.get('YUGI_ADMIN_TOKEN')
 
-class APICache(OrderedDict):
-    def __init__(self, capacity=1000):
-        super().__init__()
-        self.capacity = capacity
 
-    def get(self, key):
-        if key not in self:
+def invalidate_api_cache(video_ids):
+    """Drop cached API responses for the given video ids (all of them when None)."""
+    if video_ids is None:
+        api_cache.clear()
+    else:
+        api_cache.purge(lambda key, entry: _cached_video_id(key) in video_ids)
+
+
+def _cached_video_id(key):
+    """Source video of a cached API response (cursor pages carry it inside the cursor)."""
+    params = json.loads(key.split('?', 1)[1])
+    if 'cursor' in params:
+        try:
+            return decode_cursor(params['cursor'])['video_id']
+        except ValueError:
             return None
-        self.move_to_end(key)
-        return self[key]
+    return params.get('video_id')
 
-    def put(self, key, value):
-        if key in self:
-            self.move_to_end(key)
-        self[key] = value
-        if len(self) > self.capacity:
-            self.popitem(last=False)
+# Cached responses follow the recommendation cache when a new model snapshot is published
+invalidation_hooks.append(invalidate_api_cache)
+
+
+@app.before_request
+def start_request_timer():
+    """Time the request and, when the sampling profiler is enabled, sample its stack."""
+    g.request_start = time.perf_counter()
+    profiler.begin(request.endpoint)
+
+
+@app.after_request
+def record_request_time(response):
+    request_seconds.observe(time.perf_counter() - g.request_start, request.endpoint or 'unmatched', response.status_code)
+    if not first_response and response.status_code < 300 and request.path.startswith('/api/'):
+        first_response.update(seconds=time.time() - process_start_time(), stage=warmup_state['phase'])
+        first_response_seconds.set(first_response['seconds'])
+    return response
+
+
+@app.teardown_request
+def end_request_profile(exc):
+    profiler.end()
 
-api_cache = APICache()
-API_CACHE_EXPIRATION = 600  # 10 minutes - increased cache duration
 
-# Background processing lock to prevent multiple heavy operations
-processing_lock = threading.Lock()
+@app.before_request
+def start_als_retraining():
+    """Train the collaborative (ALS) model from the stored views in the background, once per worker."""
+    # Not during warm-up: training would compete with it for the CPU
+    if warmup_state['phase'] == 'ready':
+        ensure_als_retraining(watch_history.backend.iter_views, lambda: get_snapshot().catalog)
 
-# Improved caching decorator for API responses
-def cache_response(expiration=API_CACHE_EXPIRATION):
+
+@app.before_request
+def start_snapshot_watcher():
+    """Pick up model builds published by other processes (the ingest command, other workers) in the background."""
+    ensure_snapshot_watcher()
+
+# Caching decorator for API responses: the serialized JSON body is cached with its ETag.
+# `bypass` is called before the lookup; requests it returns True for are answered without the cache.
+def cache_response(expiration=API_CACHE_EXPIRATION, bypass=None):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            if bypass is not None and bypass():
+                response = make_response(f(*args, **kwargs))
+                response.headers['X-Cache'] = 'BYPASS'
+                return response
+            
             # Create a more specific cache key from the request URL and relevant query parameters
             # This avoids cache misses due to irrelevant parameters
             base_url = request.path
             query_params = {}
             
             # Only include relevant parameters in the cache key
-            relevant_params = ['video_id', 'limit', 'page']
+            relevant_params = ['q', 'video_id', 'limit', 'page', 'session', 'cursor']
             for param in relevant_params:
                 if param in request.args:
                     query_params[param] = request.args.get(param)
             
             # Create a deterministic cache key
             cache_key = f"{base_url}?{json.dumps(query_params, sort_keys=True)}"
-            current_time = time.time()
-            
-            # Return cached response if available and not expired
-            if cache_key in api_cache:
-                cache_entry = api_cache[cache_key]
-                if current_time - cache_entry['timestamp'] < expiration:
-                    response = make_response(cache_entry['data'])
-                    response.headers['X-Cache'] = 'HIT'
-                    return response
+            computed = []
             
-            # Generate the response if not in cache or expired
-            response = f(*args, **kwargs)
+            def compute():
+                computed.append(True)
+                response = make_response(f(*args, **kwargs))
+                body = response.get_data()
+                return {
+                    'status': response.status_code,
+                    'mimetype': response.mimetype,
+                    'body': body,
+                    'etag': hashlib.blake2b(body, digest_size=16).hexdigest(),
+                    # Stage of the model the handler read (see _serving_snapshot)
+                    'stage': g.get('model_stage', 'ready'),
+                    # Set by handlers whose body is specific to this client (e.g. a newly issued session)
+                    'private': g.get('private_response', False),
+                }
             
-            # Cache the response
-            api_cache[cache_key] = {
-                'data': response.get_data(),
-                'timestamp': current_time
-            }
+            # Concurrent misses on the same key render the response once; only successes of the
+            # full model are cached (answers given during warm-up would outlive it)
+            entry = api_cache.get_or_compute(
+                cache_key, compute, ttl=expiration,
+                cacheable=lambda entry: entry['status'] == 200 and entry['stage'] == 'ready' and not entry['private'])
             
-            # Clean up old cache entries periodically (only do this 10% of the time to reduce overhead)
-            if hash(cache_key) % 10 == 0:
-                for key in list(api_cache.keys()):
-                    if current_time - api_cache[key]['timestamp'] > expiration:
-                        del api_cache[key]
-                    
-            response.headers['X-Cache'] = 'MISS'
+            if entry['status'] == 200 and request.if_none_match.contains(entry['etag']):
+                # The client already has this exact body
+                response = Response(status=304)
+            else:
+                response = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+            if entry['status'] == 200:
+                response.set_etag(entry['etag'])
+            response.headers['X-Cache'] = 'MISS' if computed else 'HIT'
             return response
         return decorated_function
     return decorator
 
+def _serving_snapshot():
+    """The current (possibly partial) snapshot, remembering its stage for the response cache."""
+    snapshot = get_snapshot()
+    g.model_stage = snapshot.stage if snapshot is not None else 'starting'
+    return snapshot
+
+
+def warming_up():
+    """503 answer for requests that need more of the model than warm-up has loaded."""
+    response = jsonify({"error": "The model is still loading", "phase": warmup_state['phase']})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def warmup_status():
+    """Warm-up phase, the stage being loaded, per-stage timings and time to first response."""
+    return {
+        "phase": warmup_state['phase'],
+        "loading": warmup_state['loading'],
+        "error": warmup_state['error'],
+        "uptime_seconds": time.time() - process_start_time(),
+        "stages_reached_seconds": dict(warmup_state['reached']),
+        "first_response": dict(first_response) or None,
+    }
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: 200 as soon as the process answers, with the warm-up phase it is in."""
+    return jsonify({"status": "ok", **warmup_status()})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once warm-up has served YUGI_READY_STAGE (default: the full model), 503 before."""
+    status = warmup_status()
+    ready = WARMUP_STAGES.index(status['phase']) >= WARMUP_STAGES.index(READY_STAGE) \
+        if status['phase'] in WARMUP_STAGES else False
+    return jsonify({"ready": ready, "ready_stage": READY_STAGE, **status}), 200 if ready else 503
+
 # We're now importing hybrid_recommendation from recommendation.py
 
+def explore_recommendations(snapshot, session, top_n, offset):
+    """
+    Explore-feed videos formatted for the frontend (used without a valid video_id), as JSON objects.
+
+    Pages are O(top_n) slices of the session's fixed permutation of the catalog, so they
+    never overlap and a page always returns the same videos.
+    """
+    catalog = snapshot.catalog
+    return [result_json(catalog, row) for row in explore_rows(snapshot.explore_pool, session, top_n, offset)]
+
+
+def format_recommendations(recs, catalog):
+    """JSON objects of hybrid_recommendation results for the frontend (their display fields are pre-serialized)."""
+    return [result_json(catalog, catalog.row_of(rec['id']), rec['score']) for rec in recs]
+
+
+def results_response(results, payload):
+    """
+    JSON response holding the pre-serialized `results` (see fragments.py) and the `payload` fields.
+
+    The video objects are joined as they are instead of being rebuilt and re-serialized by jsonify.
+    """
+    return Response(response_body(results, payload), mimetype='application/json')
+
+
+def _issues_session():
+    """Whether the request gets a new explore session, which must not be served to other clients."""
+    if request.args.get('session') or request.args.get('cursor'):
+        return False
+    # Only the explore feed hands out sessions: no video_id, or one that falls back to it
+    video_id = request.args.get('video_id')
+    snapshot = get_snapshot()
+    return (not video_id or snapshot is None or (snapshot.stage == 'catalog' and not SHARD_ADDRESSES)
+            or snapshot.catalog.row_of(video_id) is None)
+
+
 @app.route('/api/recommendations', methods=['GET'])
-@cache_response(expiration=600)  # Cache recommendations for 10 minutes
+@cache_response(expiration=600, bypass=_issues_session)  # Cache recommendations for 10 minutes
 def get_recommendations():
+    """
+    Recommendations for a video, or the explore feed without one, one page at a time.
+
+    Pages are O(limit) slices of a ranking computed once per video (see pagination.py).
+    Every response carries `next_cursor`; passing it back as `cursor` returns the next page.
+    """
     # Extract and validate parameters
     video_id = request.args.get('video_id')
+    # Explore-feed session: fixes the order of the random pages (a new one is handed out when the feed is served
+    # without one)
+    session = request.args.get('session')
+    cursor = request.args.get('cursor')
+    started_at = None
     try:
-        top_n = min(int(request.args.get('limit', 5)), 20)  # Limit max recommendations to 20
+        top_n = max(1, min(int(request.args.get('limit', 5)), 20))  # Limit max recommendations to 20
         page = max(int(request.args.get('page', 1)), 1)  # Pagination support, default to page 1
+        # Calculate offset for pagination
+        offset = (page - 1) * top_n
+        if cursor:
+            # The cursor names the feed and the position of its next page
+            position = decode_cursor(cursor)
+            if position['expired']:
+                return jsonify({"error": "Cursor expired; request the first page again"}), 410
+            video_id, session = position['video_id'], position['session'] or session
+            offset, started_at = position['offset'], position['started_at']
+            page = offset // max(top_n, 1) + 1
     except ValueError:
         return jsonify({"error": "Invalid parameters"}), 400
     
-    # Calculate offset for pagination
-    offset = (page - 1) * top_n
-    
-    # Use a processing lock to prevent multiple heavy operations at once
-    with processing_lock:
-        if not video_id:
-            # If no video_id is provided, return random recommendations with pagination
-            # Pre-filter the dataset to avoid processing the entire dataframe
-            filtered_df = df.dropna(subset=['v_id', 'v_title']).sample(min(top_n * 2, len(df)))
-            
-            # Apply pagination
-            recommendations = [
-                {
-                    "id": row['v_id'],
-                    "title": row['v_title'],
-                    "link": "https://www.youtube.com/watch?v=" + row['v_id'],
-                    "description": row['v_description'][:200] if pd.notna(row['v_description']) else "",  # Limit description length
-                    "tags": row['tags'] if pd.notna(row['tags']) else "",
-                    "category": row['category_id'],
-                    "thumbnail": f"https://img.youtube.com/vi/{row['v_id']}/mqdefault.jpg",
-                    "channel": row['channel_name'] if 'channel_name' in row and pd.notna(row['channel_name']) else "YouTube Creator",
-                    "views": f"{(hash(row['v_id']) % 200) + 10}K views",
-                    "timestamp": f"{(hash(row['v_id']) % 30) + 1} days ago"
-                }
-                for _, row in filtered_df.iloc[offset:offset+top_n].iterrows()
-            ]
+    # The snapshot is immutable, so requests read it concurrently without a lock
+    snapshot = _serving_snapshot()
+    if snapshot is None:
+        return warming_up()
+    catalog = snapshot.catalog
+    ranking = None
+    if video_id and snapshot.stage == 'catalog' and not SHARD_ADDRESSES:
+        # Warming up: only the explore feed can be served until the content index is loaded
+        # (the shards rank videos from the catalog stage on)
+        video_id = None
+    if video_id:
+        # Check if the video_id exists in our dataset
+        if catalog.row_of(video_id) is not None:
+            try:
+                # Deep ranking of the video, computed once and then sliced by every page
+                ranking = get_ranking(video_id, snapshot)
+            except Exception as e:
+                print(f"Error generating recommendations: {e}")
         else:
-            # Check if the video_id exists in our dataset
-            if not df[df['v_id'] == video_id].empty:
-                try:
-                    # Get recommendations based on the video_id from our dataset
-                    raw_recommendations = hybrid_recommendation(video_id, top_n * 2)  # Get more recommendations for pagination
-                    
-                    # Apply pagination to raw recommendations
-                    paginated_recommendations = raw_recommendations[offset:offset+top_n] if offset < len(raw_recommendations) else []
-                    
-                    # Format the recommendations for the frontend
-                    recommendations = []
-                    for rec in paginated_recommendations:
-                        if isinstance(rec, dict) and "error" in rec:
-                            return jsonify({"error": rec["error"]}), 404
-                        
-                        # Create a new dict to avoid modifying the original
-                        formatted_rec = rec.copy()
-                        
-                        # Add data for frontend display
-                        formatted_rec["thumbnail"] = f"https://img.youtube.com/vi/{rec['id']}/mqdefault.jpg"
-                        
-                        # Get channel name from recommendation or dataset if available
-                        if 'channel_name' in rec and rec['channel_name']:
-                            formatted_rec["channel"] = rec['channel_name']
-                        else:
-                            # Use vectorized operations for better performance
-                            video_data = df[df['v_id'] == rec['id']]
-                            if not video_data.empty and 'channel_name' in video_data.columns and pd.notna(video_data['channel_name'].iloc[0]):
-                                formatted_rec["channel"] = video_data['channel_name'].iloc[0]
-                            else:
-                                formatted_rec["channel"] = "YouTube Creator"
-                        
-                        # Remove channel_name to avoid duplication
-                        if 'channel_name' in formatted_rec:
-                            del formatted_rec['channel_name']
-                        
-                        # Limit description length to reduce payload size
-                        if 'description' in formatted_rec and formatted_rec['description']:
-                            formatted_rec["description"] = formatted_rec["description"][:200]
-                            
-                        formatted_rec["views"] = f"{(hash(rec['id']) % 200) + 10}K views"
-                        formatted_rec["timestamp"] = f"{(hash(rec['id']) % 30) + 1} days ago"
-                        recommendations.append(formatted_rec)
-                except Exception as e:
-                    print(f"Error generating recommendations: {e}")
-                    # Fall back to random recommendations on error
-                    filtered_df = df.dropna(subset=['v_id', 'v_title']).sample(min(top_n * 2, len(df)))
-                    recommendations = [
-                        {
-                            "id": row['v_id'],
-                            "title": row['v_title'],
-                            "link": "https://www.youtube.com/watch?v=" + row['v_id'],
-                            "description": row['v_description'][:200] if pd.notna(row['v_description']) else "",
-                            "tags": row['tags'] if pd.notna(row['tags']) else "",
-                            "category": row['category_id'],
-                            "thumbnail": f"https://img.youtube.com/vi/{row['v_id']}/mqdefault.jpg",
-                            "channel": row['channel_name'] if 'channel_name' in row and pd.notna(row['channel_name']) else "YouTube Creator",
-                            "views": f"{(hash(row['v_id']) % 200) + 10}K views",
-                            "timestamp": f"{(hash(row['v_id']) % 30) + 1} days ago"
-                        }
-                        for _, row in filtered_df.iloc[offset:offset+top_n].iterrows()
-                    ]
-            else:
-                # If the video_id is not in our dataset, return random recommendations
-                print(f"Video ID {video_id} not found in dataset, returning random recommendations")
-                filtered_df = df.dropna(subset=['v_id', 'v_title']).sample(min(top_n * 2, len(df)))
-                recommendations = [
-                    {
-                        "id": row['v_id'],
-                        "title": row['v_title'],
-                        "link": "https://www.youtube.com/watch?v=" + row['v_id'],
-                        "description": row['v_description'][:200] if pd.notna(row['v_description']) else "",
-                        "tags": row['tags'] if pd.notna(row['tags']) else "",
-                        "category": row['category_id'],
-                        "thumbnail": f"https://img.youtube.com/vi/{row['v_id']}/mqdefault.jpg",
-                        "channel": row['channel_name'] if 'channel_name' in row and pd.notna(row['channel_name']) else "YouTube Creator",
-                        "views": f"{(hash(row['v_id']) % 200) + 10}K views",
-                        "timestamp": f"{(hash(row['v_id']) % 30) + 1} days ago"
-                    }
-                    for _, row in filtered_df.iloc[offset:offset+top_n].iterrows()
-                ]
+            print(f"Video ID {video_id} not found in dataset, returning explore recommendations")
+    
+    if ranking is not None:
+        # The page's pre-serialized videos with their scores (an O(limit) slice, nothing is rescored)
+        with stage_seconds.time('format'):
+            recommendations = [result_json(ranking.catalog, row, score) for row, score in
+                               zip(ranking.rows[offset:offset + top_n], ranking.scores[offset:offset + top_n])]
+        has_more = offset + top_n < len(ranking)
+        next_cursor = encode_cursor(offset + top_n, video_id=video_id, started_at=started_at) if has_more else None
+    else:
+        # No (valid) video_id, or scoring failed: the session's explore feed with pagination
+        if session is None:
+            session = new_session()
+            g.private_response = True
+        recommendations = explore_recommendations(snapshot, session, top_n, offset)
+        has_more = offset + top_n < len(snapshot.explore_pool)
+        next_cursor = encode_cursor(offset + top_n, session=session, started_at=started_at) if has_more else None
     
     # Add pagination metadata
     response = {
-        "results": recommendations,
+        "pagination": {
+            "page": page,
+            "limit": top_n,
+            "total_results": len(recommendations),
+            "next_cursor": next_cursor
+        },
+        "session": session
+    }
+    
+    return results_response(recommendations, response)
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+def get_batch_recommendations():
+    """
+    Recommendations for many videos in one call.
+
+    Body: {"video_ids": [...], "limit": 5}. The response is streamed as NDJSON, one
+    {"video_id": ..., "results": [...]} (or {"video_id": ..., "error": ...}) line per id,
+    in request order, so memory stays bounded for large batches.
+    """
+    data = request.get_json(silent=True) or {}
+    video_ids = data.get('video_ids')
+    if not isinstance(video_ids, list) or not all(isinstance(v, str) for v in video_ids):
+        return jsonify({"error": "video_ids must be a list of strings"}), 400
+    if len(video_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} video_ids per batch"}), 413
+    try:
+        top_n = max(1, min(int(data.get('limit', 5)), 20))  # Same cap as /api/recommendations
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid parameters"}), 400
+    
+    snapshot = get_snapshot()
+    if snapshot is None or snapshot.stage == 'catalog':
+        return warming_up()
+    
+    def generate():
+        for video_id, recs in batch_hybrid_recommendation(video_ids, top_n, snapshot=snapshot):
+            if recs and "error" in recs[0]:
+                yield json.dumps({"video_id": video_id, "error": recs[0]["error"]}) + "\n"
+            else:
+                yield response_body(format_recommendations(recs, snapshot.catalog), {"video_id": video_id}) + b"\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/recommendations/for-you', methods=['GET'])
+def get_for_you_recommendations():
+    """
+    Personalized feed for a user, built from the videos they watched (see /api/track-view).
+
+    Users without any tracked views get the explore feed, like /api/recommendations.
+    Not cached: the feed changes with every tracked view.
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Missing user_id parameter"}), 400
+    try:
+        top_n = max(1, min(int(request.args.get('limit', 5)), 20))  # Limit max recommendations to 20
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters"}), 400
+    offset = (page - 1) * top_n
+    
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return warming_up()
+    # Profiles are embedding-based, so the feed is personalized once the full model is loaded
+    raw_recommendations = None
+    if snapshot.stage == 'ready':
+        # Profiles missing in this worker are rebuilt from the stored watch history
+        raw_recommendations = for_you_recommendation(user_id, top_n, offset, snapshot=snapshot, history=watch_history)
+    if raw_recommendations is None:
+        # The user id doubles as the explore session, so cold-start pages stay consistent
+        recommendations = explore_recommendations(snapshot, request.args.get('session') or user_id, top_n, offset)
+    else:
+        recommendations = format_recommendations(raw_recommendations, snapshot.catalog)
+    
+    return results_response(recommendations, {
         "pagination": {
             "page": page,
             "limit": top_n,
             "total_results": len(recommendations)
+        },
+        "personalized": raw_recommendations is not None
+    })
+
+@app.route('/api/search', methods=['GET'])
+@cache_response(expiration=600)  # Cache search results for 10 minutes
+def search_videos():
+    """
+    Keyword search over titles, descriptions and tags, one page at a time (see search.py).
+
+    With `video_id` (the video being watched), results get the same channel and category
+    boosts as its recommendations.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "Missing q parameter"}), 400
+    if len(query) > MAX_QUERY_LENGTH:
+        return jsonify({"error": f"q is longer than {MAX_QUERY_LENGTH} characters"}), 400
+    try:
+        top_n = max(1, min(int(request.args.get('limit', 5)), 20))  # Limit max results to 20
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters"}), 400
+    offset = (page - 1) * top_n
+    
+    # Search reads the TF-IDF of the 'content' warm-up stage
+    snapshot = _serving_snapshot()
+    if snapshot is None or snapshot.stage == 'catalog':
+        return warming_up()
+    catalog = snapshot.catalog
+    video_id = request.args.get('video_id')
+    source = catalog.row_of(video_id) if video_id else None
+    
+    # One result more than the page tells whether there is a next one
+    depth = min(offset + top_n + 1, MAX_SEARCH_RESULTS)
+    with stage_seconds.time('search'):
+        rows, scores, _ = search_catalog(query, depth, snapshot, source)
+    with stage_seconds.time('format'):
+        results = [result_json(catalog, row, score)
+                   for row, score in zip(rows[offset:offset + top_n], scores[offset:offset + top_n])]
+    
+    return results_response(results, {
+        "query": query,
+        "pagination": {
+            "page": page,
+            "limit": top_n,
+            "total_results": len(results),
+            "has_more": len(rows) > offset + top_n
         }
-    }
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit, miss, eviction, expiry and byte counters of the response, recommendation and ranking caches."""
+    return jsonify({
+        "api": api_cache.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "rankings": ranking_cache.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage and request latency histograms, cache counters, lock waits and startup phases (Prometheus text format)."""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/metrics/profile', methods=['GET'])
+def get_profile():
+    """Collapsed stacks sampled from in-flight requests (YUGI_PROFILER=1); ?reset=1 clears them."""
+    if not profiler.enabled:
+        return jsonify({"error": "The sampling profiler is disabled; start the server with YUGI_PROFILER=1"}), 404
+    return Response(profiler.collapsed(reset=request.args.get('reset') == '1'), mimetype='text/plain')
+
+@app.route('/api/admin/ingest', methods=['POST'])
+def ingest():
+    """
+    Add videos to the catalog without a restart or full rebuild.
+
+    Body: {"videos": [{"v_id": ..., "v_title": ..., ...}, ...]} with the catalog CSV columns.
+    Requires the X-Admin-Token header to match YUGI_ADMIN_TOKEN.
+    """
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True) or {}
+    videos = data.get('videos')
+    if not isinstance(videos, list) or not all(isinstance(v, dict) for v in videos):
+        return jsonify({"error": "videos must be a list of objects"}), 400
+    if warmup_state['phase'] != 'ready':
+        return warming_up()
     
-    return jsonify(response)
+    import pandas as pd
+    from src.services.ingest import ingest_videos
+    try:
+        stats = ingest_videos(pd.DataFrame(videos))
+    except KeyError as e:
+        return jsonify({"error": f"Missing column {e}"}), 400
+    return jsonify(stats)
 
 @app.route('/api/track-view', methods=['POST'])
 def track_view():
@@ -236,21 +516,12 @@ def track_view():
     if not user_id or not video or not video.get('id'):
         return jsonify({"error": "Missing required parameters"}), 400
     
-    # Store the view in the user's watch history
-    if user_id not in user_watch_history:
-        user_watch_history[user_id] = []
-    
-    # Check if the video is already in the history
-    if not any(v.get('id') == video['id'] for v in user_watch_history[user_id]):
-        video['watched_at'] = pd.Timestamp.now().isoformat()
-        user_watch_history[user_id].append(video)
-        
-        # Keep only the most recent 20 videos
-        user_watch_history[user_id] = sorted(
-            user_watch_history[user_id],
-            key=lambda x: x.get('watched_at', ''),
-            reverse=True
-        )[:20]
+    # Store the view in the user's watch history (skipped if it is already in the recent history)
+    if watch_history.add(user_id, video):
+        snapshot = get_snapshot()
+        # Fold the view into the user's profile for the "for you" feed (O(d) update; needs the embeddings)
+        if snapshot is not None and snapshot.stage == 'ready':
+            record_view(user_id, video['id'], snapshot, history=watch_history)
     
     return jsonify({"success": True})
 
@@ -262,10 +533,76 @@ def get_watch_history():
     if not user_id:
         return jsonify({"error": "Missing user_id parameter"}), 400
     
-    # Get the user's watch history
-    history = user_watch_history.get(user_id, [])
+    # Get the user's watch history (from memory, or from the database for inactive users)
+    history = watch_history.get(user_id, limit)
     
-    return jsonify(history[:limit])
+    return jsonify(history)
+
+def _stop_worker(signum, frame):
+    # Unwinds serve_forever in the worker's main thread, so its cleanup runs
+    raise SystemExit(0)
+
+
+def serve_prefork(host, port, workers):
+    """
+    Pre-fork server: the model is loaded once in this process, then `workers` forked
+    children accept connections on the shared listening socket. The memory-mapped
+    artifacts and the frozen snapshot are shared copy-on-write between all of them.
+    """
+    from werkzeug.serving import make_server
+
+    # Children must inherit the complete model: warm up here, before forking
+    wait_until_ready()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    # Move everything allocated so far out of the GC's reach so children don't dirty the shared pages
+    gc.freeze()
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, _stop_worker)
+            server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+            try:
+                server.serve_forever()
+            finally:
+                # Workers leave through os._exit, which skips atexit: write the queued views here
+                watch_history.close()
+                os._exit(0)
+        children.append(pid)
+    print(f"Serving on http://{host}:{port} with {workers} pre-forked workers: {children}")
+
+    def shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="YUGI recommendation API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Number of pre-forked worker processes (0 = single-process debug server)")
+    parser.add_argument('--no-reload', action='store_true',
+                        help="Run the debug server without the code reloader (one process, one warm-up)")
+    args = parser.parse_args()
+    if args.workers > 0:
+        serve_prefork(args.host, args.port, args.workers)
+    else:
+        app.run(debug=True, host=args.host, port=args.port, threaded=True, use_reloader=not args.no_reload)
\ No newline at end of file
@@ -1,11 +1,11 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { supabase } from '../supabaseClient';
 import ThemeToggle from './ThemeToggle';
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Card, CardContent } from "@/components/ui/card";
-import { getRecommendedVideos, trackVideoView, getUserWatchHistory } from '../services/recommendationService';
+import { getRecommendedVideos, getForYouRecommendations, trackVideoView, getUserWatchHistory } from '../services/recommendationService';
 import YouTubePlayer from './YouTubePlayer';
 
 // Mock data for videos
@@ -178,6 +178,13 @@ const HomePage = () => {
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const [recommendedVideos, setRecommendedVideos] = useState([]);
   const [recommendationsLoading, setRecommendationsLoading] = useState(false);
+  // Cursor of the next page of recommendations (null when there is none)
+  const [nextCursor, setNextCursor] = useState(null);
+  // Last page of the personalized feed shown in the grid (null when it shows a video's recommendations)
+  const [forYouPage, setForYouPage] = useState(null);
+  const [forYouHasMore, setForYouHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const loadMoreRef = useRef(null);
   const [watchHistory, setWatchHistory] = useState([]);
   const [watchHistoryLoading, setWatchHistoryLoading] = useState(false);
   const [selectedVideo, setSelectedVideo] = useState(null);
@@ -227,9 +234,10 @@ const HomePage = () => {
           setWatchHistory(history);
           setWatchHistoryLoading(false);
           
-          // Get recommendations from API
+          // Get the personalized feed from the API (the explore feed until the user has watched something)
           setRecommendationsLoading(true);
-          const recommendationsResponse = await getRecommendedVideos(null, 8, 1);
+          const recommendationsResponse = await getForYouRecommendations(user.id, 8, 1);
+          setNextCursor(null);
           
           // Check if we got valid recommendations back
           if (recommendationsResponse && recommendationsResponse.results && 
@@ -237,16 +245,24 @@ const HomePage = () => {
               recommendationsResponse.results.length > 0) {
             console.log('Received recommendations:', recommendationsResponse.results);
             setRecommendedVideos(recommendationsResponse.results);
+            setForYouPage(1);
+            // The feed has no cursor: a full page means there may be another one
+            setForYouHasMore(recommendationsResponse.results.length === 8);
           } else {
             // If no valid recommendations, fall back to mock data
             console.log('No valid recommendations returned, using mock data');
             setRecommendedVideos(MOCK_VIDEOS);
+            setForYouPage(null);
+            setForYouHasMore(false);
           }
           setRecommendationsLoading(false);
         } catch (error) {
           console.error('Error loading user data:', error);
           // Fall back to mock data on error
           setRecommendedVideos(MOCK_VIDEOS);
+          setNextCursor(null);
+          setForYouPage(null);
+          setForYouHasMore(false);
           setWatchHistoryLoading(false);
           setRecommendationsLoading(false);
         }
@@ -256,6 +272,46 @@ const HomePage = () => {
     loadUserData();
   }, [user]);
 
+  // Infinite scroll: append the next page when the end of the grid comes into view
+  const hasMoreRecommendations = Boolean(nextCursor) || forYouHasMore;
+
+  const loadMoreRecommendations = useCallback(async () => {
+    if (!hasMoreRecommendations || loadingMore) {
+      return;
+    }
+    setLoadingMore(true);
+    const response = forYouHasMore
+      ? await getForYouRecommendations(user.id, 8, forYouPage + 1)
+      : await getRecommendedVideos(null, 8, 1, nextCursor);
+    if (response && Array.isArray(response.results)) {
+      setRecommendedVideos((videos) => {
+        const seen = new Set(videos.map((video) => video.id));
+        return [...videos, ...response.results.filter((video) => !seen.has(video.id))];
+      });
+    }
+    if (forYouHasMore) {
+      setForYouPage(forYouPage + 1);
+      setForYouHasMore(response?.results?.length === 8);
+    } else {
+      setNextCursor(response?.pagination?.next_cursor || null);
+    }
+    setLoadingMore(false);
+  }, [hasMoreRecommendations, nextCursor, forYouHasMore, forYouPage, user, loadingMore]);
+
+  useEffect(() => {
+    const sentinel = loadMoreRef.current;
+    if (!sentinel || !hasMoreRecommendations) {
+      return undefined;
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        loadMoreRecommendations();
+      }
+    }, { rootMargin: '400px' });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [hasMoreRecommendations, loadMoreRecommendations, selectedVideo, recommendationsLoading]);
+
   const handleSignOut = async () => {
     try {
       await supabase.auth.signOut();
@@ -328,6 +384,8 @@ const HomePage = () => {
         
         // Get new recommendations based on the selected video
         const videoId = getYouTubeVideoId(video);
+        setForYouPage(null);
+        setForYouHasMore(false);
         
         if (videoId) {
           try {
@@ -340,16 +398,19 @@ const HomePage = () => {
                 Array.isArray(newRecommendationsResponse.results) && 
                 newRecommendationsResponse.results.length > 0) {
               setRecommendedVideos(newRecommendationsResponse.results);
+              setNextCursor(newRecommendationsResponse.pagination?.next_cursor || null);
             } else {
               // If no valid recommendations, fall back to mock data
               console.log('No valid recommendations returned for video ID:', videoId);
               setRecommendedVideos(MOCK_VIDEOS);
+              setNextCursor(null);
             }
             setRecommendationsLoading(false);
           } catch (recError) {
             console.error('Error getting recommendations:', recError);
             // Fall back to mock data on error
             setRecommendedVideos(MOCK_VIDEOS);
+            setNextCursor(null);
             setRecommendationsLoading(false);
           }
         } else {
@@ -360,8 +421,10 @@ const HomePage = () => {
               Array.isArray(newRecommendationsResponse.results) && 
               newRecommendationsResponse.results.length > 0) {
             setRecommendedVideos(newRecommendationsResponse.results);
+            setNextCursor(newRecommendationsResponse.pagination?.next_cursor || null);
           } else {
             setRecommendedVideos(MOCK_VIDEOS);
+            setNextCursor(null);
           }
           setRecommendationsLoading(false);
         }
@@ -508,6 +571,13 @@ const HomePage = () => {
                     ))}
                   </div>
                 )}
+                {hasMoreRecommendations && !recommendationsLoading && (
+                  <div ref={loadMoreRef} className="flex justify-center py-8">
+                    {loadingMore && (
+                      <div className="w-8 h-8 border-4 border-primary border-t-transparent rounded-full animate-spin"></div>
+                    )}
+                  </div>
+                )}
                 
                 {watchHistory.length > 0 && (
                   <div className="mt-8">
@@ -0,0 +1,414 @@
+"""
+Implicit-feedback matrix factorization (alternating least squares) over tracked views.
+
+The views recorded by /api/track-view form a sparse user x video matrix of view counts
+r_ui. Following Hu, Koren & Volinsky (2008), every cell has a preference p_ui = [r_ui > 0]
+and a confidence c_ui = 1 + ALS_ALPHA * r_ui, and ALS alternates between user factors X
+and item factors Y minimizing
+
+    sum_ui c_ui (p_ui - x_u . y_i)^2 + ALS_REGULARIZATION * (|X|^2 + |Y|^2)
+
+Each half-step is one f x f system per user (or item):
+
+    (Y'Y + Y'(C_u - I)Y + lambda I) x_u = Y' C_u p_u
+
+Y'Y is shared and the correction only involves the videos the user watched, so rather than
+factorizing a matrix per user, all the systems are solved together with a few conjugate
+gradient steps warm-started from the previous factors (Takacs et al., 2011). A step is a
+dense product with Y'Y plus a sparse product over the nonzeros, O(nnz * f), processed in
+blocks of ALS_BLOCK_NNZ nonzeros to bound the temporaries.
+
+Queries are vectorized: user -> video scores are one product against the item factors, and
+video -> video similarities one product against the L2-normalized item factors, followed by
+a batched partial sort. Users who watched videos since the last training are folded in
+from their watched rows (one f x f solve), so the for-you feed does not wait for a retrain.
+
+A daemon thread retrains from the watch-history backend every ALS_RETRAIN_INTERVAL seconds
+and publishes the new model by replacing one module reference, like model snapshots:
+readers call `get_model()` once per request and never take a lock.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.services.metrics import gauge
+from src.services.neighbors import top_k_rows
+
+ALS_ENABLED = os.environ.get('YUGI_ALS', '1') == '1'
+ALS_FACTORS = int(os.environ.get('YUGI_ALS_FACTORS', 32))
+ALS_REGULARIZATION = float(os.environ.get('YUGI_ALS_REGULARIZATION', 0.1))
+# Confidence gained per view (c_ui = 1 + alpha * r_ui)
+ALS_ALPHA = float(os.environ.get('YUGI_ALS_ALPHA', 40))
+ALS_ITERATIONS = int(os.environ.get('YUGI_ALS_ITERATIONS', 10))
+# Conjugate gradient steps per half-iteration (warm-started, so a few are enough)
+ALS_CG_STEPS = 3
+# Nonzeros gathered at once by a conjugate gradient product (bounds the nnz x f temporaries)
+ALS_BLOCK_NNZ = 1 << 18
+ALS_RETRAIN_INTERVAL = float(os.environ.get('YUGI_ALS_RETRAIN_INTERVAL', 900))
+# Below this many (user, video) views there is no model and the engagement ranking is used
+ALS_MIN_EVENTS = int(os.environ.get('YUGI_ALS_MIN_EVENTS', 100))
+
+train_seconds = gauge('yugi_als_train_seconds', 'Duration of the last ALS training')
+trained_at = gauge('yugi_als_last_trained_timestamp_seconds', 'Unix time the served ALS model was trained')
+model_size = gauge('yugi_als_model_size', 'Views, users and videos of the served ALS model', ('dimension',))
+
+_model = None
+_retrainer_pid = None
+_retrainer_lock = threading.Lock()
+
+
+def build_interactions(user_ids, video_ids, catalog):
+    """
+    Sparse user x item view counts from parallel lists of views.
+
+    Only videos with at least one view become items, so training scales with the watched
+    part of the catalog rather than the whole of it.
+
+    Args:
+        user_ids (list): User of every view.
+        video_ids (list): Video of every view (views of videos outside the catalog are dropped).
+        catalog (Catalog): Catalog the video ids are resolved against.
+
+    Returns:
+        tuple: (user ids, catalog row of every item, csr_matrix of float32 view counts, users x items).
+    """
+    # Imported lazily: only training needs pandas and scipy, and they would slow down server startup
+    import pandas as pd
+    from scipy import sparse
+
+    video_codes, videos = pd.factorize(pd.Series(video_ids, dtype=object))
+    video_rows = catalog.rows_of(videos)
+    rows = video_rows[video_codes]
+    known = rows >= 0
+    user_codes, users = pd.factorize(pd.Series(user_ids, dtype=object)[known])
+    item_rows, item_codes = np.unique(rows[known], return_inverse=True)
+    interactions = sparse.csr_matrix(
+        (np.ones(len(user_codes), dtype=np.float32), (user_codes, item_codes)),
+        shape=(len(users), len(item_rows)))
+    # Repeated views of a video add up (and coo -> csr conversion already summed them)
+    interactions.sum_duplicates()
+    return list(users), item_rows, interactions
+
+
+def _blocks(confidence, block_nnz):
+    """Row blocks of a csr matrix with about `block_nnz` nonzeros each, with the row of every nonzero."""
+    blocks = []
+    start = 0
+    n_rows = confidence.shape[0]
+    while start < n_rows:
+        stop = int(np.searchsorted(confidence.indptr, confidence.indptr[start] + block_nnz, side='right')) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        block = confidence[start:stop]
+        blocks.append((start, stop, block, np.repeat(np.arange(start, stop), np.diff(block.indptr))))
+        start = stop
+    return blocks
+
+
+def _conjugate_gradient(X, Y, confidence, regularization, steps, block_nnz=ALS_BLOCK_NNZ):
+    """
+    Move every row of X towards the solution of its least-squares system, in place.
+
+    Args:
+        X (np.ndarray): Factors being solved for (one row per row of `confidence`).
+        Y (np.ndarray): Fixed factors of the other side.
+        confidence (csr_matrix): c_ui - 1 = alpha * r_ui for every nonzero.
+        regularization (float): lambda.
+        steps (int): Conjugate gradient steps.
+        block_nnz (int): Nonzeros processed at once.
+    """
+    from scipy import sparse
+
+    gram = Y.T @ Y + regularization * np.eye(Y.shape[1], dtype=Y.dtype)
+    blocks = _blocks(confidence, block_nnz)
+
+    def product(P):
+        # (Y'Y + lambda I) p_u + sum_i (c_ui - 1) (y_i . p_u) y_i for every row at once
+        out = P @ gram
+        for start, stop, block, owners in blocks:
+            # np.take gathers rows about twice as fast as fancy indexing
+            weights = np.einsum('ij,ij->i', np.take(Y, block.indices, axis=0), np.take(P, owners, axis=0)) * block.data
+            out[start:stop] += sparse.csr_matrix((weights, block.indices, block.indptr), shape=block.shape) @ Y
+        return out
+
+    # Right-hand side Y' C_u p_u: the sum of c_ui y_i over the watched items
+    preference = confidence.copy()
+    preference.data += 1
+    residual = np.asarray(preference @ Y, dtype=X.dtype) - product(X)
+    direction = residual.copy()
+    residual_norm = np.einsum('ij,ij->i', residual, residual)
+    for _ in range(steps):
+        moved = product(direction)
+        curvature = np.einsum('ij,ij->i', direction, moved)
+        step = np.divide(residual_norm, curvature, out=np.zeros_like(residual_norm), where=curvature > 0)
+        X += step[:, None] * direction
+        residual -= step[:, None] * moved
+        new_norm = np.einsum('ij,ij->i', residual, residual)
+        beta = np.divide(new_norm, residual_norm, out=np.zeros_like(new_norm), where=residual_norm > 0)
+        direction = residual + beta[:, None] * direction
+        residual_norm = new_norm
+
+
+def train_als(interactions, factors=ALS_FACTORS, regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA,
+              iterations=ALS_ITERATIONS, cg_steps=ALS_CG_STEPS, seed=0, block_nnz=ALS_BLOCK_NNZ):
+    """
+    Factorize a users x items view-count matrix.
+
+    Args:
+        interactions (csr_matrix): View counts, users x items.
+        factors (int): Latent dimensions.
+        regularization (float): L2 penalty on the factors.
+        alpha (float): Confidence gained per view.
+        iterations (int): ALS iterations (one user and one item half-step each).
+        cg_steps (int): Conjugate gradient steps per half-step.
+        seed (int): Seed of the initial factors.
+        block_nnz (int): Nonzeros processed at once.
+
+    Returns:
+        tuple: (user factors, item factors), float32.
+    """
+    from scipy import sparse
+
+    rng = np.random.default_rng(seed)
+    confidence = sparse.csr_matrix(interactions, dtype=np.float32) * np.float32(alpha)
+    confidence_by_item = confidence.T.tocsr()
+    user_factors = rng.normal(scale=0.01, size=(confidence.shape[0], factors)).astype(np.float32)
+    item_factors = rng.normal(scale=0.01, size=(confidence.shape[1], factors)).astype(np.float32)
+    for _ in range(iterations):
+        _conjugate_gradient(user_factors, item_factors, confidence, regularization, cg_steps, block_nnz)
+        _conjugate_gradient(item_factors, user_factors, confidence_by_item, regularization, cg_steps, block_nnz)
+    return user_factors, item_factors
+
+
+class ALSModel:
+    """
+    Trained factors with vectorized user -> video and video -> video top-k queries.
+
+    Items are the watched catalog rows of the catalog the model was trained on; queries take
+    and return rows of the caller's catalog, translated through the video ids when the
+    catalog changed since (ingest, rebuild). The arrays are read-only and never mutated.
+    """
+
+    def __init__(self, user_ids, user_factors, item_rows, item_factors, interactions, catalog,
+                 regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA, stats=None):
+        self.user_ids = user_ids
+        self.user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.item_rows = np.asarray(item_rows, dtype=np.int64)
+        self.interactions = interactions
+        self.catalog = catalog
+        self.regularization = regularization
+        self.alpha = alpha
+        self.stats = stats or {}
+        # Catalog row -> item (-1 for videos nobody watched)
+        self.item_of_row = np.full(len(catalog), -1, dtype=np.int64)
+        self.item_of_row[self.item_rows] = np.arange(len(self.item_rows))
+        norms = np.linalg.norm(item_factors, axis=1, keepdims=True)
+        self.normalized_items = np.divide(item_factors, norms, out=np.zeros_like(item_factors), where=norms > 0)
+        self.gram = item_factors.T @ item_factors
+        for array in (self.user_factors, self.item_factors, self.item_rows, self.item_of_row,
+                      self.normalized_items, self.gram):
+            array.flags.writeable = False
+
+    @property
+    def n_items(self):
+        return len(self.item_rows)
+
+    def _items_of(self, rows, catalog):
+        """Items of catalog rows (-1 where the video has no factors)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if catalog is not self.catalog:
+            rows = self.catalog.rows_of([catalog.video_ids[row] for row in rows])
+        inside = (rows >= 0) & (rows < len(self.item_of_row))
+        return np.where(inside, self.item_of_row[np.where(inside, rows, 0)], -1)
+
+    def _rows_of(self, items, scores, catalog):
+        """Catalog rows and scores of items, dropping videos no longer in `catalog`."""
+        rows = self.item_rows[items]
+        if catalog is not self.catalog:
+            rows = catalog.rows_of([self.catalog.video_ids[row] for row in rows])
+            kept = rows >= 0
+            rows, scores = rows[kept], scores[kept]
+        return rows, scores
+
+    def _top(self, scores, k, catalog):
+        top = top_k_rows(scores, k)
+        results = []
+        for items, row_scores in zip(top, np.take_along_axis(scores, top, axis=1)):
+            finite = np.isfinite(row_scores)
+            results.append(self._rows_of(items[finite], row_scores[finite], catalog))
+        return results
+
+    def recommend_users(self, user_ids, k, catalog=None):
+        """
+        Top-k unwatched videos of several users from their trained factors.
+
+        Args:
+            user_ids (list): Users to score.
+            k (int): Videos per user.
+            catalog (Catalog, optional): Catalog of the returned rows (defaults to the training one).
+
+        Returns:
+            list: (rows, scores) per user, best first, or None for users unknown to the model.
+        """
+        catalog = catalog or self.catalog
+        users = [self.user_index.get(user_id) for user_id in user_ids]
+        known = [user for user in users if user is not None]
+        if not known:
+            return [None] * len(users)
+        scores = self.user_factors[known] @ self.item_factors.T
+        watched = self.interactions[known]
+        scores[np.repeat(np.arange(len(known)), np.diff(watched.indptr)), watched.indices] = -np.inf
+        results = iter(self._top(scores, k, catalog))
+        return [None if user is None else next(results) for user in users]
+
+    def recommend_from_rows(self, watched_rows, k, catalog=None):
+        """
+        Top-k unwatched videos for a user given the rows they watched (fold-in).
+
+        Solves the user's least-squares system against the fixed item factors, so the
+        views recorded since the last training count immediately.
+
+        Args:
+            watched_rows (np.ndarray): Catalog rows the user watched.
+            k (int): Number of videos.
+            catalog (Catalog, optional): Catalog of the rows (defaults to the training one).
+
+        Returns:
+            tuple or None: (rows, scores), best first, or None when no watched video has factors.
+        """
+        catalog = catalog or self.catalog
+        items = self._items_of(watched_rows, catalog)
+        items = np.unique(items[items >= 0])
+        if len(items) == 0:
+            return None
+        watched = self.item_factors[items]
+        system = self.gram + self.alpha * (watched.T @ watched) + self.regularization * np.eye(len(self.gram))
+        user = np.linalg.solve(system, (1 + self.alpha) * watched.sum(axis=0)).astype(np.float32)
+        scores = (self.item_factors @ user)[None, :]
+        scores[0, items] = -np.inf
+        return self._top(scores, k, catalog)[0]
+
+    def similar_items(self, rows, k, catalog=None):
+        """
+        The k videos closest to each of several videos (cosine of the item factors).
+
+        Args:
+            rows (list): Catalog rows of the source videos.
+            k (int): Neighbors per video.
+            catalog (Catalog, optional): Catalog of the rows (defaults to the training one).
+
+        Returns:
+            list: (rows, similarities) per source, best first, or None for videos without factors.
+        """
+        catalog = catalog or self.catalog
+        items = self._items_of(rows, catalog)
+        known = items[items >= 0]
+        if len(known) == 0:
+            return [None] * len(items)
+        scores = self.normalized_items[known] @ self.normalized_items.T
+        scores[np.arange(len(known)), known] = -np.inf
+        results = iter(self._top(scores, k, catalog))
+        return [None if item < 0 else next(results) for item in items]
+
+
+def train_model(user_ids, video_ids, catalog, min_events=ALS_MIN_EVENTS, **params):
+    """
+    Train an ALSModel on views.
+
+    Args:
+        user_ids (list): User of every view.
+        video_ids (list): Video of every view.
+        catalog (Catalog): Catalog the videos are resolved against.
+        min_events (int): Fewer distinct (user, video) views than this give no model.
+        **params: Training parameters of `train_als`.
+
+    Returns:
+        ALSModel or None: The model, or None when there are too few views.
+    """
+    start = time.perf_counter()
+    users, item_rows, interactions = build_interactions(user_ids, video_ids, catalog)
+    if interactions.nnz < max(min_events, 1):
+        return None
+    user_factors, item_factors = train_als(interactions, **params)
+    stats = {
+        'views': int(interactions.nnz),
+        'users': len(users),
+        'items': len(item_rows),
+        'train_seconds': time.perf_counter() - start,
+        'trained_at': time.time(),
+    }
+    return ALSModel(users, user_factors, item_rows, item_factors, interactions, catalog,
+                    regularization=params.get('regularization', ALS_REGULARIZATION),
+                    alpha=params.get('alpha', ALS_ALPHA), stats=stats)
+
+
+def get_model():
+    """The current ALS model (None until enough views were tracked)."""
+    return _model
+
+
+def publish_model(model):
+    """Make `model` the current ALS model (an atomic reference swap)."""
+    global _model
+    _model = model
+    train_seconds.set(model.stats['train_seconds'])
+    trained_at.set(model.stats['trained_at'])
+    for dimension in ('views', 'users', 'items'):
+        model_size.set(model.stats[dimension], dimension)
+
+
+def retrain(views, catalog):
+    """
+    Train on every stored view and publish the model.
+
+    Args:
+        views (callable): Returns an iterable of (user_id, video_id) pairs (a history backend's iter_views).
+        catalog (Catalog): Catalog the videos are resolved against.
+
+    Returns:
+        ALSModel or None: The published model, or None when there were too few views.
+    """
+    user_ids, video_ids = [], []
+    for user_id, video_id in views():
+        user_ids.append(user_id)
+        video_ids.append(video_id)
+    model = train_model(user_ids, video_ids, catalog)
+    if model is not None:
+        publish_model(model)
+        print(f"Trained the ALS model on {model.stats['views']} views of {model.stats['users']} users "
+              f"in {model.stats['train_seconds']:.2f}s")
+    return model
+
+
+def _retrain_loop(views, get_catalog, interval):
+    while True:
+        try:
+            retrain(views, get_catalog())
+        except Exception as e:
+            print(f"Error training the ALS model: {e}")
+        time.sleep(interval)
+
+
+def ensure_retraining(views, get_catalog, interval=ALS_RETRAIN_INTERVAL):
+    """
+    Train now, then every `interval` seconds, in a daemon thread of this process.
+
+    Started lazily (cheap to call on every request) so that every pre-forked worker gets its
+    own thread; the numpy products release the GIL, so training competes little with requests.
+
+    Args:
+        views (callable): Returns an iterable of (user_id, video_id) pairs.
+        get_catalog (callable): Returns the catalog of the current snapshot.
+        interval (float): Seconds between trainings.
+    """
+    global _retrainer_pid
+    if not ALS_ENABLED or _retrainer_pid == os.getpid():
+        return
+    with _retrainer_lock:
+        if _retrainer_pid != os.getpid():
+            threading.Thread(target=_retrain_loop, args=(views, get_catalog, interval),
+                             name='als-retrainer', daemon=True).start()
+            _retrainer_pid = os.getpid()
@@ -0,0 +1,183 @@
+"""
+In-process approximate nearest neighbor index over the semantic embeddings.
+
+IVF (inverted file) layout: spherical k-means splits the L2-normalized embeddings into
+`nlist` clusters, and each cluster keeps the rows assigned to it (CSR layout, so the
+whole index is three flat arrays that can be memory-mapped). A query is compared with
+the centroids, and only the rows of the `nprobe` closest lists are scored.
+
+With a quantized store (see quantization.py), those rows are first scored on the int8 or
+float16 codes, and only the best RERANK_FACTOR x k of them are re-scored with the float32
+vectors, so the final ranking and scores are exact for the shortlist.
+"""
+import os
+
+import numpy as np
+
+from src.services.quantization import EMBEDDING_STORE, quantize
+
+DEFAULT_NPROBE = int(os.environ.get('YUGI_ANN_NPROBE', 8))
+# Shortlist re-ranked in full precision, as a multiple of k
+RERANK_FACTOR = int(os.environ.get('YUGI_ANN_RERANK_FACTOR', 4))
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE_SIZE = 100_000
+# Rows per block when assigning vectors to centroids, bounding the (block x nlist) matrix
+ASSIGN_BLOCK_SIZE = 8192
+
+
+def default_nlist(n_rows):
+    """Number of IVF lists for a catalog size (about sqrt(N), at least 1)."""
+    return max(1, int(round(np.sqrt(n_rows))))
+
+
+def _assign(vectors, centroids):
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_SIZE):
+        block = vectors[start:start + ASSIGN_BLOCK_SIZE]
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=KMEANS_ITERATIONS, sample_size=KMEANS_SAMPLE_SIZE, seed=0):
+    """
+    Cosine k-means on (a sample of) L2-normalized vectors.
+
+    Returns:
+        np.ndarray: (n_clusters, dim) float32 unit-norm centroids.
+    """
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=n_clusters)
+        # Re-seed empty clusters with random points so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """IVF index: centroids plus the row ids of each inverted list, with optional quantized codes."""
+
+    def __init__(self, vectors, centroids, offsets, rows, nprobe=DEFAULT_NPROBE, codes=None):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.nprobe = nprobe
+        # QuantizedVectors for the coarse pass (None: candidates are scored on the float32 vectors)
+        self.codes = codes
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, nlist=None, seed=0, store=EMBEDDING_STORE):
+        """
+        Cluster `vectors` (L2-normalized, float32) and build the inverted lists.
+
+        `store` selects the quantized codes of the coarse pass ('int8', 'float16', or 'float32' for none).
+        """
+        nlist = nlist or default_nlist(len(vectors))
+        centroids = spherical_kmeans(vectors, nlist, seed=seed)
+        labels = _assign(vectors, centroids)
+        rows = np.argsort(labels, kind='stable').astype(np.int32)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=offsets[1:])
+        codes = quantize(vectors, store) if store != 'float32' else None
+        return cls(vectors, centroids, offsets, rows, codes=codes)
+
+    def appended(self, vectors):
+        """
+        A new index over `vectors`, whose first rows are the ones already indexed.
+
+        The new rows are assigned to the existing centroids (no re-clustering) and placed at
+        the end of their lists, so the work grows with the number of new rows.
+        """
+        n_old = len(self.rows)
+        labels = _assign(np.asarray(vectors[n_old:], dtype=np.float32), self.centroids)
+        order = np.argsort(labels, kind='stable')
+        new_rows = (n_old + order).astype(np.int32)
+        rows = np.insert(np.asarray(self.rows), np.asarray(self.offsets)[labels[order] + 1], new_rows)
+        offsets = np.asarray(self.offsets).copy()
+        offsets[1:] += np.cumsum(np.bincount(labels, minlength=self.nlist))
+        codes = self.codes.appended(np.asarray(vectors[n_old:], dtype=np.float32)) if self.codes is not None else None
+        return IVFIndex(vectors, self.centroids, offsets, rows, self.nprobe, codes)
+
+    def lists_of(self, rows):
+        """The lists holding any of `rows`."""
+        owners = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+        return np.unique(owners[np.isin(self.rows, rows)])
+
+    def probing(self, queries, lists):
+        """
+        Which of `queries` scan at least one of `lists` (the queries whose results those lists can change).
+
+        Ties at the nprobe-th closest centroid count as probing.
+        """
+        nprobe = min(self.nprobe, self.nlist)
+        probing = np.zeros(len(queries), dtype=bool)
+        if len(lists) == 0:
+            return probing
+        for start in range(0, len(queries), ASSIGN_BLOCK_SIZE):
+            scores = np.asarray(queries[start:start + ASSIGN_BLOCK_SIZE], dtype=np.float32) @ self.centroids.T
+            kth = np.partition(scores, self.nlist - nprobe, axis=1)[:, self.nlist - nprobe]
+            probing[start:start + len(scores)] = (scores[:, lists] >= kth[:, None]).any(axis=1)
+        return probing
+
+    def candidates(self, query, nprobe=None):
+        """Rows of the `nprobe` lists closest to `query`."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        return np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+    def search(self, query, k, nprobe=None, exclude=None):
+        """
+        Approximate top-k rows by cosine similarity to `query`.
+
+        Args:
+            query (np.ndarray): L2-normalized query vector.
+            k (int): Number of neighbors.
+            nprobe (int, optional): Lists to scan; more lists trade latency for recall.
+            exclude (int, optional): Row to leave out (e.g. the query video itself).
+
+        Returns:
+            tuple: (int64 rows, float64 scores), best first.
+        """
+        rows = self.candidates(query, nprobe)
+        if exclude is not None:
+            rows = rows[rows != exclude]
+        shortlist = RERANK_FACTOR * k
+        if self.codes is not None and len(rows) > shortlist:
+            # Coarse pass on the quantized codes, then exact scores for the shortlist only
+            coarse = self.codes.scores(rows, query)
+            rows = rows[np.argpartition(-coarse, shortlist - 1)[:shortlist]]
+        scores = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))
+        return rows[order].astype(np.int64), scores[order].astype(np.float64)
+
+
+def brute_force_search(vectors, query, k, exclude=None):
+    """Exact top-k by cosine similarity, for recall measurements."""
+    scores = vectors @ query
+    if exclude is not None:
+        scores = scores.copy()
+        scores[exclude] = -np.inf
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    order = np.lexsort((top, -scores[top]))
+    return top[order].astype(np.int64), scores[top[order]].astype(np.float64)
@@ -0,0 +1,685 @@
+"""
+Offline artifact build and memory-mapped loading for the recommendation engine.
+
+Building the model (parsing the CSV, TF-IDF, encoding every row with the
+SentenceTransformer and building the top-K neighbor index) is expensive, so it
+is done once by a command and written to disk:
+
+    python -m src.services.artifacts build-artifacts [--csv data/YT_data.csv] [--out data/artifacts] [--workers 8]
+
+The CSV is streamed in chunks that worker processes vectorize and encode in parallel
+(see features.py).
+
+Every build lands in its own versioned directory (``v<ARTIFACT_VERSION>-<csv checksum>``)
+and the ``LATEST`` pointer file is swapped atomically once the build is complete.
+At runtime the arrays are opened with ``np.load(mmap_mode='r')`` so startup only maps
+files, and forked workers share the same page-cache pages instead of each paying for
+their own copy of the model.
+
+An ingest (see ingest.py) writes a delta build instead: only the appended rows, the
+neighbor and top-N rows it recomputed, and a ``parent`` manifest field naming the build
+it extends. Loading a delta loads its parent chain and appends the rows in memory.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from src.services.ann import IVFIndex
+from src.services.catalog import ENCODED_COLUMNS, RANKINGS, Catalog, SortedIndex
+from src.services.encoders import ENCODERS, get_encoder
+from src.services.fragments import FRAGMENT_COLUMN, build_fragments
+from src.services.neighbors import DEFAULT_NEIGHBOR_K, NeighborIndex, build_neighbor_index
+from src.services.quantization import load_quantized, save_quantized
+from src.services.search import build_search_index, load_search_index, save_search_index
+from src.services.topn import TopNTable, load_topn_table, save_topn_table
+
+# Bump this whenever the on-disk layout changes so old builds are rejected
+ARTIFACT_VERSION = 4
+
+DEFAULT_CSV_PATH = os.environ.get('YUGI_CSV_PATH', 'data/YT_data.csv')
+DEFAULT_ARTIFACT_DIR = os.environ.get('YUGI_ARTIFACT_DIR', 'data/artifacts')
+
+LATEST_POINTER = 'LATEST'
+MANIFEST_NAME = 'manifest.json'
+
+# Columns the request path needs, stored as UTF-8 blobs + offsets so they can be mmapped
+STRING_COLUMNS = ['v_id', 'v_title', 'v_description', 'tags', 'category_id',
+                  'channel_name', 'channel_id', 'video_link']
+NUMERIC_COLUMNS = ['engagement_rate']
+REQUIRED_COLUMNS = ['v_id', 'v_title', 'v_description', 'tags', 'category_id']
+
+
+class StaleArtifactsError(Exception):
+    """Raised when the artifacts on disk are missing, from another layout version or built from a different CSV."""
+
+
+def csv_checksum(csv_path):
+    """Return the sha256 hex digest of the CSV file."""
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extend_checksum(checksum, appended_sha256):
+    """
+    Checksum of a CSV after bytes were appended to it: chained from its previous checksum and
+    the sha256 of the appended bytes, so an ingest only hashes what it appends.
+    """
+    return hashlib.sha256(f'{checksum}:{appended_sha256}'.encode('ascii')).hexdigest()
+
+
+def csv_range_checksum(csv_path, start, end):
+    """Return the sha256 hex digest of bytes ``start:end`` of the CSV file."""
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _segments_checksum(csv_path, segments):
+    """The chained checksum of a CSV made of `segments` (end offset, sha256 of its bytes), or None if it differs."""
+    if os.path.getsize(csv_path) != segments[-1][0]:
+        return None
+    checksum, start = None, 0
+    for end, expected in segments:
+        digest = csv_range_checksum(csv_path, start, end)
+        if digest != expected:
+            return None
+        checksum = digest if checksum is None else extend_checksum(checksum, digest)
+        start = end
+    return checksum
+
+
+def _csv_stat(csv_path):
+    st = os.stat(csv_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def load_catalog_frame(csv_path=DEFAULT_CSV_PATH):
+    """Read and preprocess the CSV exactly like the request path expects it."""
+    import pandas as pd
+    return prepare_catalog_frame(pd.read_csv(csv_path))
+
+
+def prepare_catalog_frame(df):
+    """Preprocess raw catalog rows (as read from the CSV)."""
+    # Data Preprocessing
+    df = df.dropna(subset=REQUIRED_COLUMNS)
+    # Row positions are used to address every matrix, so keep labels and positions identical
+    df = df.reset_index(drop=True)
+    df['content'] = df['v_title'] + ' ' + df['v_description'] + ' ' + df['tags']
+
+    # Generate YouTube Video Link
+    df['video_link'] = "https://www.youtube.com/watch?v=" + df['v_id']
+
+    # Convert categorical features
+    df['category_id'] = df['category_id'].astype(str)
+    return df
+
+
+class StringColumn:
+    """Read-only string column backed by a UTF-8 blob, an offsets array and a null mask."""
+
+    def __init__(self, blob, offsets, nulls):
+        self.blob = blob
+        self.offsets = offsets
+        self.nulls = nulls
+        # memoryviews over the mapped pages make single-row access cheap (no ndarray per slice)
+        self._blob_view = memoryview(np.asarray(blob)).cast('B')
+        self._offsets_view = memoryview(np.ascontiguousarray(offsets, dtype=np.int64))
+        self._nulls_view = memoryview(np.asarray(nulls, dtype=bool))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self._nulls_view[i]:
+            return None
+        return str(self._blob_view[self._offsets_view[i]:self._offsets_view[i + 1]], 'utf-8')
+
+    def view(self, i):
+        """Zero-copy memoryview of the UTF-8 bytes of one row (empty for missing values)."""
+        return self._blob_view[self._offsets_view[i]:self._offsets_view[i + 1]]
+
+    def appended(self, values):
+        """A new in-memory column with `values` added after the existing rows."""
+        blob, offsets, nulls = _encode_strings(values)
+        return StringColumn(
+            np.concatenate([np.asarray(self.blob), blob]),
+            np.concatenate([np.asarray(self.offsets), offsets[1:] + self.offsets[-1]]),
+            np.concatenate([np.asarray(self.nulls, dtype=bool), nulls]),
+        )
+
+    def to_list(self):
+        # Offsets are in bytes, so slice the encoded blob rather than decoded text
+        raw = bytes(self.blob)
+        offsets = self.offsets.tolist()
+        nulls = self.nulls.tolist()
+        return [
+            None if nulls[i] else raw[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in range(len(self))
+        ]
+
+
+def _encode_strings(values):
+    """UTF-8 blob, int64 offsets and null mask of a list of strings."""
+    nulls = np.array([v is None or (isinstance(v, float) and np.isnan(v)) for v in values], dtype=bool)
+    encoded = [b'' if null else str(v).encode('utf-8') for v, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, nulls
+
+
+def _save_string_column(directory, name, values):
+    if isinstance(values, StringColumn):
+        blob, offsets, nulls = values.blob, values.offsets, values.nulls
+    else:
+        blob, offsets, nulls = _encode_strings(values)
+    np.save(os.path.join(directory, f'col_{name}.bytes.npy'), blob)
+    np.save(os.path.join(directory, f'col_{name}.offsets.npy'), offsets)
+    np.save(os.path.join(directory, f'col_{name}.nulls.npy'), nulls)
+
+
+def _load_string_column(directory, name):
+    return StringColumn(
+        np.load(os.path.join(directory, f'col_{name}.bytes.npy'), mmap_mode='r'),
+        np.load(os.path.join(directory, f'col_{name}.offsets.npy'), mmap_mode='r'),
+        np.load(os.path.join(directory, f'col_{name}.nulls.npy'), mmap_mode='r'),
+    )
+
+
+def build_artifacts(csv_path=DEFAULT_CSV_PATH, out_dir=DEFAULT_ARTIFACT_DIR, encoder=None,
+                    neighbor_k=DEFAULT_NEIGHBOR_K, workers=None, chunk_rows=None):
+    """
+    Build every model artifact from the CSV and publish it under ``out_dir``.
+
+    Args:
+        csv_path (str): Path of the source catalog CSV.
+        out_dir (str): Root directory for the versioned artifact builds.
+        encoder (callable, optional): Encoder mapping a list of texts to L2-normalized float32
+            embeddings (see encoders.py). Defaults to the one selected by YUGI_ENCODER.
+        neighbor_k (int): Number of content neighbors kept per video.
+        workers (int, optional): Feature extraction processes (defaults to YUGI_BUILD_WORKERS or the CPU count).
+        chunk_rows (int, optional): CSV rows per chunk (defaults to YUGI_CSV_CHUNK_ROWS).
+
+    Returns:
+        str: The directory of the new build.
+    """
+    from src.services.features import BUILD_WORKERS, CSV_CHUNK_ROWS, extract_features
+
+    encoder = encoder or get_encoder()
+    start = time.time()
+    checksum = csv_checksum(csv_path)
+
+    # Chunked CSV reading, hashed TF-IDF and embeddings in parallel worker processes (see features.py)
+    features = extract_features(csv_path, encoder, workers or BUILD_WORKERS, chunk_rows or CSV_CHUNK_ROWS)
+    timings = features['timings']
+    tfidf_matrix, embeddings = features['tfidf_matrix'], features['embeddings']
+
+    # Approximate nearest neighbor (IVF) index over the embeddings
+    phase = time.time()
+    semantic_index = IVFIndex.build(embeddings)
+    timings['semantic_index'] = time.time() - phase
+
+    # Top-K content neighbors instead of the dense N x N similarity matrix
+    phase = time.time()
+    neighbor_index, neighbor_stats = build_neighbor_index(tfidf_matrix, k=neighbor_k)
+    timings['similarity'] = time.time() - phase
+
+    manifest = {
+        'csv_sha256': checksum,
+        'csv_stat': _csv_stat(csv_path),
+        'tfidf_params': features['tfidf'].params,
+        'encoder': getattr(encoder, 'name', type(encoder).__name__),
+        'features': features['stats'],
+        'neighbor_index': neighbor_stats,
+        'timings': timings,
+    }
+    # Id index, encoded columns and per-channel, per-category and global engagement rankings
+    catalog = Catalog(dict(features['columns']), features['engagement_rate'])
+    # Every video's response object, serialized once (see fragments.py)
+    phase = time.time()
+    catalog.columns[FRAGMENT_COLUMN] = build_fragments(catalog)
+    timings['fragments'] = time.time() - phase
+    build_dir = write_build(out_dir, catalog, features['tfidf'], tfidf_matrix, embeddings, semantic_index,
+                            neighbor_index, manifest)
+    print(f"Built artifacts for {len(embeddings)} videos in {time.time() - start:.1f}s -> {build_dir}")
+    return build_dir
+
+
+def write_build(out_dir, catalog, tfidf, tfidf_matrix, embeddings, semantic_index, neighbor_index, manifest,
+                topn_table=None, search_index=None):
+    """
+    Write a complete build into ``out_dir`` and point ``LATEST`` at it.
+
+    Args:
+        out_dir (str): Root directory for the versioned artifact builds.
+        catalog (Catalog): The catalog: its STRING_COLUMNS (and the response fragments under FRAGMENT_COLUMN
+            when it has them), engagement, id index, encoded columns and engagement rankings are stored.
+        tfidf, tfidf_matrix, embeddings, semantic_index, neighbor_index: The model parts.
+        manifest (dict): Manifest fields; must contain ``csv_sha256``. Layout version, row count
+            and shapes are filled in here.
+        topn_table (TopNTable, optional): Materialized content candidates (see topn.py).
+        search_index (SearchIndex, optional): Inverted index of `tfidf_matrix` (see search.py); built here when
+            not given.
+
+    Returns:
+        str: The directory of the new build.
+    """
+    version_tag, tmp_dir = _scratch_dir(out_dir, manifest['csv_sha256'])
+    _save_catalog(tmp_dir, catalog)
+
+    # A hashed TF-IDF has no vocabulary, only the idf of its hashed columns
+    if hasattr(tfidf, 'vocabulary_'):
+        with open(os.path.join(tmp_dir, 'tfidf_vocabulary.json'), 'w') as f:
+            json.dump({term: int(i) for term, i in tfidf.vocabulary_.items()}, f)
+    np.save(os.path.join(tmp_dir, 'tfidf_idf.npy'), tfidf.idf_)
+    np.save(os.path.join(tmp_dir, 'tfidf_data.npy'), tfidf_matrix.data)
+    np.save(os.path.join(tmp_dir, 'tfidf_indices.npy'), tfidf_matrix.indices)
+    np.save(os.path.join(tmp_dir, 'tfidf_indptr.npy'), tfidf_matrix.indptr)
+    save_search_index(tmp_dir, search_index if search_index is not None else build_search_index(tfidf_matrix))
+    np.save(os.path.join(tmp_dir, 'embeddings.npy'), embeddings)
+    np.save(os.path.join(tmp_dir, 'ivf_centroids.npy'), semantic_index.centroids)
+    np.save(os.path.join(tmp_dir, 'ivf_offsets.npy'), semantic_index.offsets)
+    np.save(os.path.join(tmp_dir, 'ivf_rows.npy'), semantic_index.rows)
+    if semantic_index.codes is not None:
+        save_quantized(tmp_dir, semantic_index.codes)
+    np.save(os.path.join(tmp_dir, 'neighbor_ids.npy'), neighbor_index.ids)
+    np.save(os.path.join(tmp_dir, 'neighbor_scores.npy'), neighbor_index.scores)
+    if topn_table is not None:
+        save_topn_table(tmp_dir, topn_table)
+
+    return _publish_build(out_dir, version_tag, tmp_dir, {
+        'n_rows': len(catalog),
+        'tfidf_shape': list(tfidf_matrix.shape),
+        'embedding_dim': int(embeddings.shape[1]),
+        'ivf_nlist': int(semantic_index.nlist),
+        'embedding_store': semantic_index.codes.kind if semantic_index.codes is not None else 'float32',
+        **manifest,
+    })
+
+
+def write_delta_build(out_dir, snapshot, n_old, neighbor_rows, topn_rows, manifest):
+    """
+    Write the rows ``n_old:`` of a snapshot as a delta build of its parent and point ``LATEST`` at it.
+
+    A delta build only holds the appended rows (their columns, engagement, TF-IDF rows and
+    embeddings) and the neighbor lists and top-N rows that were recomputed, so writing it costs
+    what was ingested rather than the whole catalog. Loading replays the append on the parent
+    build (see load_catalog_artifacts and friends): the id index, encoded columns, rankings,
+    search and IVF indexes are extended exactly like ingest.ingest_frame extends them.
+
+    Args:
+        out_dir (str): Root directory of the builds; the parent build must be in it.
+        snapshot (ModelSnapshot): The parent build's model with rows appended.
+        n_old (int): Number of rows of the parent build.
+        neighbor_rows (np.ndarray): Rows whose TF-IDF neighbor list was recomputed (every appended row included).
+        topn_rows (np.ndarray): Rows whose top-N candidates were recomputed (ignored without a top-N table).
+        manifest (dict): Manifest fields; must contain ``csv_sha256``, ``parent`` and ``delta``.
+
+    Returns:
+        str: The directory of the new build.
+    """
+    version_tag, tmp_dir = _scratch_dir(out_dir, manifest['csv_sha256'])
+    catalog = snapshot.catalog
+    rows = range(n_old, len(catalog))
+    for name in [name for name in catalog.columns if name in STRING_COLUMNS or name == FRAGMENT_COLUMN]:
+        _save_string_column(tmp_dir, name, [catalog.columns[name][row] for row in rows])
+    np.save(os.path.join(tmp_dir, 'col_engagement_rate.npy'), catalog.engagement_rate[n_old:])
+
+    new_tfidf = snapshot.tfidf_matrix[n_old:]
+    np.save(os.path.join(tmp_dir, 'tfidf_data.npy'), new_tfidf.data)
+    np.save(os.path.join(tmp_dir, 'tfidf_indices.npy'), new_tfidf.indices)
+    np.save(os.path.join(tmp_dir, 'tfidf_indptr.npy'), new_tfidf.indptr)
+    np.save(os.path.join(tmp_dir, 'embeddings.npy'), snapshot.embeddings[n_old:])
+    _save_rows(tmp_dir, 'neighbor', neighbor_rows, snapshot.neighbor_index.ids, snapshot.neighbor_index.scores)
+    delta = dict(manifest['delta'])
+    if snapshot.topn_table is not None:
+        _save_rows(tmp_dir, 'topn', topn_rows, snapshot.topn_table.ids, snapshot.topn_table.scores)
+        delta['topn_semantic_weight'] = snapshot.topn_table.semantic_weight
+
+    return _publish_build(out_dir, version_tag, tmp_dir, {
+        'n_rows': len(catalog),
+        'tfidf_shape': list(snapshot.tfidf_matrix.shape),
+        'embedding_dim': int(snapshot.embeddings.shape[1]),
+        **manifest,
+        'delta': {**delta, 'row_start': n_old},
+    })
+
+
+def _save_rows(directory, name, rows, ids, scores):
+    """Store rows of a (rows x k) ids/scores pair, such as the neighbor index, for a delta build."""
+    rows = np.asarray(rows, dtype=np.int64)
+    np.save(os.path.join(directory, f'delta_{name}_rows.npy'), rows)
+    np.save(os.path.join(directory, f'delta_{name}_ids.npy'), np.asarray(ids)[rows])
+    np.save(os.path.join(directory, f'delta_{name}_scores.npy'), np.asarray(scores)[rows])
+
+
+def _with_rows(array, n_rows, rows, values):
+    """`array` grown to `n_rows` rows, with `rows` replaced by `values` (a copy)."""
+    grown = np.empty((n_rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    grown[rows] = values
+    return grown
+
+
+def _scratch_dir(out_dir, checksum):
+    # Builds are written into a scratch directory first so readers never see a half-written one
+    version_tag = f'v{ARTIFACT_VERSION}-{checksum[:12]}'
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_dir = os.path.join(out_dir, f'{version_tag}.tmp-{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return version_tag, tmp_dir
+
+
+def _publish_build(out_dir, version_tag, tmp_dir, manifest):
+    manifest = {'artifact_version': ARTIFACT_VERSION, 'built_at': time.time(), **manifest}
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    build_dir = os.path.join(out_dir, version_tag)
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.replace(tmp_dir, build_dir)
+    _write_latest(out_dir, version_tag)
+    return build_dir
+
+
+def _save_sorted_index(directory, keys_name, positions_name, index):
+    keys, positions = index.merged().segments[0]
+    np.save(os.path.join(directory, keys_name), keys)
+    np.save(os.path.join(directory, positions_name), positions)
+
+
+def _save_catalog(directory, catalog):
+    """Store a catalog's columns, engagement, id index, encoded columns and rankings (see load_catalog_artifacts)."""
+    for name in STRING_COLUMNS:
+        _save_string_column(directory, name, catalog.columns[name])
+    if FRAGMENT_COLUMN in catalog.columns:
+        _save_string_column(directory, FRAGMENT_COLUMN, catalog.columns[FRAGMENT_COLUMN])
+    np.save(os.path.join(directory, 'col_engagement_rate.npy'), catalog.engagement_rate)
+
+    for name, (rows, offsets) in catalog.rankings().items():
+        np.save(os.path.join(directory, f'ranking_{name}_rows.npy'), rows)
+        np.save(os.path.join(directory, f'ranking_{name}_offsets.npy'), offsets)
+
+    # v_id -> row as sorted fixed-width UTF-8 ids and their rows, binary-searched in place (see catalog.SortedIndex)
+    _save_sorted_index(directory, 'id_sorted.npy', 'id_rows.npy', catalog.row_index)
+    # Codes of the channel and category columns, their vocabularies and value -> code indexes
+    for name, (codes, vocabulary, index) in catalog.encoded().items():
+        np.save(os.path.join(directory, f'codes_{name}.npy'), codes)
+        _save_string_column(directory, f'vocab_{name}', vocabulary)
+        _save_sorted_index(directory, f'vocab_{name}_sorted.npy', f'vocab_{name}_codes.npy', index)
+
+
+def _write_latest(out_dir, version_tag):
+    tmp_pointer = os.path.join(out_dir, f'{LATEST_POINTER}.tmp-{os.getpid()}')
+    with open(tmp_pointer, 'w') as f:
+        f.write(version_tag)
+    os.replace(tmp_pointer, os.path.join(out_dir, LATEST_POINTER))
+
+
+def latest_build_dir(out_dir=DEFAULT_ARTIFACT_DIR):
+    """Return the directory the ``LATEST`` pointer refers to, or None."""
+    try:
+        with open(os.path.join(out_dir, LATEST_POINTER)) as f:
+            return os.path.join(out_dir, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def check_artifacts(build_dir, csv_path=DEFAULT_CSV_PATH):
+    """
+    Validate a build against the current CSV and return its manifest.
+
+    The CSV is only re-hashed when its size or mtime differ from the recorded ones.
+
+    Raises:
+        StaleArtifactsError: If the build is missing, has another layout version or a different CSV checksum.
+    """
+    manifest = _read_manifest(build_dir)
+    if os.path.exists(csv_path) and manifest.get('csv_stat') != _csv_stat(csv_path):
+        # Builds extended by ingests record the appended byte ranges and their chained checksum
+        segments = manifest.get('csv_segments')
+        checksum = _segments_checksum(csv_path, segments) if segments else csv_checksum(csv_path)
+        if checksum != manifest.get('csv_sha256'):
+            raise StaleArtifactsError(f"Artifacts at {build_dir} were built from a different {csv_path}")
+    return manifest
+
+
+def _read_manifest(build_dir):
+    if not build_dir or not os.path.isfile(os.path.join(build_dir, MANIFEST_NAME)):
+        raise StaleArtifactsError(f"No artifacts found at {build_dir}")
+    with open(os.path.join(build_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get('artifact_version') != ARTIFACT_VERSION:
+        raise StaleArtifactsError(
+            f"Artifact version {manifest.get('artifact_version')} does not match {ARTIFACT_VERSION}")
+    return manifest
+
+
+def _parent(build_dir, manifest):
+    """Directory and manifest of the build a delta build extends."""
+    parent_dir = os.path.join(os.path.dirname(build_dir), manifest['parent'])
+    return parent_dir, _read_manifest(parent_dir)
+
+
+def _loader(build_dir):
+    def load(name):
+        return np.load(os.path.join(build_dir, name), mmap_mode='r')
+    return load
+
+
+def load_catalog_artifacts(build_dir, manifest):
+    """
+    Memory-map the catalog part of a build: columns (and response fragments), engagement rankings,
+    id index and encoded columns.
+    """
+    if 'delta' in manifest:
+        return _load_catalog_delta(build_dir, manifest)
+    load = _loader(build_dir)
+    columns = {name: _load_string_column(build_dir, name) for name in STRING_COLUMNS}
+    # Builds made before the fragments have none: responses then encode every result
+    if os.path.exists(os.path.join(build_dir, f'col_{FRAGMENT_COLUMN}.bytes.npy')):
+        columns[FRAGMENT_COLUMN] = _load_string_column(build_dir, FRAGMENT_COLUMN)
+    # Builds made before the encoded columns were stored have them encoded when the catalog is opened
+    encoded = None
+    if os.path.exists(os.path.join(build_dir, f'codes_{next(iter(ENCODED_COLUMNS))}.npy')):
+        encoded = {name: (load(f'codes_{name}.npy'), _load_string_column(build_dir, f'vocab_{name}'),
+                          SortedIndex([(load(f'vocab_{name}_sorted.npy'), load(f'vocab_{name}_codes.npy'))]))
+                   for name in ENCODED_COLUMNS}
+    return {
+        'manifest': manifest,
+        'build_dir': build_dir,
+        'columns': columns,
+        'numeric': {name: load(f'col_{name}.npy') for name in NUMERIC_COLUMNS},
+        'rankings': {name: (load(f'ranking_{name}_rows.npy'), load(f'ranking_{name}_offsets.npy'))
+                     for name in RANKINGS},
+        'row_index': SortedIndex([(load('id_sorted.npy'), load('id_rows.npy'))]),
+        'encoded': encoded,
+    }
+
+
+def _load_catalog_delta(build_dir, manifest):
+    parent = load_catalog_artifacts(*_parent(build_dir, manifest))
+    columns = {name: _load_string_column(build_dir, name).to_list() for name in parent['columns']}
+    engagement_rate = np.load(os.path.join(build_dir, 'col_engagement_rate.npy'))
+    catalog = Catalog.from_artifacts(parent).appended(columns, engagement_rate)
+    return {
+        'manifest': manifest,
+        'build_dir': build_dir,
+        'columns': catalog.columns,
+        'numeric': {'engagement_rate': catalog.engagement_rate},
+        'rankings': catalog.rankings(),
+        'row_index': catalog.row_index,
+        'encoded': catalog.encoded(),
+    }
+
+
+def load_content_artifacts(build_dir, manifest):
+    """Memory-map the content part of a build: TF-IDF vectorizer, matrix and search index, neighbor index and top-N table."""
+    # Imported here: scikit-learn and scipy take seconds to import and the catalog stage needs neither
+    from scipy import sparse
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    from src.services.features import HashingTfidf
+
+    if 'delta' in manifest:
+        return _load_content_delta(build_dir, manifest)
+    load = _loader(build_dir)
+    tfidf_params = dict(manifest['tfidf_params'])
+    if tfidf_params.pop('hashing', False):
+        tfidf = HashingTfidf(idf=np.asarray(load('tfidf_idf.npy')), **tfidf_params)
+    else:
+        # Builds made before the hashed TF-IDF keep their fitted vocabulary
+        with open(os.path.join(build_dir, 'tfidf_vocabulary.json')) as f:
+            vocabulary = json.load(f)
+        tfidf = TfidfVectorizer(vocabulary=vocabulary, **tfidf_params)
+        tfidf.vocabulary_ = vocabulary
+        tfidf.idf_ = np.asarray(load('tfidf_idf.npy'))
+    tfidf_matrix = sparse.csr_matrix(
+        (load('tfidf_data.npy'), load('tfidf_indices.npy'), load('tfidf_indptr.npy')),
+        shape=tuple(manifest['tfidf_shape']), copy=False)
+    return {
+        'tfidf': tfidf,
+        'tfidf_matrix': tfidf_matrix,
+        'search_index': load_search_index(build_dir),
+        'neighbor_index': NeighborIndex(load('neighbor_ids.npy'), load('neighbor_scores.npy')),
+        'topn_table': load_topn_table(build_dir),
+    }
+
+
+def _load_content_delta(build_dir, manifest):
+    from scipy import sparse
+
+    parent = load_content_artifacts(*_parent(build_dir, manifest))
+    load = _loader(build_dir)
+    n_old, n_rows = manifest['delta']['row_start'], manifest['n_rows']
+    new_tfidf = sparse.csr_matrix((load('tfidf_data.npy'), load('tfidf_indices.npy'), load('tfidf_indptr.npy')),
+                                  shape=(n_rows - n_old, manifest['tfidf_shape'][1]))
+    search_index = parent['search_index']
+    neighbor_index = parent['neighbor_index']
+    rows = load('delta_neighbor_rows.npy')
+    topn_table = load_topn_table(build_dir)
+    if topn_table is None or len(topn_table) != n_rows:
+        # The top-N rows the ingest recomputed, unless the top-N job has materialized a whole table since
+        topn_table = None
+        if parent['topn_table'] is not None and 'topn_semantic_weight' in manifest['delta']:
+            topn_rows = load('delta_topn_rows.npy')
+            topn_table = TopNTable(_with_rows(parent['topn_table'].ids, n_rows, topn_rows, load('delta_topn_ids.npy')),
+                                   _with_rows(parent['topn_table'].scores, n_rows, topn_rows,
+                                              load('delta_topn_scores.npy')),
+                                   manifest['delta']['topn_semantic_weight'])
+    return {
+        'tfidf': parent['tfidf'],
+        'tfidf_matrix': sparse.vstack([parent['tfidf_matrix'], new_tfidf], format='csr'),
+        # New postings are merged into the parent's lists (builds made before search have none to extend)
+        'search_index': search_index.appended(new_tfidf, n_old) if search_index is not None else None,
+        'neighbor_index': NeighborIndex(_with_rows(neighbor_index.ids, n_rows, rows, load('delta_neighbor_ids.npy')),
+                                        _with_rows(neighbor_index.scores, n_rows, rows,
+                                                   load('delta_neighbor_scores.npy'))),
+        'topn_table': topn_table,
+    }
+
+
+def load_semantic_artifacts(build_dir, manifest):
+    """Memory-map the semantic part of a build: embeddings and their IVF index (with its quantized codes)."""
+    if 'delta' in manifest:
+        parent = load_semantic_artifacts(*_parent(build_dir, manifest))
+        embeddings = np.concatenate([parent['embeddings'], np.load(os.path.join(build_dir, 'embeddings.npy'))])
+        # New rows join the parent's lists, as when they were ingested
+        return {'embeddings': embeddings, 'semantic_index': parent['semantic_index'].appended(embeddings)}
+    load = _loader(build_dir)
+    embeddings = load('embeddings.npy')
+    return {
+        'embeddings': embeddings,
+        'semantic_index': IVFIndex(embeddings, load('ivf_centroids.npy'), load('ivf_offsets.npy'), load('ivf_rows.npy'),
+                                   codes=load_quantized(build_dir)),
+    }
+
+
+def load_artifacts(out_dir=DEFAULT_ARTIFACT_DIR, csv_path=DEFAULT_CSV_PATH):
+    """
+    Memory-map the latest build.
+
+    Returns:
+        dict: The manifest plus the catalog columns and engagement rankings, TF-IDF vectorizer, matrix and search index,
+        embeddings and their IVF index (with the quantized codes when the build has them), id index,
+        top-K neighbor index and the materialized top-N table (None when the build has none).
+    """
+    build_dir = latest_build_dir(out_dir)
+    manifest = check_artifacts(build_dir, csv_path)
+    return {
+        **load_catalog_artifacts(build_dir, manifest),
+        **load_content_artifacts(build_dir, manifest),
+        **load_semantic_artifacts(build_dir, manifest),
+    }
+
+
+def load_or_build_artifacts(out_dir=DEFAULT_ARTIFACT_DIR, csv_path=DEFAULT_CSV_PATH):
+    """Load the latest build, rebuilding it first when it is missing or stale."""
+    try:
+        return load_artifacts(out_dir, csv_path)
+    except StaleArtifactsError as e:
+        print(f"{e}; rebuilding artifacts (run `python -m src.services.artifacts build-artifacts` ahead of deploys)")
+        build_artifacts(csv_path, out_dir)
+        return load_artifacts(out_dir, csv_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YUGI recommendation artifact tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build-artifacts', help="Build and publish model artifacts from the CSV")
+    build_parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    build_parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+    build_parser.add_argument('--force', action='store_true', help="Rebuild even if the latest build is current")
+    build_parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBOR_K,
+                              help="Content neighbors kept per video")
+    build_parser.add_argument('--encoder', choices=sorted(ENCODERS), default=None,
+                              help="Embedding encoder (defaults to YUGI_ENCODER or sentence-transformers)")
+    build_parser.add_argument('--workers', type=int, default=None,
+                              help="Feature extraction processes (defaults to YUGI_BUILD_WORKERS or the CPU count)")
+    build_parser.add_argument('--chunk-rows', type=int, default=None,
+                              help="CSV rows read and vectorized per chunk (defaults to YUGI_CSV_CHUNK_ROWS or 5000)")
+
+    check_parser = subparsers.add_parser('check-artifacts', help="Verify the latest build matches the CSV")
+    check_parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    check_parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+
+    args = parser.parse_args(argv)
+    if args.command == 'build-artifacts':
+        if not args.force:
+            try:
+                check_artifacts(latest_build_dir(args.out), args.csv)
+                print(f"Artifacts at {latest_build_dir(args.out)} are up to date")
+                return 0
+            except StaleArtifactsError:
+                pass
+        build_artifacts(args.csv, args.out, encoder=get_encoder(args.encoder), neighbor_k=args.neighbors,
+                        workers=args.workers, chunk_rows=args.chunk_rows)
+    elif args.command == 'check-artifacts':
+        try:
+            manifest = check_artifacts(latest_build_dir(args.out), args.csv)
+        except StaleArtifactsError as e:
+            print(e)
+            return 1
+        print(f"Artifacts at {latest_build_dir(args.out)} are current ({manifest['n_rows']} videos)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
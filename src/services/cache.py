@@ -0,0 +1,263 @@
+"""
+Thread-safe caches shared by the API layer and the recommendation engine.
+
+One implementation serves every cache in the process:
+
+- LRU order in an OrderedDict, so get and put are O(1).
+- Optional per-entry TTL. Expiry is driven by a min-heap of deadlines, so expired entries
+  are dropped as they come due instead of by scanning every entry.
+- Limits on the number of entries and on their total size in bytes.
+- Single-flight: concurrent misses on one key run the computation once (get_or_compute).
+- Hit, miss, eviction, expiry and byte counters (stats).
+
+A ShardedLRUCache is split into independently locked shards (lock striping), so concurrent
+requests only contend when their keys land on the same shard.
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from src.services.metrics import TimedLock
+
+DEFAULT_SHARDS = 16
+
+_MISSING = object()
+
+
+def default_sizeof(value):
+    """Approximate size of a cached value in bytes (exact for bytes and str)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """A computation in progress that other threads missing on the same key wait for."""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """A single cache shard guarded by its own lock."""
+
+    def __init__(self, capacity, max_bytes=None, ttl=None, sizeof=default_sizeof):
+        """
+        Args:
+            capacity (int): Largest number of entries.
+            max_bytes (int, optional): Largest total size of the values (see `sizeof`).
+            ttl (float, optional): Default time to live in seconds; entries never expire when None.
+            sizeof (callable): Size of a value in bytes, used for `max_bytes` and the byte metrics.
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        # key -> (value, expires_at or None, size in bytes)
+        self._data = OrderedDict()
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._flights = {}
+        self._lock = TimedLock('cache')
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def _expire(self, now):
+        # Pop every deadline that has come due; entries that were overwritten since carry a newer deadline
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            expires_at, _, key = heapq.heappop(deadlines)
+            entry = self._data.get(key)
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key)
+                self.expirations += 1
+        # Overwritten entries leave stale deadlines behind; rebuild the heap before it outgrows the data
+        if len(deadlines) > 2 * len(self._data) + 64:
+            self._deadlines = [(entry[1], next(self._sequence), key)
+                               for key, entry in self._data.items() if entry[1] is not None]
+            heapq.heapify(self._deadlines)
+
+    def _lookup(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[1] is not None and entry[1] <= now:
+            self._remove(key)
+            self.expirations += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key, value, ttl, now):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl is not None else None
+        size = self.sizeof(value)
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, expires_at, size)
+        self.bytes += size
+        if expires_at is not None:
+            heapq.heappush(self._deadlines, (expires_at, next(self._sequence), key))
+        self._expire(now)
+        # Evict least recently used entries until both limits hold (the new entry is kept last)
+        while len(self._data) > self.capacity or (self.max_bytes is not None and self.bytes > self.max_bytes
+                                                   and len(self._data) > 1):
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, time.time())
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        """Store `value`; `ttl` overrides the cache's default time to live for this entry."""
+        with self._lock:
+            self._store(key, value, ttl, time.time())
+
+    def get_or_compute(self, key, compute, ttl=None, cacheable=None):
+        """
+        Return the cached value of `key`, computing it on a miss.
+
+        Concurrent misses on the same key run `compute()` once: the other callers wait for
+        its result (or its exception). The result is stored unless `cacheable(value)` is false.
+        """
+        with self._lock:
+            value = self._lookup(key, time.time())
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and (cacheable is None or cacheable(flight.value)):
+                    self._store(key, flight.value, ttl, time.time())
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key][0]
+            self._remove(key)
+            return value
+
+    def purge(self, predicate):
+        """Remove every entry for which predicate(key, value) is true; returns how many were removed."""
+        with self._lock:
+            stale = [key for key, entry in self._data.items() if predicate(key, entry[0])]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._deadlines.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Counters and current size of this shard."""
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key, time.time()) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ShardedLRUCache:
+    """Cache striped over `shards` locked shards; the entry and byte limits are split evenly between them."""
+
+    def __init__(self, capacity, shards=DEFAULT_SHARDS, max_bytes=None, ttl=None, sizeof=default_sizeof):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        shard_capacity = max(1, -(-capacity // shards))
+        shard_bytes = max(1, -(-max_bytes // shards)) if max_bytes is not None else None
+        self._shards = [LRUCache(shard_capacity, shard_bytes, ttl, sizeof) for _ in range(shards)]
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def get(self, key, default=None):
+        return self._shard(key).get(key, default)
+
+    def put(self, key, value, ttl=None):
+        self._shard(key).put(key, value, ttl)
+
+    def get_or_compute(self, key, compute, ttl=None, cacheable=None):
+        return self._shard(key).get_or_compute(key, compute, ttl, cacheable)
+
+    def pop(self, key, default=None):
+        return self._shard(key).pop(key, default)
+
+    def purge(self, predicate):
+        """Remove matching entries shard by shard, never holding more than one lock."""
+        return sum(shard.purge(predicate) for shard in self._shards)
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+
+    def stats(self):
+        """Counters and size summed over the shards, plus the hit ratio."""
+        totals = {}
+        for shard in self._shards:
+            for name, value in shard.stats().items():
+                totals[name] = totals.get(name, 0) + value
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_ratio'] = totals['hits'] / lookups if lookups else 0.0
+        totals['capacity'] = self.capacity
+        totals['max_bytes'] = self.max_bytes
+        return totals
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
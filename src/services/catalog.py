@@ -0,0 +1,399 @@
+"""
+Columnar video catalog.
+
+Built once from the model artifacts so the request path never scans a DataFrame:
+v_id lookups binary-search the build's sorted id array, channel and category are integer
+coded (codes and vocabularies stored with the build) with precomputed row groups, numeric
+fields are contiguous arrays, and text columns are decoded from the memory-mapped artifacts
+only for the rows that are returned. Opening a catalog only maps files.
+"""
+import numpy as np
+
+YOUTUBE_WATCH_URL = "https://www.youtube.com/watch?v="
+
+
+def _is_missing(value):
+    return value is None or value == '' or (isinstance(value, float) and np.isnan(value))
+
+
+def encode_column(values):
+    """
+    Dictionary-encode a column.
+
+    Returns:
+        tuple: (int32 codes with -1 for missing values, list of distinct values in first-seen order)
+    """
+    vocabulary = {}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for i, value in enumerate(values):
+        if _is_missing(value):
+            continue
+        codes[i] = vocabulary.setdefault(value, len(vocabulary))
+    return codes, list(vocabulary)
+
+
+def _encode_keys(keys):
+    """Fixed-width UTF-8 byte strings of `keys`, the form SortedIndex searches."""
+    if isinstance(keys, np.ndarray) and keys.dtype.kind == 'S':
+        return keys
+    return np.array([str(key).encode('utf-8') for key in keys], dtype='S')
+
+
+class SortedIndex:
+    """
+    String key -> position, by binary search over sorted fixed-width UTF-8 keys.
+
+    The keys live in segments of (sorted keys, positions): the build's, memory-mapped, and one
+    per batch of appended keys, so adding keys never copies the existing ones. Segments hold
+    increasing positions and are searched in order, and each is sorted stably, so the first
+    position of a duplicated key wins.
+    """
+
+    # Appended segments are merged into one beyond this many, so lookups stay a few binary searches
+    MAX_SEGMENTS = 8
+
+    def __init__(self, segments=()):
+        self.segments = list(segments)
+
+    @classmethod
+    def build(cls, keys, start=0):
+        """Index `keys`, the key of position ``start + i`` being ``keys[i]``."""
+        encoded = _encode_keys(keys)
+        order = np.argsort(encoded, kind='stable')
+        return cls([(encoded[order], (order + start).astype(np.int32))])
+
+    def appended(self, keys, start):
+        """A new index with `keys` added at positions ``start:`` (this one is left untouched)."""
+        segments = self.segments + SortedIndex.build(keys, start).segments
+        if len(segments) > self.MAX_SEGMENTS:
+            # The build's segment stays mapped; only the appended keys are sorted again
+            segments = segments[:1] + SortedIndex(segments[1:]).merged().segments
+        return SortedIndex(segments)
+
+    def merged(self):
+        """The index as a single segment (e.g. to store it with a build)."""
+        if len(self.segments) == 1:
+            return self
+        keys = np.concatenate([np.asarray(keys) for keys, _ in self.segments])
+        positions = np.concatenate([np.asarray(positions) for _, positions in self.segments])
+        # Segments are in position order, so a stable sort keeps the first position of a key first
+        order = np.argsort(keys, kind='stable')
+        return SortedIndex([(keys[order], positions[order])])
+
+    def get(self, key, default=None):
+        """Position of `key`, or `default` when it is not indexed."""
+        encoded = str(key).encode('utf-8')
+        for keys, positions in self.segments:
+            # A longer key would be truncated to the itemsize and could match a prefix
+            if len(encoded) > keys.dtype.itemsize or not len(keys):
+                continue
+            i = np.searchsorted(keys, encoded)
+            if i < len(keys) and keys[i] == encoded:
+                return int(positions[i])
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def positions(self, keys):
+        """Positions of many keys at once (-1 for keys that are not indexed)."""
+        encoded = _encode_keys(keys)
+        result = np.full(len(encoded), -1, dtype=np.int64)
+        for keys_, positions in self.segments:
+            todo = np.flatnonzero(result < 0)
+            if not len(todo) or not len(keys_):
+                continue
+            todo = todo[np.char.str_len(encoded[todo]) <= keys_.dtype.itemsize]
+            needles = encoded[todo].astype(keys_.dtype)
+            found = np.minimum(np.searchsorted(keys_, needles), len(keys_) - 1)
+            hit = keys_[found] == needles
+            result[todo[hit]] = positions[found[hit]]
+        return result
+
+    def first_positions(self):
+        """The first position of every distinct key, in no particular order."""
+        firsts = []
+        for n, (keys, positions) in enumerate(self.segments):
+            first = np.ones(len(keys), dtype=bool)
+            first[1:] = keys[1:] != keys[:-1]
+            keys, positions = keys[first], np.asarray(positions[first], dtype=np.int64)
+            if n:
+                # Keys already seen in an earlier segment have a smaller first position there
+                positions = positions[SortedIndex(self.segments[:n]).positions(keys) < 0]
+            firsts.append(positions)
+        return np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int64)
+
+
+class RowGroups:
+    """
+    Rows grouped by integer code (CSR layout): rows of code c are rows[offsets[c]:offsets[c+1]].
+
+    Inside each group rows are ranked by descending `rank_by` (ties in catalog order), so the
+    best rows of a group are a prefix slice; without `rank_by` they stay in catalog order.
+    """
+
+    def __init__(self, codes, n_groups, rank_by=None):
+        valid = np.flatnonzero(codes >= 0)
+        if rank_by is None:
+            # Stable sort keeps rows in catalog order inside each group
+            order = np.argsort(codes[valid], kind='stable')
+        else:
+            order = np.lexsort((-rank_by[valid], codes[valid]))
+        self.rows = valid[order].astype(np.int32)
+        counts = np.bincount(codes[valid], minlength=n_groups)
+        self.offsets = np.zeros(n_groups + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    @classmethod
+    def from_arrays(cls, rows, offsets):
+        """Wrap precomputed (e.g. memory-mapped) rows and offsets."""
+        groups = object.__new__(cls)
+        groups.rows, groups.offsets = rows, offsets
+        return groups
+
+    def appended(self, codes, n_groups, rank_by, n_old):
+        """
+        The groups with rows ``n_old:`` of `codes` merged in (ranked by `rank_by`).
+
+        Each new row is placed by binary search inside its group, so the work grows with the
+        number of new rows (plus one copy of the arrays).
+        """
+        new = np.arange(n_old, len(codes))
+        new = new[codes[new] >= 0]
+        new = new[np.lexsort((-rank_by[new], codes[new]))]
+        offsets = np.concatenate([self.offsets, np.full(n_groups + 1 - len(self.offsets), self.offsets[-1])])
+        positions = np.empty(len(new), dtype=np.int64)
+        for i, row in enumerate(new):
+            start, end = offsets[codes[row]], offsets[codes[row] + 1]
+            # After every existing row ranked at least as high (existing rows win ties, like catalog order)
+            positions[i] = start + np.searchsorted(-rank_by[self.rows[start:end]], -rank_by[row], side='right')
+        groups = object.__new__(RowGroups)
+        groups.rows = np.insert(np.asarray(self.rows), positions, new.astype(np.int32))
+        groups.offsets = offsets.copy()
+        groups.offsets[1:] += np.cumsum(np.bincount(codes[new], minlength=n_groups))
+        return groups
+
+    def __getitem__(self, code):
+        if code < 0:
+            return self.rows[:0]
+        return self.rows[self.offsets[code]:self.offsets[code + 1]]
+
+
+# Dictionary-encoded columns: column name -> (codes, vocabulary) Catalog attributes
+ENCODED_COLUMNS = {
+    'category_id': ('category_codes', 'categories'),
+    'channel_name': ('channel_codes', 'channels'),
+    'channel_id': ('channel_id_codes', 'channel_ids'),
+}
+
+# Engagement rankings: name -> Catalog attribute, and the (codes, vocabulary) attributes they group by
+RANKINGS = {
+    'category': 'rows_by_category',
+    'channel': 'rows_by_channel',
+    'channel_id': 'rows_by_channel_id',
+    'global': 'ranked_rows',
+}
+RANKING_CODES = {
+    'category': ENCODED_COLUMNS['category_id'],
+    'channel': ENCODED_COLUMNS['channel_name'],
+    'channel_id': ENCODED_COLUMNS['channel_id'],
+    'global': (None, None),
+}
+
+
+def _values(column):
+    return column.to_list() if hasattr(column, 'to_list') else list(column)
+
+
+class Catalog:
+    """Read-only columnar view of the video catalog."""
+
+    def __init__(self, columns, engagement_rate, rankings=None, encoded=None, row_index=None):
+        """
+        Args:
+            columns (dict): Column name -> sequence of strings (None for missing), e.g. StringColumn.
+            engagement_rate (np.ndarray): Engagement rate per row.
+            rankings (dict, optional): Precomputed engagement rankings, name -> (rows, offsets)
+                as returned by `rankings()`; computed here when omitted.
+            encoded (dict, optional): Precomputed encodings of the ENCODED_COLUMNS, name ->
+                (codes, vocabulary, SortedIndex of the vocabulary) as returned by `encoded()`.
+            row_index (SortedIndex, optional): Precomputed v_id index; built here when omitted.
+        """
+        self.columns = columns
+        self.engagement_rate = np.ascontiguousarray(engagement_rate, dtype=np.float64)
+        # v_id of every row, decoded on access (a StringColumn for catalogs loaded from a build)
+        self.video_ids = columns['v_id']
+        # v_id -> row number; the first occurrence wins for duplicated ids
+        self.row_index = row_index if row_index is not None else SortedIndex.build(_values(columns['v_id']))
+
+        # Vocabulary value -> code, per encoded column
+        self.vocabulary_index = {}
+        for name, (codes_attr, vocab_attr) in ENCODED_COLUMNS.items():
+            if encoded is not None:
+                codes, vocabulary, index = encoded[name]
+            else:
+                codes, vocabulary = encode_column(_values(columns[name]))
+                index = SortedIndex.build(vocabulary)
+            setattr(self, codes_attr, codes)
+            setattr(self, vocab_attr, vocabulary)
+            self.vocabulary_index[name] = index
+        # A few dozen categories: decoded once for the per-request category lookups
+        self.categories = _values(self.categories)
+        self.category_code_of = {category: code for code, category in enumerate(self.categories)}
+
+        # Rows of every category, channel and channel id (and of the whole catalog), ranked by
+        # engagement so the collaborative stage slices its candidates instead of sorting
+        if rankings is not None:
+            for name, (rows, offsets) in rankings.items():
+                setattr(self, RANKINGS[name], RowGroups.from_arrays(rows, offsets))
+        else:
+            for name, (codes_attr, vocab_attr) in RANKING_CODES.items():
+                codes, n_groups = self._ranking_codes(codes_attr, vocab_attr)
+                setattr(self, RANKINGS[name], RowGroups(codes, n_groups, rank_by=self.engagement_rate))
+
+    def _ranking_codes(self, codes_attr, vocab_attr):
+        if codes_attr is None:
+            return np.zeros(len(self), dtype=np.int32), 1
+        return getattr(self, codes_attr), len(getattr(self, vocab_attr))
+
+    def rankings(self):
+        """The engagement rankings as name -> (rows, offsets) arrays, e.g. to store them with the artifacts."""
+        return {name: (getattr(self, attr).rows, getattr(self, attr).offsets) for name, attr in RANKINGS.items()}
+
+    def encoded(self):
+        """The encoded columns as name -> (codes, vocabulary, vocabulary SortedIndex), e.g. to store them."""
+        return {name: (getattr(self, codes_attr), getattr(self, vocab_attr), self.vocabulary_index[name])
+                for name, (codes_attr, vocab_attr) in ENCODED_COLUMNS.items()}
+
+    @classmethod
+    def from_artifacts(cls, artifacts):
+        return cls(artifacts['columns'], artifacts['numeric']['engagement_rate'], artifacts.get('rankings'),
+                   artifacts.get('encoded'), artifacts.get('row_index'))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build a catalog from a preprocessed DataFrame (see artifacts.load_catalog_frame)."""
+        columns = {}
+        for name in ['v_id', 'v_title', 'v_description', 'tags', 'category_id',
+                     'channel_name', 'channel_id', 'video_link']:
+            values = df[name].tolist() if name in df.columns else [None] * len(df)
+            columns[name] = [None if _is_missing(v) else v for v in values]
+        return cls(columns, df['engagement_rate'].to_numpy(dtype=np.float64))
+
+    def appended(self, columns, engagement_rate):
+        """
+        A new catalog with rows added after the existing ones (this catalog is left untouched).
+
+        Only the new values are indexed and dictionary-encoded: the id and vocabulary indexes
+        gain a segment of the new keys, and the existing codes and rankings are extended, so the
+        per-row Python work grows with the new rows.
+
+        Args:
+            columns (dict): Column name -> list of new values (None for missing).
+            engagement_rate (np.ndarray): Engagement rate per new row.
+        """
+        n_new = len(engagement_rate)
+        catalog = object.__new__(Catalog)
+        catalog.columns = {}
+        for name, column in self.columns.items():
+            values = columns.get(name, [None] * n_new)
+            catalog.columns[name] = column.appended(values) if hasattr(column, 'appended') else list(column) + values
+        catalog.engagement_rate = np.concatenate([self.engagement_rate, np.asarray(engagement_rate, dtype=np.float64)])
+        catalog.video_ids = catalog.columns['v_id']
+        catalog.row_index = self.row_index.appended(list(columns['v_id']), len(self))
+
+        catalog.vocabulary_index = {}
+        for name, (codes_attr, vocab_attr) in ENCODED_COLUMNS.items():
+            vocabulary, index = getattr(self, vocab_attr), self.vocabulary_index[name]
+            added = {}
+            new_codes = np.full(n_new, -1, dtype=np.int32)
+            for i, value in enumerate(columns.get(name, [None] * n_new)):
+                if not _is_missing(value):
+                    code = index.get(value)
+                    new_codes[i] = code if code is not None else added.setdefault(value, len(vocabulary) + len(added))
+            setattr(catalog, codes_attr, np.concatenate([getattr(self, codes_attr), new_codes]))
+            if added:
+                vocabulary = vocabulary.appended(list(added)) if hasattr(vocabulary, 'appended') \
+                    else list(vocabulary) + list(added)
+                index = index.appended(list(added), len(getattr(self, vocab_attr)))
+            setattr(catalog, vocab_attr, vocabulary)
+            catalog.vocabulary_index[name] = index
+        catalog.category_code_of = {category: code for code, category in enumerate(catalog.categories)}
+
+        # New rows are merged into the existing rankings rather than re-sorting every group
+        for name, (codes_attr, vocab_attr) in RANKING_CODES.items():
+            codes, n_groups = catalog._ranking_codes(codes_attr, vocab_attr)
+            setattr(catalog, RANKINGS[name], getattr(self, RANKINGS[name]).appended(
+                codes, n_groups, catalog.engagement_rate, len(self)))
+        return catalog
+
+    def __len__(self):
+        return len(self.engagement_rate)
+
+    def row_of(self, video_id):
+        """Row number of `video_id`, or None if it is not in the catalog."""
+        return self.row_index.get(video_id)
+
+    def rows_of(self, video_ids):
+        """Row numbers of many video ids at once (-1 for ids not in the catalog)."""
+        return self.row_index.positions(video_ids)
+
+    def code_of(self, name, value):
+        """Code of `value` in the encoded column `name` (-1 when it does not occur)."""
+        code = self.vocabulary_index[name].get(value) if value is not None else None
+        return -1 if code is None else code
+
+    def video_id_list(self):
+        """Every row's v_id as a list (decodes the whole column; for tools and benchmarks)."""
+        return _values(self.video_ids)
+
+    def value(self, name, row):
+        """Single text field of a row (None when missing)."""
+        return self.columns[name][row]
+
+    def category_of(self, row):
+        code = self.category_codes[row]
+        return self.categories[code] if code >= 0 else None
+
+    def channel_of(self, row):
+        code = self.channel_codes[row]
+        return self.channels[code] if code >= 0 else None
+
+    def channel_id_of(self, row):
+        code = self.channel_id_codes[row]
+        return self.channel_ids[code] if code >= 0 else None
+
+    def same_channel_rows(self, row):
+        """Rows from the same channel, matched by name or else by channel id."""
+        if self.channel_codes[row] >= 0:
+            return self.rows_by_channel[self.channel_codes[row]]
+        return self.rows_by_channel_id[self.channel_id_codes[row]]
+
+    def same_category_rows(self, row):
+        return self.rows_by_category[self.category_codes[row]]
+
+    def top_same_channel(self, row, n):
+        """The `n` most engaging rows of the row's channel, best first (a slice of the precomputed ranking)."""
+        return self.same_channel_rows(row)[:n]
+
+    def top_same_category(self, row, n):
+        """The `n` most engaging rows of the row's category, best first."""
+        return self.same_category_rows(row)[:n]
+
+    def top_overall(self, n):
+        """The `n` most engaging rows of the whole catalog, best first."""
+        return self.ranked_rows[0][:n]
+
+    def record(self, row):
+        """The video fields of one row, as returned by the recommendation functions."""
+        video_id = self.video_ids[row]
+        return {
+            "id": video_id,
+            "title": self.value('v_title', row),
+            "link": self.value('video_link', row) or YOUTUBE_WATCH_URL + video_id,
+            "description": self.value('v_description', row),
+            "tags": self.value('tags', row),
+            "category": self.category_of(row),
+            "channel_name": self.channel_of(row),
+            "channel_id": self.channel_id_of(row),
+        }
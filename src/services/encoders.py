@@ -0,0 +1,99 @@
+"""
+Pluggable text encoders for the semantic embeddings.
+
+The production encoder is the SentenceTransformer model. The hashing encoder is a
+deterministic, dependency-free stand-in for offline builds, tests and benchmarks:
+the same text always maps to the same vector on every machine.
+
+Select one with ``YUGI_ENCODER`` (``sentence-transformers`` or ``hashing``) or the
+``--encoder`` option of the artifact commands.
+"""
+import hashlib
+import os
+import re
+
+import numpy as np
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_BATCH_SIZE = 32
+DEFAULT_ENCODER = os.environ.get('YUGI_ENCODER', 'sentence-transformers')
+
+_TOKEN_PATTERN = re.compile(r'\w\w+')
+
+
+def normalize_rows(matrix):
+    """L2-normalize every row in place (zero rows are left as zeros) and return the matrix."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+class SentenceTransformerEncoder:
+    """Encode texts with a SentenceTransformer model in fixed-size batches."""
+
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, batch_size=EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+
+    @property
+    def model(self):
+        # Imported lazily: torch and sentence_transformers are only needed when encoding
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def dim(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def __call__(self, texts):
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        # Process embeddings in batches for better performance
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i+self.batch_size]
+            embeddings[i:i+len(batch)] = self.model.encode(batch, batch_size=self.batch_size, show_progress_bar=False)
+        return normalize_rows(embeddings)
+
+
+class HashingEncoder:
+    """Deterministic stand-in encoder: signed feature hashing of lowercase word tokens."""
+
+    name = 'hashing'
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _bucket(self, token):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def __call__(self, texts):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        buckets = {}
+        for i, text in enumerate(texts):
+            for token in _TOKEN_PATTERN.findall(str(text).lower()):
+                if token not in buckets:
+                    buckets[token] = self._bucket(token)
+                column, sign = buckets[token]
+                embeddings[i, column] += sign
+        return normalize_rows(embeddings)
+
+
+ENCODERS = {
+    SentenceTransformerEncoder.name: SentenceTransformerEncoder,
+    HashingEncoder.name: HashingEncoder,
+}
+
+
+def get_encoder(name=None):
+    """Instantiate an encoder by name (defaults to ``YUGI_ENCODER``)."""
+    name = name or DEFAULT_ENCODER
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder {name!r}; choose one of {sorted(ENCODERS)}")
+    return ENCODERS[name]()
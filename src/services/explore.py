@@ -0,0 +1,101 @@
+"""
+"Explore" feed: random catalog videos with stable, non-overlapping pages.
+
+Each session walks its own pseudo-random permutation of a precomputed pool of valid rows.
+The permutation is a seeded Feistel network evaluated only at the requested positions, so
+page k is the O(limit) slice [k*limit, (k+1)*limit) of the same order: pages never overlap,
+reloading a page returns the same videos, and nothing proportional to the catalog is
+allocated per request.
+"""
+import secrets
+
+import numpy as np
+
+from src.services.fragments import stable_hash
+
+FEISTEL_ROUNDS = 4
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_MIX2 = np.uint64(0xBF58476D1CE4E5B9)
+
+
+def new_session():
+    """A fresh random session token."""
+    return secrets.token_hex(8)
+
+
+def explore_pool(catalog):
+    """
+    Rows eligible for the explore feed, computed once per snapshot: rows with a title,
+    and only the first row of a duplicated video id (so a feed never shows a video twice).
+    """
+    titles = catalog.columns['v_title']
+    nulls = getattr(titles, 'nulls', None)
+    if nulls is None:
+        nulls = [title is None for title in titles]
+    valid = ~np.asarray(nulls, dtype=bool)
+    first = np.zeros(len(catalog), dtype=bool)
+    first[catalog.row_index.first_positions()] = True
+    return np.flatnonzero(valid & first).astype(np.int64)
+
+
+def extend_explore_pool(pool, catalog, n_old):
+    """The explore pool of `catalog` from the pool of its first `n_old` rows: only the appended rows are checked."""
+    rows = np.arange(n_old, len(catalog))
+    titles = catalog.columns['v_title']
+    valid = np.array([titles[row] is not None for row in rows], dtype=bool)
+    first = catalog.rows_of([catalog.video_ids[row] for row in rows]) == rows
+    return np.concatenate([np.asarray(pool), rows[valid & first]]).astype(np.int64)
+
+
+class SessionPermutation:
+    """Pseudo-random permutation of range(n) for one seed, evaluated position by position."""
+
+    def __init__(self, n, seed):
+        self.n = n
+        # Balanced Feistel network over 2 * half_bits bits (a domain of less than 4n values)
+        self.half_bits = max(1, ((max(n, 2) - 1).bit_length() + 1) // 2)
+        self.mask = np.uint64((1 << self.half_bits) - 1)
+        self.keys = np.random.default_rng(seed).integers(0, 2**63, size=FEISTEL_ROUNDS, dtype=np.uint64)
+
+    def _round(self, right, key):
+        x = (right ^ key) * _MIX
+        x ^= x >> np.uint64(31)
+        x *= _MIX2
+        x ^= x >> np.uint64(29)
+        return x & self.mask
+
+    def _encrypt(self, values):
+        shift = np.uint64(self.half_bits)
+        left, right = values >> shift, values & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << shift) | right
+
+    def __getitem__(self, positions):
+        """Permuted values of `positions` (each in range(n))."""
+        values = self._encrypt(np.asarray(positions, dtype=np.uint64))
+        # Cycle-walk values that land outside range(n); the domain is < 4n, so this ends quickly
+        outside = values >= self.n
+        while outside.any():
+            values[outside] = self._encrypt(values[outside])
+            outside = values >= self.n
+        return values.astype(np.int64)
+
+
+def explore_rows(pool, session, top_n, offset):
+    """
+    Rows of one explore page.
+
+    Args:
+        pool (np.ndarray): Eligible rows (see explore_pool).
+        session (str): Session token; it fixes the order of every page (on every worker).
+        top_n (int): Page size.
+        offset (int): Position of the first row of the page.
+
+    Returns:
+        np.ndarray: Up to `top_n` rows (fewer on the last page, none past the end).
+    """
+    positions = np.arange(offset, min(offset + top_n, len(pool)), dtype=np.int64)
+    if len(positions) == 0:
+        return positions
+    return pool[SessionPermutation(len(pool), stable_hash(session))[positions]]
@@ -0,0 +1,230 @@
+"""
+Streaming, parallel feature extraction for the artifact build.
+
+The catalog CSV is read in chunks of CSV_CHUNK_ROWS rows, keeping only the columns the
+model uses, with explicit dtypes (no inference pass, no unused counters or URLs). Every
+chunk goes to a pool of forked worker processes that preprocess it, hash its text into
+term counts and encode its embeddings, and send back compact arrays only: the UTF-8 blobs
+of the stored string columns, the engagement rates, a sparse count matrix and float32
+embeddings. The concatenated ``content`` text is dropped in the worker as soon as it is
+vectorized, and at most MAX_CHUNKS_PER_WORKER chunks per worker are in flight, so the raw
+text held at any time is bounded by chunk size x workers rather than by the CSV size.
+What still grows with the catalog is the build output itself.
+
+TF-IDF uses the hashing trick (HashingTfidf): the column of a token is a hash of the
+token, so chunks are vectorized independently without a vocabulary fit pass. Document
+frequencies are counted from the merged chunk counts and the idf weighting is applied
+once, in place, after the last chunk.
+"""
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from src.services.artifacts import STRING_COLUMNS, StringColumn, _encode_strings, prepare_catalog_frame
+from src.services.neighbors import peak_rss_mb
+
+# Hashed TF-IDF columns; 2**20 keeps collisions rare for catalog-sized vocabularies
+TFIDF_FEATURES = 1 << 20
+CSV_CHUNK_ROWS = int(os.environ.get('YUGI_CSV_CHUNK_ROWS', 5000))
+BUILD_WORKERS = int(os.environ.get('YUGI_BUILD_WORKERS', os.cpu_count() or 1))
+# Chunks queued per worker: enough to keep workers busy while the reader parses the next one
+MAX_CHUNKS_PER_WORKER = 2
+
+# Columns read from the CSV and their dtypes; everything else in the file is skipped
+CSV_DTYPES = {
+    'v_id': str,
+    'v_title': str,
+    'v_description': str,
+    'tags': str,
+    'category_id': str,
+    'channel_name': str,
+    'channel_id': str,
+    'engagement_rate': np.float64,
+}
+
+# Set before the pool forks, so workers inherit them instead of unpickling them per chunk
+_worker_encoder = None
+_worker_tfidf = None
+
+
+class HashingTfidf:
+    """
+    TF-IDF over hashed token columns, weighted like TfidfVectorizer's defaults.
+
+    Raw term counts times the smoothed idf ``ln((1 + n) / (1 + df)) + 1``, rows L2-normalized.
+    Exposes ``transform`` and ``idf_`` like a fitted TfidfVectorizer, so ingest treats both alike.
+    """
+
+    def __init__(self, n_features=TFIDF_FEATURES, stop_words='english', idf=None):
+        self.n_features = n_features
+        self.stop_words = stop_words
+        self.idf_ = idf
+        # float32 weights: half the size of TfidfVectorizer's float64 matrix
+        self._hasher = HashingVectorizer(n_features=n_features, stop_words=stop_words, alternate_sign=False,
+                                         norm=None, dtype=np.float32)
+
+    @property
+    def params(self):
+        """Manifest parameters; load_artifacts recognizes a hashed TF-IDF by ``hashing``."""
+        return {'hashing': True, 'n_features': self.n_features, 'stop_words': self.stop_words}
+
+    def counts(self, texts):
+        """Term count matrix of `texts` (CSR, float32); needs no fitted state."""
+        return self._hasher.transform(texts)
+
+    def fit_counts(self, counts):
+        """Set the idf from the document frequencies of a count matrix over the whole corpus."""
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf_ = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1.0
+        return self
+
+    def weight(self, counts):
+        """Turn a count matrix into TF-IDF rows, in place."""
+        counts.data *= self.idf_[counts.indices]
+        return normalize(counts, copy=False)
+
+    def transform(self, texts):
+        return self.weight(self.counts(texts))
+
+
+def read_catalog_chunks(csv_path, chunk_rows=CSV_CHUNK_ROWS):
+    """Iterate over the CSV in DataFrames of at most `chunk_rows` raw rows with compact dtypes."""
+    return iter(pd.read_csv(csv_path, chunksize=chunk_rows, usecols=lambda name: name in CSV_DTYPES,
+                            dtype=CSV_DTYPES))
+
+
+def _featurize_chunk(chunk):
+    # Runs in a worker: everything returned is a compact array, the text stays here
+    timings = {}
+    phase = time.perf_counter()
+    df = prepare_catalog_frame(chunk)
+    content = df.pop('content').tolist()
+    columns = {name: _encode_strings(df[name].tolist() if name in df.columns else [None] * len(df))
+               for name in STRING_COLUMNS}
+    engagement = df['engagement_rate'].to_numpy(dtype=np.float64)
+    del df
+    timings['prepare'] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    counts = _worker_tfidf.counts(content)
+    timings['tfidf'] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    embeddings = np.ascontiguousarray(_worker_encoder(content), dtype=np.float32)
+    timings['embeddings'] = time.perf_counter() - phase
+    return {'columns': columns, 'engagement': engagement, 'counts': counts, 'embeddings': embeddings,
+            'timings': timings, 'peak_rss_mb': peak_rss_mb()}
+
+
+def _init_worker():
+    # One intra-op thread per worker: the pool provides the parallelism (read when torch is imported)
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = '1'
+
+
+def _featurized_chunks(chunks, workers):
+    """Results of _featurize_chunk in chunk order, with a bounded number of chunks in flight."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield _featurize_chunk(chunk)
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                             initializer=_init_worker) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_featurize_chunk, chunk))
+            del chunk
+            if len(pending) >= MAX_CHUNKS_PER_WORKER * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _concat_string_columns(parts):
+    """One StringColumn from the (blob, offsets, nulls) parts of consecutive chunks."""
+    blobs, offsets, nulls = [], [np.zeros(1, dtype=np.int64)], []
+    base = 0
+    for blob, part_offsets, part_nulls in parts:
+        blobs.append(blob)
+        offsets.append(part_offsets[1:] + base)
+        nulls.append(part_nulls)
+        base += int(part_offsets[-1])
+    return StringColumn(np.concatenate(blobs) if blobs else np.empty(0, dtype=np.uint8),
+                        np.concatenate(offsets), np.concatenate(nulls) if nulls else np.empty(0, dtype=bool))
+
+
+def extract_features(csv_path, encoder, workers=BUILD_WORKERS, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Read, vectorize and encode the catalog CSV in parallel chunks.
+
+    Args:
+        csv_path (str): Path of the catalog CSV.
+        encoder (callable): Encoder mapping a list of texts to L2-normalized float32 embeddings.
+        workers (int): Worker processes (1 runs every chunk in this process).
+        chunk_rows (int): Raw CSV rows per chunk.
+
+    Returns:
+        dict: columns (name -> StringColumn), engagement_rate, the fitted HashingTfidf and its
+        CSR matrix, embeddings, timings and stats (workers, chunks, peak RSS of a worker).
+    """
+    global _worker_encoder, _worker_tfidf
+
+    tfidf = HashingTfidf()
+    timings = {}
+    start = time.time()
+    columns = {name: [] for name in STRING_COLUMNS}
+    engagement, counts, embeddings = [], [], []
+    worker_seconds = {'prepare': 0.0, 'tfidf': 0.0, 'embeddings': 0.0}
+    worker_peak_rss = 0.0
+    _worker_encoder, _worker_tfidf = encoder, tfidf
+    try:
+        for result in _featurized_chunks(read_catalog_chunks(csv_path, chunk_rows), workers):
+            for name in STRING_COLUMNS:
+                columns[name].append(result['columns'][name])
+            engagement.append(result['engagement'])
+            counts.append(result['counts'])
+            embeddings.append(result['embeddings'])
+            for phase, seconds in result['timings'].items():
+                worker_seconds[phase] += seconds
+            worker_peak_rss = max(worker_peak_rss, result['peak_rss_mb'])
+    finally:
+        _worker_encoder = _worker_tfidf = None
+    n_chunks = len(counts)
+    timings['features'] = time.time() - start
+
+    phase = time.time()
+    columns = {name: _concat_string_columns(parts) for name, parts in columns.items()}
+    engagement = np.concatenate(engagement) if engagement else np.empty(0, dtype=np.float64)
+    embeddings = np.concatenate(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+    counts = sparse.vstack(counts, format='csr') if counts else sparse.csr_matrix((0, tfidf.n_features), dtype=np.float32)
+    # idf needs the document frequencies of the whole corpus, so weighting waits for the last chunk
+    tfidf_matrix = tfidf.fit_counts(counts).weight(counts)
+    timings['idf'] = time.time() - phase
+
+    stats = {
+        'workers': workers,
+        'chunk_rows': chunk_rows,
+        'chunks': n_chunks,
+        'worker_seconds': worker_seconds,
+        'worker_peak_rss_mb': worker_peak_rss,
+    }
+    print(f"Extracted features of {len(engagement)} videos from {n_chunks} chunks in {timings['features']:.1f}s "
+          f"({workers} workers; worker time: prepare {worker_seconds['prepare']:.1f}s, "
+          f"tfidf {worker_seconds['tfidf']:.1f}s, embeddings {worker_seconds['embeddings']:.1f}s)")
+    return {
+        'columns': columns,
+        'engagement_rate': engagement,
+        'tfidf': tfidf,
+        'tfidf_matrix': tfidf_matrix,
+        'embeddings': embeddings,
+        'timings': timings,
+        'stats': stats,
+    }
@@ -0,0 +1,125 @@
+"""
+Pre-serialized response fragments.
+
+Every video is shown to the frontend as the same object: its catalog fields plus display
+fields (thumbnail URL, channel name with a fallback, description cut to 200 characters and
+placeholder view count and age). Those objects only depend on the catalog, so each video's
+is serialized once, when the build is made, and stored as a string column of JSON text
+without its closing brace:
+
+    {"category":"28",...,"views":"57K views"
+
+A response appends ``,"score":<score>}`` (or just ``}`` in the explore feed) to the fragment
+of each result and joins them into the body (see response_body), so the request path neither
+copies dicts nor re-serializes the video fields.
+
+The placeholder views and age are derived from a content hash of the video id rather than
+hash(), which is salted per process: every worker and every build returns the same bytes,
+so ETags and HTTP caches stay valid across workers and restarts.
+"""
+import hashlib
+import json
+import math
+import sys
+
+# Name of the string column holding the fragments in a build (absent in builds made before them)
+FRAGMENT_COLUMN = 'fragment'
+THUMBNAIL_URL = "https://img.youtube.com/vi/{}/mqdefault.jpg"
+DEFAULT_CHANNEL = "YouTube Creator"
+# Characters of the description sent to the frontend
+DESCRIPTION_LENGTH = 200
+
+# Compact, key-sorted JSON like jsonify's; one shared encoder (json.dumps with options builds one per call)
+_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+def stable_hash(value):
+    """64-bit hash of a video id or token, the same in every process and on every node (unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def display_fields(record):
+    """
+    The frontend object of a video, without its score.
+
+    Args:
+        record (dict): The video's fields, as returned by Catalog.record.
+    """
+    video_id = record['id']
+    digest = stable_hash(video_id)
+    return {
+        "id": video_id,
+        "title": record['title'],
+        "link": record['link'],
+        "description": record['description'][:DESCRIPTION_LENGTH] if record['description'] else "",
+        "tags": record['tags'] or "",
+        "category": record['category'],
+        "channel": record['channel_name'] or DEFAULT_CHANNEL,
+        "channel_id": record['channel_id'],
+        "thumbnail": THUMBNAIL_URL.format(video_id),
+        "views": f"{(digest % 200) + 10}K views",
+        "timestamp": f"{(digest % 30) + 1} days ago",
+    }
+
+
+def encode_fragment(record):
+    """JSON text of a video's display object, open-ended so a score can be appended."""
+    # Keys sorted like jsonify's; "score" always comes last
+    return _encoder.encode(display_fields(record))[:-1]
+
+
+def build_fragments(catalog, rows=None):
+    """Fragments of `rows` of a catalog (all of them by default), as a list of strings."""
+    rows = range(len(catalog)) if rows is None else rows
+    return [encode_fragment(catalog.record(row)) for row in rows]
+
+
+def fragment(catalog, row):
+    """UTF-8 fragment (bytes-like) of a catalog row: read from the build, or encoded for builds without fragments."""
+    column = catalog.columns.get(FRAGMENT_COLUMN)
+    if column is not None:
+        # A view of the mapped bytes: they are copied once, into the result
+        return column.view(row)
+    return encode_fragment(catalog.record(row)).encode('utf-8')
+
+
+def _json_score(score):
+    """
+    A score as JSON number text. JSON has no NaN or Infinity (a missing engagement rate makes a
+    NaN collaborative score), so NaN is written as 0 and infinities as the largest finite float.
+    """
+    score = float(score)
+    if not math.isfinite(score):
+        score = 0.0 if math.isnan(score) else math.copysign(sys.float_info.max, score)
+    # repr is the shortest string that round-trips, as json.dumps writes floats
+    return repr(score).encode('ascii')
+
+
+def result(catalog, row, score=None):
+    """The complete JSON object of one result, with its score (explore results have none)."""
+    if score is None:
+        return b''.join((fragment(catalog, row), b'}'))
+    return b''.join((fragment(catalog, row), b',"score":', _json_score(score), b'}'))
+
+
+def response_body(results, payload=None, key='results'):
+    """
+    JSON body of an object holding the pre-serialized `results` list under `key` and the
+    (small) `payload` fields, serialized as usual.
+
+    Args:
+        results (list): JSON objects as bytes (see result).
+        payload (dict, optional): The other fields of the response.
+        key (str): Name of the results field.
+    """
+    # One join of every piece, so the body is copied once
+    parts = [b'{', _encoder.encode(key).encode('utf-8'), b':[']
+    for item in results:
+        parts += (item, b',')
+    if results:
+        parts.pop()
+    if payload:
+        parts += (b'],', _encoder.encode(payload).encode('utf-8')[1:])
+    else:
+        parts.append(b']}')
+    return b''.join(parts)
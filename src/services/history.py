@@ -0,0 +1,295 @@
+"""
+Durable watch-history store.
+
+Recent views are kept in memory per user (an ordered dict bounded to HISTORY_LENGTH, so the
+duplicate check and the append are O(1)), and only the most recently active users stay
+resident (LRU). Every new view is also queued for a background writer that batches inserts
+into a pluggable backend, by default a local SQLite database in WAL mode. Histories that
+are not in memory (evicted users, restarts) are loaded from the backend, and resident ones
+are reloaded after HISTORY_RESIDENT_TTL seconds, so views written by other workers show up.
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from src.services.cache import ShardedLRUCache
+from src.services.metrics import TimedLock, register_cache
+
+# Number of most recent videos kept per user
+HISTORY_LENGTH = 20
+# Users whose history stays in memory; inactive users are evicted and reloaded on demand
+MAX_ACTIVE_USERS = int(os.environ.get('YUGI_MAX_ACTIVE_USERS', 100_000))
+# Seconds a resident history is served before it is reloaded (other workers write to the same backend)
+HISTORY_RESIDENT_TTL = float(os.environ.get('YUGI_HISTORY_RESIDENT_TTL', 5.0))
+HISTORY_BACKEND = os.environ.get('YUGI_HISTORY_BACKEND', 'sqlite')
+HISTORY_DB_PATH = os.environ.get('YUGI_HISTORY_DB', os.path.join('data', 'watch_history.db'))
+# Largest batch written in one transaction, and longest wait before a partial batch is written
+WRITE_BATCH_SIZE = 512
+WRITE_INTERVAL = 0.05
+# Wait before retrying a failed write, doubled after every further failure up to WRITE_RETRY_MAX_DELAY
+WRITE_RETRY_DELAY = 0.1
+WRITE_RETRY_MAX_DELAY = 30.0
+# Longest wait for queued views at exit (views still unwritten then are lost)
+EXIT_FLUSH_TIMEOUT = 10.0
+# Pending writes before track_view blocks (back-pressure when the disk falls behind)
+MAX_PENDING_WRITES = 100_000
+HISTORY_LOCK_STRIPES = 64
+
+
+class MemoryBackend:
+    """Non-durable backend keeping every view in a dict (tests, benchmarks, throwaway servers)."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def write_many(self, views):
+        with self._lock:
+            for user_id, video_id, watched_at, video in views:
+                self._views.setdefault(user_id, {})[video_id] = (watched_at, video)
+
+    def load(self, user_id, limit):
+        with self._lock:
+            views = list(self._views.get(user_id, {}).values())
+        views.sort(key=lambda view: view[0], reverse=True)
+        return [video for _, video in views[:limit]]
+
+    def iter_views(self):
+        """Every stored (user_id, video_id) pair (the collaborative model's training data)."""
+        with self._lock:
+            views = [(user_id, video_id) for user_id, videos in self._views.items() for video_id in videos]
+        return iter(views)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Views stored in a local SQLite database in WAL mode (readers never block the writer)."""
+
+    name = 'sqlite'
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS watch_history ("
+                " user_id TEXT NOT NULL, video_id TEXT NOT NULL, watched_at TEXT NOT NULL, video TEXT NOT NULL,"
+                " PRIMARY KEY (user_id, video_id))")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS watch_history_recent ON watch_history (user_id, watched_at DESC)")
+
+    def _connection(self):
+        # One connection per thread (and per process after a fork)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def write_many(self, views):
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO watch_history (user_id, video_id, watched_at, video) VALUES (?, ?, ?, ?)",
+                [(user_id, video_id, watched_at, json.dumps(video)) for user_id, video_id, watched_at, video in views])
+
+    def load(self, user_id, limit):
+        rows = self._connection().execute(
+            "SELECT video FROM watch_history WHERE user_id = ? ORDER BY watched_at DESC LIMIT ?",
+            (user_id, limit)).fetchall()
+        return [json.loads(video) for video, in rows]
+
+    def iter_views(self):
+        """Every stored (user_id, video_id) pair, streamed from one read transaction."""
+        # A dedicated connection, so a long scan never holds a request thread's connection
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield from connection.execute("SELECT user_id, video_id FROM watch_history")
+        finally:
+            connection.close()
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+HISTORY_BACKENDS = {
+    MemoryBackend.name: MemoryBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def get_history_backend(name=None):
+    """Instantiate a history backend by name (defaults to ``YUGI_HISTORY_BACKEND``)."""
+    name = name or HISTORY_BACKEND
+    if name not in HISTORY_BACKENDS:
+        raise ValueError(f"Unknown history backend {name!r}; choose one of {sorted(HISTORY_BACKENDS)}")
+    return HISTORY_BACKENDS[name]()
+
+
+class WatchHistoryStore:
+    """In-memory recent history per user, persisted through a write-behind queue."""
+
+    def __init__(self, backend=None, capacity=MAX_ACTIVE_USERS, history_length=HISTORY_LENGTH,
+                 resident_ttl=HISTORY_RESIDENT_TTL):
+        self.backend = backend or get_history_backend()
+        self.history_length = history_length
+        self._users = ShardedLRUCache(capacity, ttl=resident_ttl)
+        register_cache('watch_history', self._users)
+        self._locks = tuple(TimedLock('history') for _ in range(HISTORY_LOCK_STRIPES))
+        self._pending = queue.Queue(MAX_PENDING_WRITES)
+        # Queued views not yet written, by user, so a reloaded history still sees them
+        self._unwritten = {}
+        self._unwritten_lock = TimedLock('history_unwritten')
+        self._writer = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _lock_for(self, user_id):
+        return self._locks[hash(user_id) % HISTORY_LOCK_STRIPES]
+
+    def _ensure_writer(self):
+        # Started lazily so a store created before a fork gets a writer in each worker
+        if self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid != os.getpid():
+                self._writer = threading.Thread(target=self._write_loop, name='watch-history-writer', daemon=True)
+                self._writer.start()
+                self._writer_pid = os.getpid()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            try:
+                while len(batch) < WRITE_BATCH_SIZE:
+                    batch.append(self._pending.get(timeout=WRITE_INTERVAL))
+            except queue.Empty:
+                pass
+            self._write(batch)
+            # Forget the views only after they are committed (readers look here first, then at the backend)
+            with self._unwritten_lock:
+                for user_id, video_id, _, video in batch:
+                    views = self._unwritten.get(user_id)
+                    if views is not None and views.get(video_id) is video:
+                        del views[video_id]
+                        if not views:
+                            del self._unwritten[user_id]
+            for _ in batch:
+                self._pending.task_done()
+
+    def _write(self, batch):
+        """Write a batch, retrying with exponential backoff until the backend commits it."""
+        delay = WRITE_RETRY_DELAY
+        while True:
+            try:
+                self.backend.write_many(batch)
+                return
+            except Exception as e:
+                # The views stay readable from _unwritten meanwhile; later ones wait in the queue
+                print(f"Error writing {len(batch)} watch history entries, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+
+    def _load(self, user_id, limit):
+        """The user's `limit` most recent stored and queued views, oldest first."""
+        # Queued views are read before the backend: a view leaves the queue only once committed
+        with self._unwritten_lock:
+            unwritten = list(self._unwritten.get(user_id, {}).values())
+        videos = {video['id']: video for video in self.backend.load(user_id, limit)}
+        videos.update((video['id'], video) for video in unwritten)
+        return sorted(videos.values(), key=lambda video: video['watched_at'])[-limit:]
+
+    def _history(self, user_id):
+        """The user's in-memory history, loaded from the backend when not resident (or resident too long)."""
+        history = self._users.get(user_id)
+        if history is None:
+            history = OrderedDict((video['id'], video) for video in self._load(user_id, self.history_length))
+            self._users.put(user_id, history)
+        return history
+
+    def add(self, user_id, video):
+        """
+        Record that a user watched a video.
+
+        Args:
+            user_id (str): User identifier.
+            video (dict): Video object with at least an ``id``; ``watched_at`` is added.
+
+        Returns:
+            bool: True if the video was new to the user's recent history.
+        """
+        with self._lock_for(user_id):
+            history = self._history(user_id)
+            # Check if the video is already in the history (O(1) on the ordered dict)
+            if video['id'] in history:
+                return False
+            video['watched_at'] = datetime.now().isoformat()
+            history[video['id']] = video
+            # Keep only the most recent videos
+            if len(history) > self.history_length:
+                history.popitem(last=False)
+            with self._unwritten_lock:
+                self._unwritten.setdefault(user_id, {})[video['id']] = video
+        self._ensure_writer()
+        self._pending.put((user_id, video['id'], video['watched_at'], video))
+        return True
+
+    def get(self, user_id, limit=HISTORY_LENGTH):
+        """The user's most recent videos, newest first."""
+        with self._lock_for(user_id):
+            history = self._history(user_id)
+            videos = list(reversed(history.values()))
+        return videos[:limit]
+
+    def recent(self, user_id, limit):
+        """
+        The user's most recent views read from the backend (and this process' queue), oldest
+        first; unlike `get`, `limit` is not capped by the in-memory history length.
+        """
+        return self._load(user_id, limit)
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued view has been written to the backend.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most (forever by default).
+
+        Returns:
+            bool: True if nothing is left to write.
+        """
+        if self._writer_pid != os.getpid():
+            return True
+        pending = self._pending
+        with pending.all_tasks_done:
+            return pending.all_tasks_done.wait_for(lambda: not pending.unfinished_tasks, timeout)
+
+    def close(self, timeout=EXIT_FLUSH_TIMEOUT):
+        """
+        Write the queued views before the process exits, waiting `timeout` seconds at most
+        (so a backend that keeps failing cannot hang the shutdown).
+
+        Registered with atexit; processes that leave through os._exit (forked workers) call it themselves.
+        """
+        if not self.flush(timeout):
+            with self._unwritten_lock:
+                lost = sum(len(views) for views in self._unwritten.values())
+            print(f"Exiting with {lost} watch history entries not written")
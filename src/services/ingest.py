@@ -0,0 +1,308 @@
+"""
+Incremental catalog ingestion.
+
+New videos are added to the running model without a refit: they are transformed with the
+build's TF-IDF weights (hashed columns and idf), only the new rows are encoded, and only the neighbor lists
+that a new video enters are re-ranked (see neighbors.extend_neighbor_index). The result is a
+new immutable snapshot, published atomically, so requests in flight finish on the old one.
+Only cached results of videos whose content candidates changed (a neighbor list, TF-IDF or
+semantic, or a top-N row) are invalidated.
+
+    python -m src.services.ingest new_videos.csv [--csv data/YT_data.csv] [--out data/artifacts]
+
+The command extends the latest build of --out, appends the rows to the catalog CSV and
+publishes a new build; running servers pick it up with recommendation.refresh_snapshot.
+The build is a delta holding only the new rows and the recomputed neighbor and top-N rows,
+over the build it extends, and its CSV checksum is chained from the parent's with a hash of
+the appended bytes; every INGEST_MAX_DELTAS deltas (or INGEST_COMPACT_FRACTION of the rows)
+a full build is written instead.
+"""
+import argparse
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.services.artifacts import (DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, REQUIRED_COLUMNS, STRING_COLUMNS,
+                                    _csv_stat, check_artifacts, csv_range_checksum, extend_checksum,
+                                    latest_build_dir, load_artifacts, prepare_catalog_frame, write_build,
+                                    write_delta_build)
+from src.services.catalog import Catalog, _is_missing
+from src.services.encoders import get_encoder
+from src.services.explore import extend_explore_pool
+from src.services.fragments import FRAGMENT_COLUMN, build_fragments
+from src.services.metrics import TimedLock
+from src.services.neighbors import extend_neighbor_index
+from src.services.search import build_search_index
+from src.services.snapshot import ModelSnapshot
+from src.services.topn import extend_topn_table
+
+# Most rows whose semantic neighbors are searched again to see whether they changed; beyond that
+# (large ingests touch most IVF lists) every row probing a list with a new row counts as changed
+SEMANTIC_RECHECK_LIMIT = 10_000
+
+# An ingest writes a delta build (only the new rows, see artifacts.write_delta_build) unless there are more than
+# INGEST_MAX_DELTAS deltas since the last full build, or they added more than INGEST_COMPACT_FRACTION of its rows:
+# then it writes a full build, so loads replay a short chain and every row is written O(1) times on average
+INGEST_MAX_DELTAS = int(os.environ.get('YUGI_INGEST_MAX_DELTAS', 8))
+INGEST_COMPACT_FRACTION = float(os.environ.get('YUGI_INGEST_COMPACT_FRACTION', 0.25))
+
+_ingest_lock = TimedLock('ingest')
+
+
+@contextmanager
+def _exclusive(out_dir):
+    """Serialize ingests within this process and across processes sharing ``out_dir``."""
+    os.makedirs(out_dir, exist_ok=True)
+    with _ingest_lock, open(os.path.join(out_dir, '.ingest.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _new_rows(raw, catalog):
+    """The raw rows that are complete and not in the catalog yet (first occurrence of each id)."""
+    raw = raw.dropna(subset=REQUIRED_COLUMNS)
+    raw = raw[catalog.rows_of(raw['v_id'].astype(str).tolist()) < 0]
+    return raw.drop_duplicates(subset='v_id').reset_index(drop=True)
+
+
+def _semantic_changed_rows(snapshot, new_snapshot, n_old, depth, skip):
+    """
+    Existing rows (other than `skip`) whose `depth` nearest rows, as the ANN index returns them,
+    differ between the snapshots.
+
+    A new row can only change the results of the rows that probe the list it was added to (it
+    enters them, or displaces an older row from the quantized shortlist); only those are searched
+    again, up to SEMANTIC_RECHECK_LIMIT of them.
+    """
+    index, new_index, embeddings = snapshot.semantic_index, new_snapshot.semantic_index, new_snapshot.embeddings
+    probing = new_index.probing(embeddings[:n_old], new_index.lists_of(np.arange(n_old, len(embeddings))))
+    probing[skip] = False
+    rows = np.flatnonzero(probing)
+    if len(rows) > SEMANTIC_RECHECK_LIMIT:
+        return rows
+    changed = [row for row in rows
+               if not np.array_equal(index.search(embeddings[row], depth, exclude=row)[0],
+                                     new_index.search(embeddings[row], depth, exclude=row)[0])]
+    return np.array(changed, dtype=np.int64)
+
+
+def _changed_video_ids(snapshot, new_snapshot, changed_rows, n_old):
+    """
+    Existing videos whose content candidates differ between the two snapshots.
+
+    A video counts as changed when its TF-IDF neighbor list (`changed_rows`), its semantic
+    neighbor list or its top-N row changed. Engagement-ranked collaborative candidates are
+    a random sample of the source's channel or category, so a cached result stays a valid draw
+    (without the new videos) until it expires.
+    """
+    from src.services.recommendation import SEMANTIC_WEIGHT
+
+    rows = [np.asarray(changed_rows, dtype=np.int64)]
+    if SEMANTIC_WEIGHT > 0 and new_snapshot.semantic_index is not None:
+        # Live scoring reads as many semantic neighbors as TF-IDF ones
+        rows.append(_semantic_changed_rows(snapshot, new_snapshot, n_old, new_snapshot.neighbor_index.k - 1,
+                                           rows[0]))
+    old_table, new_table = snapshot.topn_table, new_snapshot.topn_table
+    if old_table is not None and new_table is not None:
+        differs = (np.asarray(new_table.ids[:n_old]) != np.asarray(old_table.ids)) | \
+                  (np.asarray(new_table.scores[:n_old]) != np.asarray(old_table.scores))
+        rows.append(np.flatnonzero(differs.any(axis=1)))
+    video_ids = snapshot.catalog.video_ids
+    return {video_ids[row] for row in np.unique(np.concatenate(rows))}
+
+
+def ingest_frame(raw, snapshot, encoder):
+    """
+    Build a new snapshot with the videos of `raw` appended.
+
+    Args:
+        raw (pd.DataFrame): New catalog rows with the CSV columns.
+        snapshot (ModelSnapshot): The snapshot to extend (left untouched).
+        encoder (callable): The encoder the snapshot's embeddings were built with.
+
+    Returns:
+        tuple: (new ModelSnapshot or None when nothing is new, accepted raw rows,
+        set of existing video ids whose results may have changed, rows whose neighbor list and
+        top-N candidates were recomputed as {'neighbor': rows, 'topn': rows}, timings dict)
+    """
+    from src.services.recommendation import build_category_matrix
+
+    timings = {}
+    raw = _new_rows(raw, snapshot.catalog)
+    if raw.empty:
+        return None, raw, set(), {}, timings
+    df = prepare_catalog_frame(raw.copy())
+    n_old = len(snapshot.catalog)
+
+    # Transform with the build's idf; only the new rows are encoded
+    phase = time.time()
+    new_tfidf = snapshot.tfidf.transform(df['content']).astype(snapshot.tfidf_matrix.dtype)
+    tfidf_matrix = sparse.vstack([snapshot.tfidf_matrix, new_tfidf], format='csr')
+    timings['tfidf'] = time.time() - phase
+
+    phase = time.time()
+    new_embeddings = np.ascontiguousarray(encoder(df['content'].tolist()), dtype=np.float32)
+    embeddings = np.concatenate([snapshot.embeddings, new_embeddings])
+    semantic_index = snapshot.semantic_index.appended(embeddings) if snapshot.semantic_index is not None else None
+    timings['embeddings'] = time.time() - phase
+
+    phase = time.time()
+    neighbor_index, changed_rows = extend_neighbor_index(snapshot.neighbor_index, tfidf_matrix, n_old)
+    timings['similarity'] = time.time() - phase
+
+    # The new rows' postings are merged into the lists of their terms (builds made before search get a full index)
+    phase = time.time()
+    if snapshot.search_index is not None:
+        search_index = snapshot.search_index.appended(new_tfidf, n_old)
+    else:
+        search_index = build_search_index(tfidf_matrix)
+    timings['search'] = time.time() - phase
+
+    columns = {name: [None if _is_missing(v) else v for v in df[name].tolist()] if name in df.columns
+               else [None] * len(df) for name in STRING_COLUMNS}
+    engagement = df['engagement_rate'].to_numpy(dtype=np.float64)
+    if FRAGMENT_COLUMN in snapshot.catalog.columns:
+        # Response fragments of the new rows only (from a catalog of just those rows)
+        phase = time.time()
+        columns[FRAGMENT_COLUMN] = build_fragments(Catalog(columns, engagement))
+        timings['fragments'] = time.time() - phase
+    catalog = snapshot.catalog.appended(columns, engagement)
+    # The category tables only depend on the categories; the explore pool is extended with the new rows
+    category_matrices = (snapshot.content_category_matrix, snapshot.collaborative_category_matrix)
+    if len(catalog.categories) != len(snapshot.catalog.categories):
+        category_matrices = (build_category_matrix(catalog.categories, True),
+                             build_category_matrix(catalog.categories, False))
+    fields = dict(
+        catalog=catalog,
+        neighbor_index=neighbor_index,
+        tfidf=snapshot.tfidf,
+        tfidf_matrix=tfidf_matrix,
+        embeddings=embeddings,
+        semantic_index=semantic_index,
+        content_category_matrix=category_matrices[0],
+        collaborative_category_matrix=category_matrices[1],
+        explore_pool=extend_explore_pool(snapshot.explore_pool, catalog, n_old),
+        version=f'{snapshot.version}+{len(raw)}',
+        search_index=search_index,
+    )
+    new_snapshot = ModelSnapshot(**fields)
+    new_rows = np.arange(n_old, len(catalog))
+    recomputed = {'neighbor': np.concatenate([changed_rows, new_rows]), 'topn': new_rows}
+    if snapshot.topn_table is not None:
+        # Recompute the materialized candidates of the new rows and of the rows they can enter
+        phase = time.time()
+        topn_table, recomputed['topn'] = extend_topn_table(snapshot.topn_table, new_snapshot, changed_rows, n_old)
+        new_snapshot = ModelSnapshot(**fields, topn_table=topn_table)
+        timings['topn'] = time.time() - phase
+    phase = time.time()
+    changed = _changed_video_ids(snapshot, new_snapshot, changed_rows, n_old)
+    timings['invalidation'] = time.time() - phase
+    return new_snapshot, raw, changed, recomputed, timings
+
+
+def ingest_videos(raw, csv_path=DEFAULT_CSV_PATH, out_dir=DEFAULT_ARTIFACT_DIR, publish=True):
+    """
+    Append videos to the catalog CSV, publish a new build and (optionally) the new snapshot.
+
+    Args:
+        raw (pd.DataFrame): New catalog rows with the CSV columns.
+        csv_path (str): Catalog CSV the rows are appended to.
+        out_dir (str): Root directory of the artifact builds.
+        publish (bool): Also make the new build the current snapshot of this process.
+
+    Returns:
+        dict: Number of added/skipped rows, invalidated cache entries, new version and timings.
+    """
+    from src.services import recommendation
+
+    start = time.time()
+    with _exclusive(out_dir):
+        build_dir = latest_build_dir(out_dir)
+        manifest = check_artifacts(build_dir, csv_path)
+        # Start from the latest build of `out_dir`: this process' snapshot when it serves that build, else the
+        # build is loaded (it may be newer than, or unrelated to, this process' snapshot)
+        current = recommendation.get_snapshot() if publish else None
+        if current is not None and current.stage == 'ready' and current.version == os.path.basename(build_dir):
+            snapshot = current
+        else:
+            snapshot = recommendation.build_snapshot(load_artifacts(out_dir, csv_path))
+        n_old = len(snapshot.catalog)
+        new_snapshot, accepted, changed, recomputed, timings = ingest_frame(
+            raw, snapshot, get_encoder(manifest['encoder']))
+        stats = {'added': len(accepted), 'skipped': len(raw) - len(accepted), 'invalidated': len(changed),
+                 'version': snapshot.version, 'timings': timings}
+        if new_snapshot is None:
+            return stats
+
+        phase = time.time()
+        # Only the appended bytes are hashed; the build's checksum is chained from the parent's
+        header = pd.read_csv(csv_path, nrows=0).columns
+        offset = os.path.getsize(csv_path)
+        accepted.reindex(columns=header).to_csv(csv_path, mode='a', header=False, index=False)
+        end = os.path.getsize(csv_path)
+        appended_sha256 = csv_range_checksum(csv_path, offset, end)
+        fields = {
+            'csv_sha256': extend_checksum(manifest['csv_sha256'], appended_sha256),
+            'csv_stat': _csv_stat(csv_path),
+            'csv_segments': (manifest.get('csv_segments') or [[offset, manifest['csv_sha256']]]) +
+                            [[end, appended_sha256]],
+            'tfidf_params': manifest['tfidf_params'],
+            'encoder': manifest['encoder'],
+            'parent': snapshot.version,
+            'ingest': {'added': len(accepted), 'changed_video_ids': sorted(changed)},
+        }
+        # Deltas since the last full build, and that build's rows
+        depth = manifest.get('delta', {}).get('depth', 0) + 1
+        base_rows = manifest.get('delta', {}).get('base_rows', manifest['n_rows'])
+        compact = (depth > INGEST_MAX_DELTAS or
+                   len(new_snapshot.catalog) - base_rows > INGEST_COMPACT_FRACTION * base_rows)
+        if compact:
+            # A full build, so the chain of deltas a load replays stays short
+            build_dir = write_build(
+                out_dir, new_snapshot.catalog, new_snapshot.tfidf, new_snapshot.tfidf_matrix, new_snapshot.embeddings,
+                new_snapshot.semantic_index, new_snapshot.neighbor_index, fields, new_snapshot.topn_table,
+                new_snapshot.search_index)
+        else:
+            build_dir = write_delta_build(out_dir, new_snapshot, n_old, recomputed['neighbor'], recomputed['topn'],
+                                          {**fields, 'delta': {'depth': depth, 'base_rows': base_rows}})
+        timings['persist'] = time.time() - phase
+        stats['version'] = os.path.basename(build_dir)
+        stats['compacted'] = compact
+
+        if publish:
+            # A full build is served memory-mapped so forked workers share its pages; a delta build loads
+            # into the same arrays as the snapshot just built. The changed ids are relative to the base
+            # build, so a process serving another version drops every cached entry
+            if compact:
+                published = recommendation.build_snapshot(load_artifacts(out_dir, csv_path))
+            else:
+                published = new_snapshot.replaced(version=stats['version'])
+            recommendation.publish_snapshot(published, changed if current is not None and current.version ==
+                                            snapshot.version else None)
+    stats['seconds'] = time.time() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append videos to the YUGI catalog without a full rebuild")
+    parser.add_argument('videos', help="CSV with the new videos (same columns as the catalog CSV)")
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+    args = parser.parse_args(argv)
+
+    stats = ingest_videos(pd.read_csv(args.videos), args.csv, args.out, publish=False)
+    print(f"Ingested {stats['added']} videos ({stats['skipped']} skipped, {stats['invalidated']} cached results "
+          f"invalidated) -> {stats['version']}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+"""
+In-process metrics exposed in the Prometheus text format (GET /metrics).
+
+Instruments are registered by name in one process-wide registry:
+
+- Histogram: fixed buckets, so an observation is a bisect and three additions under a lock.
+  `histogram.time(*labels)` is a context manager timing a block (the stage hooks).
+- Gauge: last value per label set (startup phase durations).
+- Collectors: callables returning samples at scrape time (cache counters), so nothing is
+  recorded on the hot path for them.
+
+TimedLock is a drop-in for threading.Lock that records how long threads waited for it;
+the uncontended path is a single non-blocking acquire. Metrics are per process: with
+pre-forked workers every worker reports its own.
+"""
+import bisect
+import os
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from 50us to 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_collectors = []
+_caches = {}
+_registry_lock = threading.Lock()
+_process_start = None
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _label_key(item):
+    # Label values can mix types (status codes, None endpoints), so order series by their text
+    return tuple(str(value) for value in item[0])
+
+
+class _Timer:
+    """Context manager observing the duration of a block into a histogram."""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Time a block: ``with histogram.time('content'): ...``."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = []
+        for labels, counts, total, count in sorted(series, key=_label_key):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, ("le", _format_value(bound)))}'
+                             f' {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Gauge:
+    """Last set value per label set."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items(), key=_label_key)
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in values]
+
+
+def _register(cls, name, *args, **kwargs):
+    # Get-or-create, so a module reloaded in the same process keeps its series
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = cls(name, *args, **kwargs)
+        return _registry[name]
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """The registered histogram called `name`, created on first use."""
+    return _register(Histogram, name, documentation, labelnames, buckets)
+
+
+def gauge(name, documentation, labelnames=()):
+    """The registered gauge called `name`, created on first use."""
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def process_start_time():
+    """Wall-clock time this process started (from /proc, so interpreter startup and imports count)."""
+    global _process_start
+    if _process_start is None:
+        try:
+            with open('/proc/self/stat') as f:
+                # Field 22, in clock ticks since boot; the command name (field 2) may contain spaces
+                ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            _process_start = time.time() - (uptime - ticks / os.sysconf('SC_CLK_TCK'))
+        except (OSError, ValueError, IndexError):
+            # No procfs: count from the first call instead
+            _process_start = time.time()
+    return _process_start
+
+
+def register_collector(collect):
+    """Add a callable returning [(name, kind, help, [(labels dict, value), ...]), ...] at scrape time."""
+    _collectors.append(collect)
+
+
+def register_cache(name, cache):
+    """Report the counters of a cache (see cache.py) as yugi_cache_* metrics with cache=`name`."""
+    _caches[name] = cache
+
+
+lock_wait_seconds = histogram('yugi_lock_wait_seconds', 'Time threads waited for a contended lock', ('lock',))
+
+
+class TimedLock:
+    """threading.Lock that records contended acquisitions into yugi_lock_wait_seconds."""
+
+    __slots__ = ('_lock', 'name')
+
+    def __init__(self, name):
+        self._lock = threading.Lock()
+        self.name = name
+
+    def __enter__(self):
+        if not self._lock.acquire(False):
+            start = time.perf_counter()
+            self._lock.acquire()
+            lock_wait_seconds.observe(time.perf_counter() - start, self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+
+
+# Cache counters: name -> (kind, help, stats key)
+CACHE_METRICS = {
+    'yugi_cache_hits_total': ('counter', 'Cache lookups that found a live entry', 'hits'),
+    'yugi_cache_misses_total': ('counter', 'Cache lookups that found no live entry', 'misses'),
+    'yugi_cache_evictions_total': ('counter', 'Entries evicted to stay within the entry or byte limit', 'evictions'),
+    'yugi_cache_expirations_total': ('counter', 'Entries dropped because their time to live passed', 'expirations'),
+    'yugi_cache_entries': ('gauge', 'Entries currently cached', 'entries'),
+    'yugi_cache_bytes': ('gauge', 'Approximate size of the cached values in bytes', 'bytes'),
+    'yugi_cache_hit_ratio': ('gauge', 'Hits / lookups since start', 'hit_ratio'),
+}
+
+
+def _collect_caches():
+    stats = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    return [(metric, kind, documentation, [({'cache': name}, values[key]) for name, values in stats.items()])
+            for metric, (kind, documentation, key) in CACHE_METRICS.items()]
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    with _registry_lock:
+        instruments = sorted(_registry.values(), key=lambda instrument: instrument.name)
+    for instrument in instruments:
+        lines.append(f'# HELP {instrument.name} {instrument.documentation}')
+        lines.append(f'# TYPE {instrument.name} {instrument.kind}')
+        lines.extend(instrument.samples())
+    for collect in [_collect_caches] + _collectors:
+        for name, kind, documentation, samples in collect():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
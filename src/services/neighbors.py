@@ -0,0 +1,176 @@
+"""
+Top-K content neighbor index.
+
+Instead of the dense N x N cosine similarity matrix, only the K most similar videos of
+every row are kept, as int32 row ids and float32 scores (O(N*K) memory). The index is
+built in row blocks of sparse matrix products so peak memory stays bounded by the block
+size rather than the catalog size.
+"""
+import os
+import resource
+import time
+
+import numpy as np
+
+DEFAULT_NEIGHBOR_K = int(os.environ.get('YUGI_NEIGHBOR_K', 64))
+# Upper bound for one dense block of similarity scores (float64)
+DEFAULT_BLOCK_BYTES = int(os.environ.get('YUGI_NEIGHBOR_BLOCK_BYTES', 256 * 1024 * 1024))
+
+
+class NeighborIndex:
+    """Per-row top-K neighbors, sorted by descending score (ties by ascending row)."""
+
+    def __init__(self, ids, scores):
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    def neighbors(self, row, k=None):
+        """Return the (row ids, scores) of the best ``k`` neighbors of ``row``."""
+        k = self.k if k is None else max(0, min(k, self.k))
+        return self.ids[row, :k], self.scores[row, :k]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def top_k_row(scores, k):
+    """
+    Indices of the ``k`` highest scores, sorted by descending score.
+
+    Ties are broken by ascending index so the result matches a stable full sort.
+    """
+    if k >= len(scores):
+        return np.lexsort((np.arange(len(scores)), -scores))
+    part = np.argpartition(-scores, k - 1)[:k]
+    kth = scores[part].min()
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    candidates = np.concatenate([above, ties])
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def top_k_rows(scores, k):
+    """
+    Column indices of the ``k`` highest scores of every row of a 2-D array, best first.
+
+    One argpartition over the whole batch, then a sort of the ``k`` survivors per row.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1)
+
+
+def build_neighbor_index(matrix, k=DEFAULT_NEIGHBOR_K, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Build the top-K neighbor index of the L2-normalized rows of ``matrix``.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Row-normalized feature matrix (e.g. TF-IDF).
+        k (int): Number of neighbors kept per row (the row itself is included).
+        block_bytes (int): Memory budget for one dense block of scores.
+
+    Returns:
+        tuple: (NeighborIndex, stats dict with rows/sec and peak RSS).
+    """
+    n_rows = matrix.shape[0]
+    k = min(k, n_rows)
+    block_size = max(1, min(n_rows, block_bytes // max(1, n_rows * 8)))
+    ids = np.empty((n_rows, k), dtype=np.int32)
+    scores = np.empty((n_rows, k), dtype=np.float32)
+    matrix_t = matrix.T.tocsc()
+
+    start = time.time()
+    for block_start in range(0, n_rows, block_size):
+        block_end = min(block_start + block_size, n_rows)
+        # Sparse product for the block; cosine similarity since rows are L2-normalized
+        block = (matrix[block_start:block_end] @ matrix_t).toarray()
+        for offset, row_scores in enumerate(block):
+            top = top_k_row(row_scores, k)
+            ids[block_start + offset] = top
+            scores[block_start + offset] = row_scores[top]
+
+    elapsed = time.time() - start
+    stats = {
+        'rows': n_rows,
+        'k': k,
+        'block_size': block_size,
+        'seconds': elapsed,
+        'rows_per_sec': n_rows / elapsed if elapsed > 0 else float('inf'),
+        'peak_rss_mb': peak_rss_mb(),
+        'index_mb': (ids.nbytes + scores.nbytes) / (1024 * 1024),
+    }
+    print(f"Built top-{k} neighbor index for {n_rows} rows in {elapsed:.1f}s "
+          f"({stats['rows_per_sec']:.0f} rows/s, block={block_size}, "
+          f"index={stats['index_mb']:.1f}MB, peak RSS={stats['peak_rss_mb']:.0f}MB)")
+    return NeighborIndex(ids, scores), stats
+
+
+def extend_neighbor_index(index, matrix, n_old, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Add the rows ``n_old:`` of ``matrix`` to a neighbor index built over its first ``n_old`` rows.
+
+    Only the new rows are multiplied against the matrix, so the work grows with the number
+    of new rows. New rows get a full top-K list; an existing row is re-ranked only when a new
+    row beats its current K-th neighbor (on ties the existing, lower-numbered row wins,
+    like in a full build).
+
+    Args:
+        index (NeighborIndex): Index over the first ``n_old`` rows (left untouched).
+        matrix (scipy.sparse.csr_matrix): Row-normalized feature matrix with the new rows appended.
+        n_old (int): Number of rows covered by ``index``.
+        block_bytes (int): Memory budget for one dense block of scores.
+
+    Returns:
+        tuple: (new NeighborIndex, int64 array of existing rows whose neighbor list changed)
+    """
+    n_rows = matrix.shape[0]
+    k = index.k
+    block_size = max(1, min(n_rows - n_old, block_bytes // max(1, n_rows * 8)))
+    new_ids = np.empty((n_rows - n_old, k), dtype=np.int32)
+    new_scores = np.empty((n_rows - n_old, k), dtype=np.float32)
+    matrix_t = matrix.T.tocsc()
+    kth_scores = np.asarray(index.scores[:, k - 1])
+
+    # (existing row, new row, score) for every new row that enters an existing top-K
+    entering = []
+    for block_start in range(n_old, n_rows, block_size):
+        block_end = min(block_start + block_size, n_rows)
+        block = (matrix[block_start:block_end] @ matrix_t).toarray()
+        for offset, row_scores in enumerate(block):
+            top = top_k_row(row_scores, k)
+            new_ids[block_start - n_old + offset] = top
+            new_scores[block_start - n_old + offset] = row_scores[top]
+        # Compare at the stored float32 precision; equal scores keep the existing neighbor
+        old_scores = block[:, :n_old].astype(np.float32)
+        new_rows, old_rows = np.nonzero(old_scores > kth_scores)
+        entering.append((old_rows, new_rows + block_start, old_scores[new_rows, old_rows]))
+
+    ids = np.concatenate([np.asarray(index.ids), new_ids])
+    scores = np.concatenate([np.asarray(index.scores), new_scores])
+    old_rows = np.concatenate([e[0] for e in entering]) if entering else np.empty(0, dtype=np.int64)
+    if len(old_rows):
+        candidate_rows = np.concatenate([e[1] for e in entering])
+        candidate_scores = np.concatenate([e[2] for e in entering])
+        order = np.argsort(old_rows, kind='stable')
+        old_rows, candidate_rows, candidate_scores = old_rows[order], candidate_rows[order], candidate_scores[order]
+        changed, starts = np.unique(old_rows, return_index=True)
+        for row, start, end in zip(changed, starts, np.append(starts[1:], len(old_rows))):
+            merged_ids = np.concatenate([ids[row], candidate_rows[start:end]])
+            merged_scores = np.concatenate([scores[row], candidate_scores[start:end]])
+            top = np.lexsort((merged_ids, -merged_scores))[:k]
+            ids[row], scores[row] = merged_ids[top], merged_scores[top]
+    else:
+        changed = np.empty(0, dtype=np.int64)
+    return NeighborIndex(ids, scores), changed.astype(np.int64)
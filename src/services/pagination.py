@@ -0,0 +1,141 @@
+"""
+Cursor pagination over cached recommendation rankings.
+
+The first page for a video ranks RANKING_DEPTH hybrid candidates once (see
+recommendation.ranked_candidates) and caches them as an int32 row array and a float32
+score array, about 8 bytes per candidate. Every page, including the first one, is then an
+O(limit) slice of that ranking, so going deep costs no more than the first page and no
+page size triggers a recomputation.
+
+A cursor is an opaque, URL-safe token naming the feed (a source video or an explore
+session), the position of the next page and when the feed was started. Cursors older than
+CURSOR_TTL seconds are rejected. Rankings live in a byte-bounded LRU for the same time and
+are dropped with the other cached recommendations when a new model changes their video,
+after which the next page is served from a fresh ranking.
+
+With YUGI_SHARDS set, rankings are computed by the shards (see shards.get_coordinator) as
+long as they hold the build this process serves, whose catalog their global rows index.
+"""
+import base64
+import json
+import os
+import time
+
+from src.services.cache import ShardedLRUCache
+from src.services.metrics import register_cache
+from src.services.recommendation import get_snapshot, invalidation_hooks, ranked_candidates
+from src.services.shards import get_coordinator
+
+# Candidates ranked per video, i.e. how deep cursor pagination goes
+RANKING_DEPTH = int(os.environ.get('YUGI_RANKING_DEPTH', 500))
+# Seconds a cursor (and its cached ranking) stays valid
+CURSOR_TTL = float(os.environ.get('YUGI_CURSOR_TTL', 1800))
+MAX_RANKINGS = 10_000
+RANKING_CACHE_BYTES = int(os.environ.get('YUGI_RANKING_CACHE_BYTES', 32 * 1024 * 1024))
+
+
+class Ranking:
+    """Read-only ranked candidates of one video, with the catalog their rows refer to."""
+
+    __slots__ = ('rows', 'scores', 'catalog')
+
+    def __init__(self, rows, scores, catalog):
+        rows.flags.writeable = False
+        scores.flags.writeable = False
+        self.rows = rows
+        self.scores = scores
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.scores.nbytes
+
+
+ranking_cache = ShardedLRUCache(MAX_RANKINGS, max_bytes=RANKING_CACHE_BYTES, sizeof=lambda ranking: ranking.nbytes)
+register_cache('rankings', ranking_cache)
+
+
+def invalidate_rankings(video_ids):
+    """Drop the rankings of the given source video ids (all of them when None)."""
+    if video_ids is None:
+        ranking_cache.clear()
+    else:
+        ranking_cache.purge(lambda key, ranking: key in video_ids)
+
+# Rankings follow the recommendation cache when a new model snapshot is published
+invalidation_hooks.append(invalidate_rankings)
+
+
+def get_ranking(video_id, snapshot=None):
+    """
+    The cached ranking of a video, computed on a miss (concurrent misses compute once).
+
+    Returns:
+        Ranking or None: None for unknown video ids.
+    """
+    snapshot = snapshot or get_snapshot()
+
+    def compute():
+        coordinator = get_coordinator()
+        if coordinator is not None and coordinator.version == snapshot.version:
+            ranked = coordinator.ranked_candidates(video_id, RANKING_DEPTH)
+        else:
+            # Not sharded, or the shards still hold an older build (split the new one and restart them)
+            ranked = ranked_candidates(video_id, RANKING_DEPTH, snapshot)
+        return None if ranked is None else Ranking(ranked[0], ranked[1], snapshot.catalog)
+
+    # Rankings computed on a snapshot that was replaced meanwhile are not cached
+    return ranking_cache.get_or_compute(
+        video_id, compute, ttl=CURSOR_TTL,
+        cacheable=lambda ranking: ranking is not None and snapshot is get_snapshot())
+
+
+def encode_cursor(offset, video_id=None, session=None, started_at=None):
+    """
+    Opaque cursor for the page starting at `offset` of a video's ranking or of an explore session.
+
+    Args:
+        offset (int): Position of the first result of the page.
+        video_id (str, optional): Source video of a recommendation feed.
+        session (str, optional): Explore session (when there is no source video).
+        started_at (float, optional): When the feed's first page was served (defaults to now).
+
+    Returns:
+        str: URL-safe token.
+    """
+    fields = {'o': int(offset), 't': int(started_at if started_at is not None else time.time())}
+    if video_id is not None:
+        fields['v'] = video_id
+    else:
+        fields['s'] = session
+    payload = json.dumps(fields, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Fields of a cursor made by encode_cursor.
+
+    Returns:
+        dict: offset, video_id (or None), session (or None), started_at and expired.
+
+    Raises:
+        ValueError: The cursor is malformed.
+    """
+    try:
+        fields = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset, started_at = int(fields['o']), int(fields['t'])
+    except (TypeError, KeyError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from None
+    if offset < 0 or ('v' in fields) == ('s' in fields):
+        raise ValueError("Invalid cursor")
+    return {
+        'offset': offset,
+        'video_id': fields.get('v'),
+        'session': fields.get('s'),
+        'started_at': started_at,
+        'expired': time.time() - started_at > CURSOR_TTL,
+    }
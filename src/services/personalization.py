@@ -0,0 +1,162 @@
+"""
+Personalized "for you" feed built from each user's watch history.
+
+Every user has a small profile: an exponentially decayed sum of the embeddings of the
+videos they watched (its direction is the decayed mean) and the rows of the last
+PROFILE_WATCHED_LIMIT videos they watched. A view updates the profile in O(d); the feed is
+a top-k query of the profile vector against the semantic ANN index, with watched rows
+masked out. Profiles live in a bounded LRU, so memory stays at most
+MAX_PROFILES * (4*d + 4*PROFILE_WATCHED_LIMIT) bytes however large the catalog and however
+many users show up.
+
+Profiles are derived from the durable watch history (see history.py): a profile that is
+not in memory, or has been for PROFILE_TTL seconds, is rebuilt from the user's most recent
+stored views, so views tracked by other workers and before a restart count too.
+
+Once an ALS model is trained on the tracked views (see als.py), users who watched videos
+other users watched too get collaborative recommendations instead: their watched rows are
+folded into the model, so views since the last training count right away.
+"""
+import os
+
+import numpy as np
+
+from src.services.als import get_model as get_als_model
+from src.services.ann import brute_force_search
+from src.services.cache import ShardedLRUCache
+from src.services.metrics import TimedLock, register_cache
+from src.services.recommendation import build_recommendation, get_snapshot
+
+# Most recently active users kept in memory; the least recently active profile is evicted
+MAX_PROFILES = int(os.environ.get('YUGI_MAX_PROFILES', 200_000))
+# Watched rows kept per profile (and stored views a profile is rebuilt from); older ones can be recommended again
+PROFILE_WATCHED_LIMIT = int(os.environ.get('YUGI_PROFILE_WATCHED_LIMIT', 200))
+# Seconds before a resident profile is rebuilt from the watch history (views tracked by other workers)
+PROFILE_TTL = float(os.environ.get('YUGI_PROFILE_TTL', 5.0))
+# Weight kept by the previous profile on every new view (older views fade out geometrically)
+PROFILE_DECAY = float(os.environ.get('YUGI_PROFILE_DECAY', 0.9))
+PROFILE_LOCK_STRIPES = 64
+
+user_profiles = ShardedLRUCache(MAX_PROFILES, ttl=PROFILE_TTL)
+register_cache('profiles', user_profiles)
+# Views of the same user are applied one at a time; different users only contend on a shared stripe
+_profile_locks = tuple(TimedLock('profiles') for _ in range(PROFILE_LOCK_STRIPES))
+
+
+class UserProfile:
+    """Decayed embedding sum and recently watched rows of one user."""
+
+    __slots__ = ('vector', 'watched', 'n_watched')
+
+    def __init__(self, dim):
+        self.vector = np.zeros(dim, dtype=np.float32)
+        # Watched rows, oldest first, at most PROFILE_WATCHED_LIMIT of them
+        self.watched = np.empty(0, dtype=np.int32)
+        self.n_watched = 0
+
+    def add(self, row, embedding, decay=PROFILE_DECAY):
+        """Fold one watched row into the profile in O(d); returns False if it was already watched."""
+        if (self.watched == row).any():
+            return False
+        self.watched = np.append(self.watched, np.int32(row))[-PROFILE_WATCHED_LIMIT:]
+        self.n_watched += 1
+        self.vector *= decay
+        self.vector += embedding
+        return True
+
+
+def _lock_for(user_id):
+    return _profile_locks[hash(user_id) % PROFILE_LOCK_STRIPES]
+
+
+def _build_profile(user_id, snapshot, history):
+    """A profile from the user's most recent stored views (None without a history store)."""
+    if history is None:
+        return None
+    profile = UserProfile(snapshot.embeddings.shape[1])
+    for video in history.recent(user_id, PROFILE_WATCHED_LIMIT):
+        row = snapshot.catalog.row_of(video['id'])
+        if row is not None:
+            profile.add(row, snapshot.embeddings[row])
+    return profile
+
+
+def _profile(user_id, snapshot, history):
+    """The user's resident profile, rebuilt from the history when missing or expired (caller holds the lock)."""
+    profile = user_profiles.get(user_id)
+    if profile is None:
+        profile = _build_profile(user_id, snapshot, history)
+        if profile is not None:
+            user_profiles.put(user_id, profile)
+    return profile
+
+
+def record_view(user_id, video_id, snapshot=None, history=None):
+    """
+    Update a user's profile after a view.
+
+    Args:
+        user_id (str): User identifier.
+        video_id (str): Watched video; ids outside the catalog are ignored.
+        snapshot (ModelSnapshot, optional): Snapshot to read; defaults to the current one.
+        history (WatchHistoryStore, optional): Durable views a missing profile is rebuilt from.
+
+    Returns:
+        bool: True if the profile changed.
+    """
+    snapshot = snapshot or get_snapshot()
+    row = snapshot.catalog.row_of(video_id)
+    if row is None:
+        return False
+    with _lock_for(user_id):
+        profile = _profile(user_id, snapshot, history)
+        if profile is None:
+            profile = UserProfile(snapshot.embeddings.shape[1])
+            user_profiles.put(user_id, profile)
+        return profile.add(row, snapshot.embeddings[row])
+
+
+def for_you_recommendation(user_id, top_n=5, offset=0, snapshot=None, history=None):
+    """
+    Personalized recommendations for a user, best first, excluding videos they watched.
+
+    Args:
+        user_id (str): User identifier.
+        top_n (int): Number of recommendations to return.
+        offset (int): Number of leading results to skip (pagination).
+        snapshot (ModelSnapshot, optional): Snapshot to read; defaults to the current one.
+        history (WatchHistoryStore, optional): Durable views a missing profile is rebuilt from.
+
+    Returns:
+        list or None: Recommendation dicts, or None when the user has no profile yet.
+    """
+    snapshot = snapshot or get_snapshot()
+    with _lock_for(user_id):
+        profile = _profile(user_id, snapshot, history)
+        if profile is None or profile.n_watched == 0:
+            return None
+        query = profile.vector.copy()
+        watched = profile.watched.copy()
+
+    # Collaborative first: the ALS model folds in the watched rows it has factors for
+    als_model = get_als_model()
+    if als_model is not None:
+        result = als_model.recommend_from_rows(np.sort(watched).astype(np.int64), offset + top_n, snapshot.catalog)
+        if result is not None:
+            rows, scores = result[0][offset:offset+top_n], result[1][offset:offset+top_n]
+            return [build_recommendation(row, score, snapshot.catalog) for row, score in zip(rows, scores)]
+
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return None
+    query /= norm
+
+    # Ask for enough neighbors to survive the exclusion of every watched row
+    k = min(offset + top_n + len(watched), len(snapshot.catalog))
+    if snapshot.semantic_index is not None:
+        rows, scores = snapshot.semantic_index.search(query, k)
+    else:
+        rows, scores = brute_force_search(snapshot.embeddings, query, k)
+    unwatched = ~np.isin(rows, watched)
+    rows, scores = rows[unwatched][offset:offset+top_n], scores[unwatched][offset:offset+top_n]
+    return [build_recommendation(row, score, snapshot.catalog) for row, score in zip(rows, scores)]
@@ -0,0 +1,88 @@
+"""
+Opt-in sampling profiler for the request path.
+
+With ``YUGI_PROFILER=1``, a background thread wakes up every ``YUGI_PROFILER_INTERVAL_MS``
+milliseconds (default 5) and records the Python stack of every thread that is serving a
+request at that moment. Idle threads are never sampled, so the counts show where in-flight
+(and therefore mostly slow) requests spend their time. Samples are aggregated as collapsed
+stacks, ``endpoint;outer;...;leaf count``, the input format of flamegraph.pl and speedscope.
+Nothing runs, and the request hooks return immediately, when the profiler is disabled.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILER_ENABLED = os.environ.get('YUGI_PROFILER', '0') == '1'
+PROFILER_INTERVAL = float(os.environ.get('YUGI_PROFILER_INTERVAL_MS', 5)) / 1000
+# Frames kept per sample, innermost first (deeper stacks are cut at the root side)
+MAX_STACK_DEPTH = 64
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Stack sampler of the threads currently inside a request."""
+
+    def __init__(self, interval=PROFILER_INTERVAL, enabled=PROFILER_ENABLED):
+        self.interval = interval
+        self.enabled = enabled
+        self.samples = 0
+        # thread ident -> label (endpoint) of the request it is serving
+        self._active = {}
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._sampler_pid = None
+
+    def _ensure_sampler(self):
+        # Started lazily, once per process, so pre-forked workers each get their own sampler
+        if self._sampler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sampler_pid != os.getpid():
+                threading.Thread(target=self._sample_loop, name='sampling-profiler', daemon=True).start()
+                self._sampler_pid = os.getpid()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            stacks = [f'{label};{_collapse(frames[ident])}' for ident, label in active
+                      if ident != own and ident in frames]
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += len(stacks)
+
+    def begin(self, label):
+        """Mark the calling thread as serving a request labelled `label`."""
+        if self.enabled:
+            self._ensure_sampler()
+            self._active[threading.get_ident()] = label
+
+    def end(self):
+        """The calling thread finished its request."""
+        if self.enabled:
+            self._active.pop(threading.get_ident(), None)
+
+    def collapsed(self, reset=False):
+        """The samples as collapsed stacks, most frequent first (one ``stack count`` per line)."""
+        with self._lock:
+            stacks = self._stacks.most_common()
+            if reset:
+                self._stacks.clear()
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,100 @@
+"""
+Quantized copy of the semantic embeddings for coarse candidate scoring.
+
+The IVF index (ann.py) scores every row of the probed lists against the query. Doing that
+on a compact copy of the embeddings moves 2x (float16) or 4x (int8) fewer bytes per
+scored row, and the pages the scan keeps resident shrink by the same factor. Only the
+shortlist that survives the coarse pass is re-ranked with the float32 embeddings.
+
+- int8: symmetric per-vector quantization, ``codes = round(x / scale)`` with
+  ``scale = max|x| / 127``, so ``x . q ~= scale * (codes . q)``.
+- float16: the embeddings rounded to half precision.
+
+Select the store with ``YUGI_EMBEDDING_STORE`` (``int8``, ``float16`` or ``float32`` for
+no quantized copy). The codes are saved with the build and memory-mapped like every
+other array, so forked workers share them.
+"""
+import os
+
+import numpy as np
+
+EMBEDDING_STORE = os.environ.get('YUGI_EMBEDDING_STORE', 'int8')
+STORES = ('int8', 'float16', 'float32')
+# Rows per block when quantizing, bounding the float32 temporaries
+QUANTIZE_BLOCK_SIZE = 65536
+
+
+class QuantizedVectors:
+    """Compact row vectors: int8 codes with a float32 scale per row, or float16 values."""
+
+    def __init__(self, codes, scales=None):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def kind(self):
+        return 'int8' if self.codes.dtype == np.int8 else 'float16'
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def scores(self, rows, query):
+        """Approximate dot products of `rows` with a float32 `query`."""
+        # The gather reads 1 or 2 bytes per dimension; only the gathered block is widened to float32
+        scores = self.codes.take(rows, axis=0).astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales.take(rows)
+        return scores
+
+    def appended(self, vectors):
+        """A new in-memory store with the rows of `vectors` (float32) quantized and added at the end."""
+        extra = quantize(vectors, self.kind)
+        scales = None if self.scales is None else np.concatenate([np.asarray(self.scales), extra.scales])
+        return QuantizedVectors(np.concatenate([np.asarray(self.codes), extra.codes]), scales)
+
+
+def quantize(vectors, kind=EMBEDDING_STORE):
+    """
+    Quantize float32 row vectors.
+
+    Args:
+        vectors (np.ndarray): (N, d) float32 vectors.
+        kind (str): 'int8' or 'float16'.
+
+    Returns:
+        QuantizedVectors
+    """
+    if kind == 'float16':
+        return QuantizedVectors(np.asarray(vectors, dtype=np.float16))
+    if kind != 'int8':
+        raise ValueError(f"Unknown embedding store {kind!r}; choose one of {STORES}")
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    scales = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), QUANTIZE_BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + QUANTIZE_BLOCK_SIZE], dtype=np.float32)
+        block_scales = np.abs(block).max(axis=1) / 127.0
+        # All-zero rows keep zero codes
+        block_scales[block_scales == 0] = 1.0
+        codes[start:start + len(block)] = np.rint(block / block_scales[:, None])
+        scales[start:start + len(block)] = block_scales
+    return QuantizedVectors(codes, scales)
+
+
+def save_quantized(directory, store):
+    np.save(os.path.join(directory, f'embeddings_{store.kind}.npy'), store.codes)
+    if store.scales is not None:
+        np.save(os.path.join(directory, 'embeddings_int8_scales.npy'), store.scales)
+
+
+def load_quantized(directory):
+    """Memory-map the quantized embeddings of a build, or None when it has none."""
+    if os.path.exists(os.path.join(directory, 'embeddings_int8.npy')):
+        return QuantizedVectors(np.load(os.path.join(directory, 'embeddings_int8.npy'), mmap_mode='r'),
+                                np.load(os.path.join(directory, 'embeddings_int8_scales.npy'), mmap_mode='r'))
+    if os.path.exists(os.path.join(directory, 'embeddings_float16.npy')):
+        return QuantizedVectors(np.load(os.path.join(directory, 'embeddings_float16.npy'), mmap_mode='r'))
+    return None
@@ -1,83 +1,43 @@
-import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
-from surprise import Dataset, Reader, SVD
-from surprise.model_selection import train_test_split
-import torch
-import functools
+import os
+import threading
 import time
-from collections import defaultdict
 
-# Load the dataset
-df = pd.read_csv('data/YT_data.csv')
+from src.services.als import get_model as get_als_model
+from src.services.artifacts import (DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, StaleArtifactsError, build_artifacts,
+                                    check_artifacts, latest_build_dir, load_artifacts, load_catalog_artifacts,
+                                    load_catalog_frame, load_content_artifacts, load_semantic_artifacts)
+from src.services.cache import ShardedLRUCache
+from src.services.catalog import Catalog
+from src.services.explore import explore_pool
+from src.services.metrics import gauge, histogram, process_start_time, register_cache
+from src.services.neighbors import top_k_row
+from src.services.snapshot import ModelSnapshot
+from src.services.topn import live_candidates, read_topn_meta
 
-# Data Preprocessing
-df = df.dropna(subset=['v_id', 'v_title', 'v_description', 'tags', 'category_id'])
-df['content'] = df['v_title'] + ' ' + df['v_description'] + ' ' + df['tags']
-
-# Generate YouTube Video Link
-df['video_link'] = "https://www.youtube.com/watch?v=" + df['v_id']
-
-# Convert categorical features
-df['category_id'] = df['category_id'].astype(str)
-
-
-# TF-IDF Vectorization for Content-Based Filtering
-tfidf = TfidfVectorizer(stop_words='english')
-tfidf_matrix = tfidf.fit_transform(df['content'])
-
-
-# Sentence Transformer for Semantic Similarity with batch processing
-model = SentenceTransformer('all-MiniLM-L6-v2')
-# Process embeddings in batches for better performance
-batch_size = 32
-embeddings = []
-for i in range(0, len(df), batch_size):
-    batch = df['content'].iloc[i:i+batch_size].tolist()
-    batch_embeddings = model.encode(batch, batch_size=batch_size, show_progress_bar=False)
-    embeddings.extend(batch_embeddings)
-df['embeddings'] = embeddings
-
-
-# Compute cosine similarity
-cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-
-# Enhanced cache management with LRU implementation
-from collections import OrderedDict
-
-class LRUCache(OrderedDict):
-    def __init__(self, capacity):
-        super().__init__()
-        self.capacity = capacity
-
-    def get(self, key):
-        if key not in self:
-            return None
-        self.move_to_end(key)
-        return self[key]
-
-    def put(self, key, value):
-        if key in self:
-            self.move_to_end(key)
-        self[key] = value
-        if len(self) > self.capacity:
-            self.popitem(last=False)
-
-# Initialize LRU cache with improved memory management
-recommendation_cache = LRUCache(500)
+# Thread-safe (lock-striped) LRU cache; entries expire CACHE_EXPIRATION seconds after they are stored
+MAX_CACHE_SIZE = 500
 CACHE_EXPIRATION = 600  # 10 minutes
+recommendation_cache = ShardedLRUCache(MAX_CACHE_SIZE)
+register_cache('recommendations', recommendation_cache)
 
+# Time spent in each stage of a recommendation (lookup, content, boost, collaborative, merge;
+# server.py adds format, and search for /api/search)
+stage_seconds = histogram('yugi_recommendation_stage_seconds', 'Time spent in each recommendation stage', ('stage',))
+startup_seconds = gauge('yugi_startup_phase_seconds', 'Duration of the server startup phases', ('phase',))
+stage_reached_seconds = gauge('yugi_warmup_stage_reached_seconds',
+                              'Seconds from process start until a warm-up stage was served', ('stage',))
+build_seconds = gauge('yugi_build_phase_seconds', 'Duration of the artifact build phases of the served model',
+                      ('phase',))
 
-# Collaborative Filtering using SVD
-reader = Reader(rating_scale=(0, 5))
-data = Dataset.load_from_df(df[['v_id', 'v_title', 'engagement_rate']], reader)
-trainset, testset = train_test_split(data, test_size=0.2)
+# Number of videos scored together by batch_hybrid_recommendation
+BATCH_BLOCK_SIZE = 256
 
+# Weight of the semantic (embedding) similarity in content scores; 0 disables the semantic candidates
+SEMANTIC_WEIGHT = float(os.environ.get('YUGI_SEMANTIC_WEIGHT', 0.3))
 
-svd = SVD()
-svd.fit(trainset)
+# Seconds between checks for a newer published model build (e.g. from `python -m src.services.ingest`)
+SNAPSHOT_REFRESH_INTERVAL = float(os.environ.get('YUGI_SNAPSHOT_REFRESH_INTERVAL', 5))
 
 
 # Define sensitive content categories that should be handled carefully
@@ -110,226 +70,708 @@ CATEGORY_COMPATIBILITY = {
     '23': {'23': 1.0, '27': 0.7, '28': 0.6, '24': 0.6, '22': 0.3, '25': 0.3, '29': 0.3}
 }
 
-@functools.lru_cache(maxsize=100)
-def get_video_category(video_id, df=df):
-    """Get the category of a video with caching for performance"""
+def get_video_category(video_id, catalog=None):
+    """Get the category of a video through the catalog id index"""
+    catalog = catalog or get_snapshot().catalog
+    row = catalog.row_of(video_id)
+    return catalog.category_of(row) if row is not None else None
+
+
+def _category_multiplier(current, candidate, use_compatibility):
+    """Score multiplier for showing a `candidate` category next to a `current` one."""
+    if use_compatibility and current in CATEGORY_COMPATIBILITY:
+        return CATEGORY_COMPATIBILITY.get(current, {}).get(candidate, 0.5)
+    multiplier = 1.0
+    # If watching AI content, reduce score of political content
+    if current in SENSITIVE_CATEGORIES['AI'] and candidate in SENSITIVE_CATEGORIES['POLITICAL']:
+        multiplier *= 0.3
+    # If watching political content, reduce score of unrelated (non-political, non-AI) content
+    if current in SENSITIVE_CATEGORIES['POLITICAL'] and candidate not in SENSITIVE_CATEGORIES['POLITICAL'] \
+            and candidate not in SENSITIVE_CATEGORIES['AI']:
+        multiplier *= 0.5
+    return multiplier
+
+
+def build_category_matrix(categories, use_compatibility):
+    """
+    Dense category x category multiplier table indexed by the catalog's category codes.
+
+    Content candidates use the compatibility matrix, collaborative ones only the
+    sensitive-content penalties.
+    """
+    return np.array([[_category_multiplier(cur, cand, use_compatibility) for cand in categories]
+                     for cur in categories], dtype=np.float64)
+
+
+def _catalog_tables(catalog):
+    """Category multiplier tables and explore pool of a catalog (every stage has them)."""
+    return {
+        'content_category_matrix': build_category_matrix(catalog.categories, True),
+        'collaborative_category_matrix': build_category_matrix(catalog.categories, False),
+        # Rows the explore feed draws from
+        'explore_pool': explore_pool(catalog),
+    }
+
+
+def catalog_snapshot(catalog, version=None, tables=None):
+    """A 'catalog' stage snapshot: enough for the explore feed, no recommendations yet."""
+    return ModelSnapshot(catalog=catalog, neighbor_index=None, tfidf=None, tfidf_matrix=None, embeddings=None,
+                         semantic_index=None, version=version, stage='catalog', **(tables or _catalog_tables(catalog)))
+
+
+def build_snapshot(artifacts, base=None):
+    """
+    Bundle loaded artifacts into an immutable ModelSnapshot.
+
+    `artifacts` may hold only the parts of the first warm-up stages (see load_catalog_artifacts
+    and friends); the snapshot's stage says which. `base`, an earlier snapshot of the same
+    build, lends its catalog and tables so later stages do not rebuild them.
+    """
+    version = os.path.basename(artifacts['build_dir'])
+    # CSV load, TF-IDF, embedding, ANN and similarity durations recorded when the build was made
+    for phase, seconds in artifacts['manifest'].get('timings', {}).items():
+        build_seconds.set(seconds, phase)
+    if base is not None and base.version == version:
+        catalog = base.catalog
+        tables = {name: getattr(base, name)
+                  for name in ('content_category_matrix', 'collaborative_category_matrix', 'explore_pool')}
+    else:
+        # Columnar catalog with an O(1) v_id -> row index (row number == matrix row)
+        catalog = Catalog.from_artifacts(artifacts)
+        tables = _catalog_tables(catalog)
+    if 'tfidf_matrix' not in artifacts:
+        return catalog_snapshot(catalog, version, tables)
+    # Materialized content candidates are only valid for the semantic weight they were blended with
+    topn_table = artifacts['topn_table']
+    if topn_table is not None and topn_table.semantic_weight != SEMANTIC_WEIGHT:
+        print(f"Ignoring the top-N table of {artifacts['build_dir']}: built with semantic weight "
+              f"{topn_table.semantic_weight}, serving {SEMANTIC_WEIGHT}")
+        topn_table = None
+    return ModelSnapshot(
+        catalog=catalog,
+        # Top-K content neighbors of every video (replaces the dense cosine similarity matrix)
+        neighbor_index=artifacts['neighbor_index'],
+        # TF-IDF Vectorization for Content-Based Filtering
+        tfidf=artifacts['tfidf'],
+        tfidf_matrix=artifacts['tfidf_matrix'],
+        # Sentence Transformer embeddings as one contiguous float32 matrix, with an IVF ANN index
+        # (None in the 'content' stage: candidates are then TF-IDF neighbors only)
+        embeddings=artifacts.get('embeddings'),
+        semantic_index=artifacts.get('semantic_index'),
+        # Precomputed content candidates (None: every video is scored live)
+        topn_table=topn_table,
+        # Inverted index for /api/search (None for builds made before search: queries scan every row)
+        search_index=artifacts.get('search_index'),
+        version=version,
+        stage='ready' if 'embeddings' in artifacts else 'content',
+        **tables,
+    )
+
+
+# Called with the video ids whose cached results may have changed (None = all) when a snapshot is published
+invalidation_hooks = []
+
+# The served snapshot; None until warm-up has loaded the catalog
+_snapshot = None
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+# Process whose snapshot watcher thread is running (threads do not survive a fork), and the lock
+# that keeps two refreshes from loading the same build at once
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+# Stage being served ('starting' before the catalog), stage being loaded, warm-up error, and the
+# seconds from process start at which every stage was first served
+warmup_state = {'phase': 'starting', 'loading': None, 'error': None, 'reached': {}}
+
+
+class _Loading:
+    """Context manager recording what warm-up is loading and how long it took."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        warmup_state['loading'] = self.stage
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        # On errors `loading` keeps naming the stage that failed
+        if exc_type is None:
+            warmup_state['loading'] = None
+            startup_seconds.set(time.perf_counter() - self.start, self.stage)
+
+
+def _publish_stage(snapshot):
+    # Every stage drops what was cached from the previous, less complete one
+    publish_snapshot(snapshot)
+    warmup_state['phase'] = snapshot.stage
+    reached = time.time() - process_start_time()
+    warmup_state['reached'].setdefault(snapshot.stage, reached)
+    stage_reached_seconds.set(reached, snapshot.stage)
+
+
+def _warm_up(out_dir, csv_path):
+    """Load the model stage by stage, publishing a snapshot as soon as each stage is usable."""
     try:
-        video_data = df[df['v_id'] == video_id]
-        if not video_data.empty:
-            return video_data.iloc[0]['category_id']
+        build_dir = latest_build_dir(out_dir)
+        try:
+            manifest = check_artifacts(build_dir, csv_path)
+        except StaleArtifactsError as e:
+            print(f"{e}; rebuilding artifacts and serving the explore feed meanwhile "
+                  f"(run `python -m src.services.artifacts build-artifacts` ahead of deploys)")
+            with _Loading('catalog'):
+                snapshot = catalog_snapshot(Catalog.from_frame(load_catalog_frame(csv_path)))
+            _publish_stage(snapshot)
+            with _Loading('build'):
+                build_artifacts(csv_path, out_dir)
+            build_dir = latest_build_dir(out_dir)
+            manifest = check_artifacts(build_dir, csv_path)
+
+        # The catalog first (explore feed), then TF-IDF and neighbors, then embeddings
+        artifacts, snapshot = {}, None
+        for stage, load in (('catalog', load_catalog_artifacts), ('content', load_content_artifacts),
+                            ('ready', load_semantic_artifacts)):
+            with _Loading(stage):
+                artifacts.update(load(build_dir, manifest))
+                snapshot = build_snapshot(artifacts, base=snapshot)
+            _publish_stage(snapshot)
+        print(f"Model {snapshot.version} ready {warmup_state['reached']['ready']:.2f}s after process start")
     except Exception as e:
-        print(f"Error getting video category: {e}")
-    return None
+        warmup_state['error'] = f"{type(e).__name__}: {e}"
+        print(f"Model warm-up failed while loading {warmup_state['loading']}: {warmup_state['error']}")
+        warmup_state['loading'] = None
+
 
-def hybrid_recommendation(video_id, top_n=5, df=df, cosine_sim=cosine_sim): # Pass df and cosine_sim to the function
+def start_warmup(out_dir=DEFAULT_ARTIFACT_DIR, csv_path=DEFAULT_CSV_PATH):
     """
-    Provides hybrid recommendations (content-based + collaborative filtering).
+    Load the model in a background thread, once per process.
 
+    Until it is complete, get_snapshot returns the partial snapshot of the last loaded stage
+    (or None before the catalog), so a server can answer right away.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_up, args=(out_dir, csv_path), name='warmup', daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
 
-    Args:
-        video_id (str): The ID of the video for which to generate recommendations.
-        top_n (int, optional): The number of recommendations to generate. Defaults to 5.
-        df (pd.DataFrame, optional): The DataFrame containing video data. Defaults to the global df.
-        cosine_sim (np.ndarray, optional): The cosine similarity matrix. Defaults to the global cosine_sim.
 
+def wait_until_ready(timeout=None):
+    """
+    Block until warm-up is over (starting it if needed).
 
     Returns:
-        list: A list of recommended video objects with details.
+        bool: True when the full model is served, False when `timeout` passed first.
+
+    Raises:
+        RuntimeError: Warm-up failed.
     """
-    # Check cache first for better performance
-    cache_key = f"{video_id}_{top_n}"
-    current_time = time.time()
-    
-    if cache_key in recommendation_cache:
-        cache_entry = recommendation_cache[cache_key]
-        # Return cached results if they haven't expired
-        if current_time - cache_entry['timestamp'] < CACHE_EXPIRATION:
-            return cache_entry['recommendations']
-    
+    start_warmup().join(timeout)
+    if warmup_state['error'] is not None:
+        raise RuntimeError(f"Model warm-up failed: {warmup_state['error']}")
+    return warmup_state['phase'] == 'ready'
+
+
+def get_snapshot():
+    """
+    The current model snapshot; read it once per request and use it throughout.
+
+    While a background warm-up runs (start_warmup) this is a partial snapshot, or None before
+    the catalog is loaded. Without one (scripts, commands), the first call loads the whole model.
+    """
+    if _warmup_thread is None:
+        wait_until_ready()
+    return _snapshot
+
+
+def publish_snapshot(snapshot, changed_video_ids=None):
+    """
+    Atomically make `snapshot` the current model.
+
+    Requests already running keep the snapshot they started with. Cached results are
+    dropped only for `changed_video_ids` (every entry when None).
+    """
+    global _snapshot
+    _snapshot = snapshot
+    invalidate_cached(changed_video_ids)
+
+
+def invalidate_cached(video_ids=None):
+    """Drop cached recommendations for the given source video ids (all of them when None)."""
+    if video_ids is None:
+        recommendation_cache.clear()
+    else:
+        video_ids = set(video_ids)
+        recommendation_cache.purge(lambda key, entry: key.rsplit('_', 1)[0] in video_ids)
+    for hook in invalidation_hooks:
+        hook(video_ids)
+
+
+def refresh_snapshot(out_dir=DEFAULT_ARTIFACT_DIR, csv_path=DEFAULT_CSV_PATH):
+    """
+    Swap in the latest build if another process (the ingest command, another worker) published one.
+
+    Returns:
+        bool: True if a new snapshot was published.
+    """
+    # A refresh already in progress loads the same build
+    if not _refresh_lock.acquire(blocking=False):
+        return False
     try:
-        idx = df[df['v_id'] == video_id].index[0]
-    except IndexError:
-        return [{"error": "Video ID not found!"}]
-    
-    # Get the category and channel of the current video for better recommendations
-    current_video_category = df.iloc[idx]['category_id']
-    current_video_channel = df.iloc[idx]['channel_name'] if 'channel_name' in df.columns else None
-    current_video_channel_id = df.iloc[idx]['channel_id'] if 'channel_id' in df.columns else None
-    
-    # Check if current video is in a sensitive category
-    is_political = current_video_category in SENSITIVE_CATEGORIES['POLITICAL']
-    is_ai = current_video_category in SENSITIVE_CATEGORIES['AI']
-    
-    # For sensitive categories, we'll be more careful with recommendations
-    sensitive_content = is_political or is_ai
-    
-    # Content-Based Recommendations
-    content_scores = list(enumerate(cosine_sim[idx]))
-    content_scores = sorted(content_scores, key=lambda x: x[1], reverse=True)
-    content_recommendations = [
-        {
-            "id": df.iloc[i[0]]['v_id'],
-            "title": df.iloc[i[0]]['v_title'],
-            "link": df.iloc[i[0]]['video_link'],
-            "description": df.iloc[i[0]]['v_description'],
-            "tags": df.iloc[i[0]]['tags'],
-            "category": df.iloc[i[0]]['category_id'],
-            "channel_name": df.iloc[i[0]]['channel_name'] if 'channel_name' in df.columns else None,
-            "channel_id": df.iloc[i[0]]['channel_id'] if 'channel_id' in df.columns else None,
-            "score": float(i[1])
-        } 
-        for i in content_scores[1:top_n*2] # Get more candidates for better diversity
-    ]
-    
-    # Boost scores for videos from the same channel
-    if current_video_channel or current_video_channel_id:
-        for rec in content_recommendations:
-            # Boost score for videos from the same channel
-            if (current_video_channel and rec['channel_name'] == current_video_channel) or \
-               (current_video_channel_id and rec['channel_id'] == current_video_channel_id):
-                rec['score'] *= 1.5  # 50% boost for same channel
-    
-    # Boost scores for videos in the same category
-    for rec in content_recommendations:
-        if rec['category'] == current_video_category:
-            rec['score'] *= 1.3  # 30% boost for same category
-        
-        # Handle sensitive content categories with improved compatibility matrix
-        if current_video_category in CATEGORY_COMPATIBILITY:
-            # Get compatibility score between current video category and recommendation category
-            compatibility = CATEGORY_COMPATIBILITY.get(current_video_category, {}).get(rec['category'], 0.5)
-            # Apply compatibility score to recommendation score
-            rec['score'] *= compatibility
-        else:
-            # If watching AI content, reduce score of political content
-            if is_ai and rec['category'] in SENSITIVE_CATEGORIES['POLITICAL']:
-                rec['score'] *= 0.3  # 70% reduction for political content when watching AI
-            
-            # If watching political content, reduce score of unrelated categories
-            if is_political and rec['category'] not in SENSITIVE_CATEGORIES['POLITICAL']:
-                # Allow some related content but reduce score of completely unrelated content
-                if rec['category'] not in SENSITIVE_CATEGORIES['AI']:
-                    rec['score'] *= 0.5  # 50% reduction for non-political content
+        return _refresh_snapshot(out_dir, csv_path)
+    finally:
+        _refresh_lock.release()
+
+
+def _refresh_snapshot(out_dir, csv_path):
+    build_dir = latest_build_dir(out_dir)
+    if build_dir is None or _snapshot is None or _snapshot.stage != 'ready':
+        # Nothing to refresh while warm-up is still publishing its own stages
+        return False
+    if os.path.basename(build_dir) == _snapshot.version:
+        # Same build, but the top-N job may have materialized its table since it was loaded
+        meta = read_topn_meta(build_dir)
+        if _snapshot.topn_table is not None or meta is None or meta['semantic_weight'] != SEMANTIC_WEIGHT:
+            return False
+    artifacts = load_artifacts(out_dir, csv_path)
+    manifest = artifacts['manifest']
+    # An ingest on top of our own version lists the videos it affected; otherwise drop every cached entry
+    changed = manifest.get('ingest', {}).get('changed_video_ids')
+    if manifest.get('parent') != _snapshot.version:
+        changed = None
+    publish_snapshot(build_snapshot(artifacts), changed)
+    print(f"Published model snapshot {os.path.basename(build_dir)}")
+    return True
+
+
+def _watch_snapshots(interval, out_dir, csv_path):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_snapshot(out_dir, csv_path)
+        except Exception as e:
+            print(f"Error refreshing model snapshot: {e}")
+
+
+def ensure_snapshot_watcher(interval=SNAPSHOT_REFRESH_INTERVAL, out_dir=DEFAULT_ARTIFACT_DIR,
+                            csv_path=DEFAULT_CSV_PATH):
+    """
+    Check for a newer published build every `interval` seconds in a daemon thread of this process.
+
+    The new build is loaded off the request path and swapped in when it is complete, so no
+    request waits for it. Started lazily (cheap to call on every request) so that every
+    pre-forked worker gets its own thread.
+    """
+    global _watcher_pid
+    if interval <= 0 or _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid != os.getpid():
+            threading.Thread(target=_watch_snapshots, args=(interval, out_dir, csv_path),
+                             name='snapshot-watcher', daemon=True).start()
+            _watcher_pid = os.getpid()
+
+
+def _apply_boosts(rows, scores, idx, category_matrix, catalog):
+    """
+    Apply the same-channel, same-category and category multipliers to candidate scores.
+
+    `idx` is the source row, or a (B, 1) column of source rows when `rows`/`scores` hold
+    one row of candidates per source (batch scoring); the arrays broadcast either way.
+    The multiplications happen in the same order as the per-dict loops they replace,
+    so the boosted scores are bit-for-bit identical.
+    """
+    channel_codes, channel_id_codes = catalog.channel_codes, catalog.channel_id_codes
+    category_codes = catalog.category_codes
+    current_channel, current_channel_id = channel_codes[idx], channel_id_codes[idx]
+    same_channel = ((channel_codes[rows] == current_channel) & (current_channel >= 0)) | \
+                   ((channel_id_codes[rows] == current_channel_id) & (current_channel_id >= 0))
+    scores = np.where(same_channel, scores * 1.5, scores)  # 50% boost for same channel
+    scores = np.where(category_codes[rows] == category_codes[idx], scores * 1.3, scores)  # 30% boost for same category
+    return scores * category_matrix[category_codes[idx], category_codes[rows]]
+
+
+def _top_rows(rows, scores, n):
+    """Best `n` candidates by descending score (per row for 2-D input), keeping the original order for ties."""
+    if rows.ndim == 1:
+        order = top_k_row(scores, n)
+        return rows[order], scores[order]
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :n]
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _semantic_candidates(sources, count, snapshot):
+    """(B, count) nearest rows of each source in embedding space from the ANN index, -1 padded."""
+    candidates = np.full((len(sources), count), -1, dtype=np.int64)
+    for i, source in enumerate(sources):
+        rows, _ = snapshot.semantic_index.search(snapshot.embeddings[source], count, exclude=source)
+        candidates[i, :len(rows)] = rows
+    return candidates
+
+
+def _tfidf_similarity(sources, rows, tfidf_matrix):
+    """Cosine similarity between each source row and its (B, m) candidate rows (TF-IDF rows are L2-normalized)."""
+    left = tfidf_matrix[np.repeat(sources, rows.shape[1])]
+    right = tfidf_matrix[rows.ravel()]
+    return np.asarray(left.multiply(right).sum(axis=1), dtype=np.float64).reshape(rows.shape)
+
+
+def _blend_semantic(sources, content_rows, content_scores, snapshot):
+    """
+    Add the semantic neighbors as extra content candidates and blend both similarities.
+
+    Every candidate gets (1 - SEMANTIC_WEIGHT) * TF-IDF similarity + SEMANTIC_WEIGHT * embedding
+    similarity. Semantic neighbors already among the TF-IDF candidates are dropped (-inf).
+    """
+    semantic_rows = _semantic_candidates(sources, content_rows.shape[1], snapshot)
+    dropped = (semantic_rows < 0) | (semantic_rows[:, :, None] == content_rows[:, None, :]).any(axis=2)
+    semantic_rows = np.where(dropped, sources[:, None], semantic_rows)
+    rows = np.concatenate([content_rows, semantic_rows], axis=1)
     
-    # Re-sort content recommendations by the adjusted scores
-    content_recommendations = sorted(content_recommendations, key=lambda x: x['score'], reverse=True)[:top_n]
+    tfidf_scores = np.concatenate(
+        [content_scores, _tfidf_similarity(sources, semantic_rows, snapshot.tfidf_matrix)], axis=1)
+    embeddings = snapshot.embeddings
+    semantic_scores = np.einsum('bd,bmd->bm', embeddings[sources], embeddings[rows]).astype(np.float64)
+    scores = (1 - SEMANTIC_WEIGHT) * tfidf_scores + SEMANTIC_WEIGHT * semantic_scores
+    scores[:, content_rows.shape[1]:][dropped] = -np.inf
+    return rows, scores
+
+
+def _content_candidates(sources, count, snapshot):
+    """
+    (B, m) content candidate rows of each source and their similarity scores, before boosts.
+
+    Candidates are the `count` best TF-IDF neighbors plus, when SEMANTIC_WEIGHT > 0, as many
+    ANN semantic neighbors; unused slots are scored -inf.
+    """
+    # Neighbors are stored pre-sorted by descending similarity, the video itself first
+    neighbor_rows, neighbor_scores = snapshot.neighbor_index.neighbors(sources, count + 1)
+    content_rows = np.asarray(neighbor_rows[:, 1:count + 1], dtype=np.int64)
+    content_scores = np.asarray(neighbor_scores[:, 1:count + 1], dtype=np.float64)
     
-    # Improved Collaborative Filtering with better targeting
-    # First try to get videos from the same channel
-    same_channel_df = pd.DataFrame()
-    if current_video_channel and 'channel_name' in df.columns:
-        same_channel_df = df[df['channel_name'] == current_video_channel]
-    elif current_video_channel_id and 'channel_id' in df.columns:
-        same_channel_df = df[df['channel_id'] == current_video_channel_id]
+    # Semantic neighbors from the embedding ANN index as a second scored source
+    if SEMANTIC_WEIGHT > 0 and snapshot.semantic_index is not None and content_rows.shape[1] > 0:
+        content_rows, content_scores = _blend_semantic(sources, content_rows, content_scores, snapshot)
+    return content_rows, content_scores
+
+
+def _materialized_candidates(sources, top_n, snapshot):
+    """
+    Content candidates read from the materialized top-N table where it covers the source
+    (O(1) per video). The table's candidates of the other sources are computed live, so a
+    video ranks the same whether or not it is covered.
+    """
+    table = snapshot.topn_table
+    if table is None or top_n > table.size:
+        # Get more candidates than needed for better diversity
+        return _content_candidates(sources, top_n * 2 - 1, snapshot)
+    covered = table.covers(sources)
+    if covered.all():
+        return table.candidates(sources)
+    rows = np.empty((len(sources), table.size), dtype=np.int64)
+    scores = np.empty((len(sources), table.size), dtype=np.float64)
+    if covered.any():
+        rows[covered], scores[covered] = table.candidates(sources[covered])
+    rows[~covered], scores[~covered] = live_candidates(snapshot, sources[~covered], table.size)
+    return rows, scores
+
+
+def _score_content(idx, top_n, snapshot):
+    """
+    Content-based candidates with boosts applied, best first.
+
+    Works on one source row, or on an array of source rows at once (one candidate row each).
+    Candidates come from the materialized top-N table when the snapshot has one, otherwise
+    from the TF-IDF and semantic neighbors; unused slots of a row are scored -inf.
+    """
+    single = np.ndim(idx) == 0
+    sources = np.atleast_1d(np.asarray(idx, dtype=np.int64))
+    with stage_seconds.time('content'):
+        content_rows, content_scores = _materialized_candidates(sources, top_n, snapshot)
     
-    # Then try to get videos from the same category
-    same_category_df = df[df['category_id'] == current_video_category]
+    # Channel, category and compatibility boosts as array operations, then keep the best top_n
+    with stage_seconds.time('boost'):
+        if single:
+            content_scores = _apply_boosts(content_rows[0], content_scores[0], sources[0],
+                                           snapshot.content_category_matrix, snapshot.catalog)
+            content_rows, content_scores = _top_rows(content_rows[0], content_scores, top_n)
+            valid = np.isfinite(content_scores)
+            return content_rows[valid], content_scores[valid]
+        content_scores = _apply_boosts(content_rows, content_scores, sources[:, None],
+                                       snapshot.content_category_matrix, snapshot.catalog)
+        return _top_rows(content_rows, content_scores, top_n)
+
+
+def build_recommendation(row, score, catalog, records=None):
+    """Build the response dict for one catalog row (`records` memoizes the row fields across a batch)."""
+    if records is None:
+        recommendation = catalog.record(row)
+    else:
+        if row not in records:
+            records[row] = catalog.record(row)
+        recommendation = dict(records[row])
+    recommendation["score"] = float(score)
+    return recommendation
+
+
+def _collaborative_candidates(idx, top_n, catalog):
+    """
+    Engagement-ranked rows from the same channel, then the same category, then the whole catalog.
+
+    The catalog keeps every channel, category and the whole catalog pre-ranked by engagement,
+    so each list is an O(top_n) slice.
+    """
+    same_channel_count = len(catalog.same_channel_rows(idx))
+    same_category_count = len(catalog.same_category_rows(idx))
     
     # Prioritize recommendations in this order: same channel, same category, then general
-    if len(same_channel_df) >= top_n//2:
+    if same_channel_count >= top_n//2:
         # If we have enough videos from the same channel, use those for half the recommendations
-        channel_filtered_df = same_channel_df.sort_values('engagement_rate', ascending=False).head(top_n)
-        category_filtered_df = same_category_df.sort_values('engagement_rate', ascending=False).head(top_n)
-        # Combine channel and category dataframes for more diversity
-        filtered_df = pd.concat([channel_filtered_df, category_filtered_df]).drop_duplicates(subset=['v_id']).head(top_n * 2)
-    elif len(same_category_df) >= top_n:
+        channel_top = catalog.top_same_channel(idx, top_n)
+        category_top = catalog.top_same_category(idx, top_n)
+        # Combine channel and category rows for more diversity, dropping duplicate ids
+        candidates = []
+        seen_ids = set()
+        for row in np.concatenate([channel_top, category_top]):
+            if catalog.video_ids[row] not in seen_ids and len(candidates) < top_n * 2:
+                seen_ids.add(catalog.video_ids[row])
+                candidates.append(row)
+        return np.array(candidates, dtype=np.int64)
+    if same_category_count >= top_n:
         # If we have enough videos in the same category, use those
-        filtered_df = same_category_df.sort_values('engagement_rate', ascending=False).head(top_n * 2)
-    else:
-        # Otherwise, use the whole dataset but prioritize engagement
-        filtered_df = df.sort_values('engagement_rate', ascending=False).head(top_n * 2)
-    
-    # Create collaborative filtering recommendations with improved scoring
-    svd_recommendations = [
-        {
-            "id": row['v_id'],
-            "title": row['v_title'],
-            "link": "https://www.youtube.com/watch?v=" + row['v_id'],
-            "description": row['v_description'],
-            "tags": row['tags'],
-            "category": row['category_id'],
-            "channel_name": row['channel_name'] if 'channel_name' in filtered_df.columns else None,
-            "channel_id": row['channel_id'] if 'channel_id' in filtered_df.columns else None,
-            "score": float(row['engagement_rate']) / 5.0
-        }
-        for _, row in filtered_df.sample(min(top_n, len(filtered_df))).iterrows()
-    ]
+        return catalog.top_same_category(idx, top_n * 2).astype(np.int64)
+    # Otherwise, use the whole dataset but prioritize engagement
+    return catalog.top_overall(top_n * 2).astype(np.int64)
+
+
+def _als_candidates(rows, top_n, snapshot):
+    """
+    Videos watched by the same users as each source, from the ALS item factors.
+
+    Returns:
+        list: (rows, similarities) per source, or None where there is no model, the source has
+        no views yet, or no neighbor is positively similar (the engagement ranking is used then).
+    """
+    model = get_als_model()
+    if model is None:
+        return [None] * len(rows)
+    results = []
+    for result in model.similar_items(rows, top_n, snapshot.catalog):
+        if result is not None:
+            positive = result[1] > 0
+            result = (result[0][positive], result[1][positive]) if positive.any() else None
+        results.append(result)
+    return results
+
+
+def _collaborative_scores(idx, top_n, snapshot, batch_state=None):
+    """
+    Boosted collaborative candidates of one source row, as (rows, scores).
+
+    They are the source's ALS neighbors (videos watched by the same users) when the model
+    knows the source, else engagement-ranked videos of its channel and category.
+
+    `batch_state` lets a batch share the engagement candidate lists (they only depend on the
+    source's channel and category) and the ALS neighbors computed for the whole block.
+    """
+    catalog = snapshot.catalog
     
-    # Apply the same boosting to collaborative filtering recommendations
-    for rec in svd_recommendations:
-        # Boost score for videos from the same channel
-        if (current_video_channel and rec['channel_name'] == current_video_channel) or \
-           (current_video_channel_id and rec['channel_id'] == current_video_channel_id):
-            rec['score'] *= 1.5
-        # Boost score for videos in the same category
-        if rec['category'] == current_video_category:
-            rec['score'] *= 1.3
-            
-        # Handle sensitive content categories for collaborative filtering too
-        if sensitive_content:
-            # If watching AI content, reduce score of political content
-            if is_ai and rec['category'] in SENSITIVE_CATEGORIES['POLITICAL']:
-                rec['score'] *= 0.3  # 70% reduction for political content when watching AI
-            
-            # If watching political content, reduce score of unrelated categories
-            if is_political and rec['category'] not in SENSITIVE_CATEGORIES['POLITICAL']:
-                # Allow some related content but reduce score of completely unrelated content
-                if rec['category'] not in SENSITIVE_CATEGORIES['AI']:
-                    rec['score'] *= 0.5  # 50% reduction for non-political content
+    # Improved Collaborative Filtering with better targeting
+    with stage_seconds.time('collaborative'):
+        if batch_state is None:
+            als = _als_candidates([idx], top_n, snapshot)[0]
+        else:
+            als = batch_state['als'].get(idx)
+        
+        if als is not None:
+            # Co-watched videos are scored by their similarity to the source
+            collaborative_rows, base_scores = als
+        else:
+            if batch_state is None:
+                filtered_rows = _collaborative_candidates(idx, top_n, catalog)
+            else:
+                group_key = (catalog.channel_codes[idx], catalog.channel_id_codes[idx], catalog.category_codes[idx])
+                if group_key not in batch_state['collaborative']:
+                    batch_state['collaborative'][group_key] = _collaborative_candidates(idx, top_n, catalog)
+                filtered_rows = batch_state['collaborative'][group_key]
+            # Without views of the source, candidates are scored by engagement
+            collaborative_rows = np.random.permutation(filtered_rows)[:min(top_n, len(filtered_rows))]
+            base_scores = catalog.engagement_rate[collaborative_rows] / 5.0
+        
+        # Same boosts as the content candidates
+        # (sensitive categories only get the penalties, not the compatibility matrix)
+        collaborative_scores = _apply_boosts(collaborative_rows, base_scores, idx,
+                                             snapshot.collaborative_category_matrix, catalog)
+    return collaborative_rows, collaborative_scores
+
+
+def _select_candidates(video_id, top_n, content_rows, content_scores, collaborative_rows, collaborative_scores,
+                       catalog):
+    """Merge content and collaborative candidates into the best `top_n` (row, score) pairs, best first."""
+    video_ids = catalog.video_ids
     
     # Combine recommendations and remove duplicates
     # Weight content-based recommendations higher (70%) than collaborative (30%)
-    all_recommendations = content_recommendations + svd_recommendations
-    unique_recommendations = []
+    selected = []
     seen_ids = set()
     
     # First add some content-based recommendations to ensure diversity
     content_count = 0
-    for rec in content_recommendations:
-        if rec["id"] not in seen_ids and rec["id"] != video_id and content_count < (top_n * 0.7):
-            seen_ids.add(rec["id"])
-            unique_recommendations.append(rec)
+    for row, score in zip(content_rows, content_scores):
+        if video_ids[row] not in seen_ids and video_ids[row] != video_id and content_count < (top_n * 0.7):
+            seen_ids.add(video_ids[row])
+            selected.append((row, score))
             content_count += 1
     
     # Then add collaborative recommendations
-    for rec in svd_recommendations:
-        if rec["id"] not in seen_ids and rec["id"] != video_id and len(unique_recommendations) < top_n:
-            seen_ids.add(rec["id"])
-            unique_recommendations.append(rec)
+    for row, score in zip(collaborative_rows, collaborative_scores):
+        if video_ids[row] not in seen_ids and video_ids[row] != video_id and len(selected) < top_n:
+            seen_ids.add(video_ids[row])
+            selected.append((row, score))
     
     # If we still need more recommendations, add remaining content-based ones
-    if len(unique_recommendations) < top_n:
-        for rec in content_recommendations:
-            if rec["id"] not in seen_ids and rec["id"] != video_id and len(unique_recommendations) < top_n:
-                seen_ids.add(rec["id"])
-                unique_recommendations.append(rec)
+    if len(selected) < top_n:
+        for row, score in zip(content_rows, content_scores):
+            if video_ids[row] not in seen_ids and video_ids[row] != video_id and len(selected) < top_n:
+                seen_ids.add(video_ids[row])
+                selected.append((row, score))
     
     # Sort final recommendations by score
-    unique_recommendations = sorted(unique_recommendations, key=lambda x: x['score'], reverse=True)[:top_n]
+    return sorted(selected, key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def _merge_recommendations(video_id, idx, top_n, content_rows, content_scores, snapshot, batch_state=None):
+    """
+    Add the collaborative candidates to the scored content ones and build the final top_n dicts.
+
+    `batch_state` also shares row fields between the videos of a batch.
+    """
+    collaborative_rows, collaborative_scores = _collaborative_scores(idx, top_n, snapshot, batch_state)
+    with stage_seconds.time('merge'):
+        selected = _select_candidates(video_id, top_n, content_rows, content_scores, collaborative_rows,
+                                      collaborative_scores, snapshot.catalog)
+        # Only build dicts for the winners
+        records = None if batch_state is None else batch_state['records']
+        return [build_recommendation(row, score, snapshot.catalog, records) for row, score in selected]
+
+
+def ranked_candidates(video_id, depth, snapshot=None):
+    """
+    The best `depth` hybrid candidates of a video as compact arrays (deep pagination).
+
+    Same scoring as hybrid_recommendation with top_n=depth, without building the dicts;
+    not cached here (see pagination.py).
+
+    Args:
+        video_id (str): The source video.
+        depth (int): Number of candidates to rank.
+        snapshot (ModelSnapshot, optional): The model to read from. Defaults to the current snapshot.
+
+    Returns:
+        tuple or None: (int32 rows, float32 scores), best first, or None for unknown ids.
+    """
+    snapshot = snapshot or get_snapshot()
+    with stage_seconds.time('lookup'):
+        idx = snapshot.catalog.row_of(video_id)
+    if idx is None:
+        return None
+    content_rows, content_scores = _score_content(idx, depth, snapshot)
+    collaborative_rows, collaborative_scores = _collaborative_scores(idx, depth, snapshot)
+    with stage_seconds.time('merge'):
+        selected = _select_candidates(video_id, depth, content_rows, content_scores, collaborative_rows,
+                                      collaborative_scores, snapshot.catalog)
+    rows = np.fromiter((row for row, _ in selected), dtype=np.int32, count=len(selected))
+    scores = np.fromiter((score for _, score in selected), dtype=np.float32, count=len(selected))
+    return rows, scores
+
+
+def hybrid_recommendation(video_id, top_n=5, snapshot=None): # Pass a snapshot to pin the model version
+    """
+    Provides hybrid recommendations (content-based + collaborative filtering).
+
+
+    Args:
+        video_id (str): The ID of the video for which to generate recommendations.
+        top_n (int, optional): The number of recommendations to generate. Defaults to 5.
+        snapshot (ModelSnapshot, optional): The model to read from. Defaults to the current snapshot.
+
+
+    Returns:
+        list: A list of recommended video objects with details.
+    """
+    # Every read below goes through this one immutable snapshot, so no lock is needed
+    snapshot = snapshot or get_snapshot()
     
-    # Cache the results for future requests
-    recommendation_cache[cache_key] = {
-        'recommendations': unique_recommendations,
-        'timestamp': current_time
-    }
+    def compute():
+        with stage_seconds.time('lookup'):
+            idx = snapshot.catalog.row_of(video_id)
+        if idx is None:
+            return [{"error": "Video ID not found!"}]
+        
+        # Content-Based Recommendations
+        content_rows, content_scores = _score_content(idx, top_n, snapshot)
+        return _merge_recommendations(video_id, idx, top_n, content_rows, content_scores, snapshot)
+    
+    # Check cache first; concurrent misses on the same key compute once (single-flight).
+    # Errors, and results computed on a snapshot that was replaced meanwhile, are not cached.
+    return recommendation_cache.get_or_compute(
+        f"{video_id}_{top_n}", compute, ttl=CACHE_EXPIRATION,
+        cacheable=lambda recommendations: snapshot is _snapshot and not (recommendations and "error" in recommendations[0]))
+
+
+def batch_hybrid_recommendation(video_ids, top_n=5, snapshot=None, block_size=BATCH_BLOCK_SIZE):
+    """
+    Hybrid recommendations for many videos, yielded one video at a time.
+
+    Uncached ids are scored in blocks: the content candidates of a whole block are
+    gathered from the neighbor index as one (block x candidates) matrix and boosted
+    with shared category/channel arrays, so only the final merge runs per video.
+    Results are produced lazily, keeping memory bounded by the block size.
+
+    Args:
+        video_ids (list): The video IDs to recommend for (duplicates allowed).
+        top_n (int, optional): The number of recommendations per video. Defaults to 5.
+        snapshot (ModelSnapshot, optional): The model to read from. Defaults to the current snapshot.
+        block_size (int, optional): How many videos are scored per matrix operation.
+
+    Yields:
+        tuple: (video_id, list of recommendation dicts, or [{"error": ...}] for unknown ids)
+    """
+    snapshot = snapshot or get_snapshot()
+    catalog = snapshot.catalog
     
-    # Clean up old cache entries (only do this periodically to reduce overhead)
-    if len(recommendation_cache) > MAX_CACHE_SIZE or hash(cache_key) % 10 == 0:
-        # Sort cache entries by timestamp (oldest first)
-        sorted_cache = sorted(recommendation_cache.items(), key=lambda x: x[1]['timestamp'])
+    for block_start in range(0, len(video_ids), block_size):
+        block_ids = video_ids[block_start:block_start + block_size]
         
-        # Remove expired entries
-        for key, entry in sorted_cache:
-            if current_time - entry['timestamp'] > CACHE_EXPIRATION:
-                del recommendation_cache[key]
+        results = {}
+        pending = []
+        for video_id in block_ids:
+            if video_id in results:
+                continue
+            cached = recommendation_cache.get(f"{video_id}_{top_n}")
+            if cached is not None:
+                results[video_id] = cached
+            elif catalog.row_of(video_id) is None:
+                results[video_id] = [{"error": "Video ID not found!"}]
+            else:
+                results[video_id] = None
+                pending.append(video_id)
         
-        # If still too many entries, remove oldest ones
-        if len(recommendation_cache) > MAX_CACHE_SIZE:
-            # Keep only the newest 80% of entries
-            entries_to_keep = int(MAX_CACHE_SIZE * 0.8)
-            keys_to_remove = [k for k, _ in sorted_cache[:-entries_to_keep]]
-            for key in keys_to_remove:
-                if key in recommendation_cache:  # Check again in case it was already removed
-                    del recommendation_cache[key]
-    
-    return unique_recommendations
\ No newline at end of file
+        if pending:
+            rows = np.array([catalog.row_of(video_id) for video_id in pending], dtype=np.int64)
+            content_rows, content_scores = _score_content(rows, top_n, snapshot)
+            # Shared per block so memory stays bounded by the block size
+            batch_state = {'collaborative': {}, 'records': {},
+                           'als': dict(zip(rows.tolist(), _als_candidates(rows, top_n, snapshot)))}
+            for i, video_id in enumerate(pending):
+                valid = np.isfinite(content_scores[i])
+                recommendations = _merge_recommendations(
+                    video_id, rows[i], top_n, content_rows[i][valid], content_scores[i][valid], snapshot, batch_state)
+                if snapshot is _snapshot:
+                    recommendation_cache.put(f"{video_id}_{top_n}", recommendations, ttl=CACHE_EXPIRATION)
+                results[video_id] = recommendations
+        
+        for video_id in block_ids:
+            yield video_id, results[video_id]
@@ -3,24 +3,37 @@
  * This service communicates with the Python recommendation engine API
  */
 
+// Explore-feed session for this page load: the server keeps the random order fixed per session,
+// so successive pages never repeat videos
+const exploreSession = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
 /**
  * Get recommended videos based on a video ID or get general recommendations
  * @param {string|null} videoId - The ID of the video to base recommendations on (optional)
  * @param {number} limit - The number of recommendations to retrieve
  * @param {number} page - The page number for pagination (default: 1)
+ * @param {string|null} cursor - `pagination.next_cursor` of the previous page; replaces videoId and page
  * @returns {Promise<Object>} - A promise that resolves to an object with results and pagination info
  */
-export const getRecommendedVideos = async (videoId = null, limit = 8, page = 1) => {
+export const getRecommendedVideos = async (videoId = null, limit = 8, page = 1, cursor = null) => {
   try {
     // Build the API URL with query parameters
     const url = new URL('http://localhost:5000/api/recommendations');
     
     // Add query parameters if provided
-    if (videoId) {
-      url.searchParams.append('video_id', videoId);
+    if (cursor) {
+      // The cursor already names the video (or explore session) and the position of the page
+      url.searchParams.append('cursor', cursor);
+    } else {
+      if (videoId) {
+        url.searchParams.append('video_id', videoId);
+      } else {
+        // Only the explore feed needs the session; it is part of the server's cache key
+        url.searchParams.append('session', exploreSession);
+      }
+      url.searchParams.append('page', page.toString());
     }
     url.searchParams.append('limit', limit.toString());
-    url.searchParams.append('page', page.toString());
     
     // Make the API request with a timeout to prevent hanging
     const controller = new AbortController();
@@ -50,6 +63,34 @@ export const getRecommendedVideos = async (videoId = null, limit = 8, page = 1)
   }
 };
 
+/**
+ * Get the personalized "for you" feed of a user, based on the videos they watched
+ * @param {string} userId - The ID of the user
+ * @param {number} limit - The number of recommendations to retrieve
+ * @param {number} page - The page number for pagination (default: 1)
+ * @returns {Promise<Object>} - A promise that resolves to an object with results and pagination info
+ */
+export const getForYouRecommendations = async (userId, limit = 8, page = 1) => {
+  try {
+    const url = new URL('http://localhost:5000/api/recommendations/for-you');
+    url.searchParams.append('user_id', userId);
+    url.searchParams.append('limit', limit.toString());
+    url.searchParams.append('page', page.toString());
+    
+    const response = await fetch(url);
+    
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`);
+    }
+    
+    const data = await response.json();
+    return data && data.results ? data : { results: [], pagination: { page: 1, limit, total_results: 0 } };
+  } catch (error) {
+    console.error('Error fetching personalized recommendations:', error);
+    return { results: [], pagination: { page: 1, limit, total_results: 0 } };
+  }
+};
+
 /**
  * Track when a user views a video
  * @param {string} userId - The ID of the user
@@ -0,0 +1,270 @@
+"""
+Keyword search over an impact-ordered inverted index of the TF-IDF matrix.
+
+The index is the transpose of the TF-IDF matrix: one posting list per term, holding the
+rows that contain it sorted by their TF-IDF weight (impact), highest first. A query is
+vectorized with the build's TF-IDF, so the text score of a video is the cosine similarity
+``sum_t q_t * w_td`` of the query and its row.
+
+Top-k uses the threshold algorithm for impact-ordered lists (the max-score bound WAND
+uses): the posting lists of the query terms are read in growing blocks, accumulating a
+partial score per row and which terms it was seen in. A row's score is then bounded below
+by its partial score and above by adding the next unread impact of the lists it was not
+seen in yet, and an unread row scores at most ``max_boost * sum_t q_t * w_t(next)``.
+Reading stops once that bound and the upper bounds of all but a few rows fall below the
+k-th best lower bound; those few rows are scored exactly from their TF-IDF rows. Common
+terms have long lists, but only their high-impact prefix is read, so the work grows with
+the number of good matches rather than with the catalog.
+
+Scores combine the text score with the engagement boost and, when searching from a video
+(``video_id``), the same channel/category boosts as recommendations.
+"""
+import os
+
+import numpy as np
+
+# Weight of the engagement boost: a video with an engagement rate of ENGAGEMENT_REFERENCE or
+# more scores (1 + SEARCH_ENGAGEMENT_WEIGHT) times its text score
+SEARCH_ENGAGEMENT_WEIGHT = float(os.environ.get('YUGI_SEARCH_ENGAGEMENT_WEIGHT', 0.5))
+ENGAGEMENT_REFERENCE = 0.1  # About the 99th percentile of the catalog's engagement rates
+# Postings read per query term in the first round; every further round reads twice as many
+FIRST_BLOCK = 32
+# Reading stops once at most this many rows per result (or MIN_RESCORED) can still make the top k;
+# they are then scored exactly
+RESCORE_FACTOR = 4
+MIN_RESCORED = 64
+# Query terms tracked per row (bits of a uint64)
+MAX_INDEXED_TERMS = 64
+# Deepest result a query can page to
+MAX_SEARCH_RESULTS = int(os.environ.get('YUGI_MAX_SEARCH_RESULTS', 200))
+MAX_QUERY_LENGTH = 256
+
+
+class SearchIndex:
+    """
+    Posting lists of every term present in the TF-IDF matrix, in descending impact order.
+
+    ``terms`` holds the sorted TF-IDF columns that occur; the postings of ``terms[i]`` are
+    ``docs[offsets[i]:offsets[i + 1]]`` (rows) and ``impacts`` (their TF-IDF weights).
+    """
+
+    def __init__(self, terms, offsets, docs, impacts):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.impacts = impacts
+
+    @property
+    def nbytes(self):
+        return self.terms.nbytes + self.offsets.nbytes + self.docs.nbytes + self.impacts.nbytes
+
+    def postings(self, columns):
+        """(start, end) offsets of the posting list of each TF-IDF column (empty for absent terms)."""
+        if not len(self.terms):
+            return np.zeros(len(columns), dtype=np.int64), np.zeros(len(columns), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.terms, columns), len(self.terms) - 1)
+        present = self.terms[positions] == columns
+        starts = np.where(present, self.offsets[positions], 0)
+        ends = np.where(present, self.offsets[positions + 1], 0)
+        return starts, ends
+
+    def appended(self, tfidf_rows, start):
+        """
+        A new index with the postings of `tfidf_rows` (rows ``start:`` of the matrix) added.
+
+        The new rows are inverted on their own, and each of their postings is placed by binary
+        search inside its term's list, after the existing postings of equal impact (they have
+        lower rows, as in a full build). Only the new postings are sorted; the existing ones are
+        copied once.
+        """
+        new = build_search_index(tfidf_rows)
+        terms = np.union1d(self.terms, new.terms).astype(np.int64)
+        # Where each new posting goes in the existing flat arrays (a term new to the index goes where it sorts)
+        insert_at = np.asarray(self.offsets)[np.searchsorted(self.terms, new.terms)]
+        old_starts, old_ends = self.postings(new.terms)
+        positions = np.empty(len(new.docs), dtype=np.int64)
+        for i in range(len(new.terms)):
+            begin, end = new.offsets[i], new.offsets[i + 1]
+            impacts = np.asarray(self.impacts[old_starts[i]:old_ends[i]])
+            positions[begin:end] = insert_at[i] + np.searchsorted(-impacts, -new.impacts[begin:end], side='right')
+        lengths = np.zeros(len(terms), dtype=np.int64)
+        lengths[np.searchsorted(terms, self.terms)] += np.diff(self.offsets)
+        lengths[np.searchsorted(terms, new.terms)] += np.diff(new.offsets)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return SearchIndex(terms, offsets, np.insert(np.asarray(self.docs), positions, new.docs + np.int32(start)),
+                           np.insert(np.asarray(self.impacts), positions, new.impacts))
+
+
+def build_search_index(tfidf_matrix):
+    """
+    Invert a TF-IDF matrix into impact-ordered posting lists.
+
+    Args:
+        tfidf_matrix (scipy.sparse.csr_matrix): (N, F) TF-IDF rows.
+
+    Returns:
+        SearchIndex
+    """
+    csc = tfidf_matrix.tocsc()
+    lengths = np.diff(csc.indptr)
+    columns = np.repeat(np.arange(csc.shape[1], dtype=np.int64), lengths)
+    # Grouped by term, highest weight first (ties by row, so builds are reproducible)
+    order = np.lexsort((csc.indices, -csc.data, columns))
+    present = np.flatnonzero(lengths)
+    offsets = np.zeros(len(present) + 1, dtype=np.int64)
+    np.cumsum(lengths[present], out=offsets[1:])
+    return SearchIndex(present.astype(np.int64), offsets, csc.indices[order].astype(np.int32),
+                       csc.data[order].astype(np.float32))
+
+
+def save_search_index(directory, index):
+    for name in ('terms', 'offsets', 'docs', 'impacts'):
+        np.save(os.path.join(directory, f'search_{name}.npy'), getattr(index, name))
+
+
+def load_search_index(directory):
+    """Memory-map the search index of a build, or None when it has none (builds made before search)."""
+    if not os.path.exists(os.path.join(directory, 'search_terms.npy')):
+        return None
+    return SearchIndex(*(np.load(os.path.join(directory, f'search_{name}.npy'), mmap_mode='r')
+                         for name in ('terms', 'offsets', 'docs', 'impacts')))
+
+
+def _text_scores(rows, columns, weights, tfidf_matrix):
+    """Dot products of TF-IDF `rows` with the query (sorted `columns`, their `weights`), read row by row."""
+    indptr = tfidf_matrix.indptr
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    # Flat positions of every entry of the gathered rows
+    entry_rows = np.repeat(np.arange(len(rows)), counts)
+    entries = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + starts[entry_rows]
+    entry_columns = tfidf_matrix.indices[entries]
+    positions = np.minimum(np.searchsorted(columns, entry_columns), len(columns) - 1)
+    contributions = np.where(columns[positions] == entry_columns,
+                             tfidf_matrix.data[entries] * weights[positions], 0.0)
+    return np.bincount(entry_rows, weights=contributions, minlength=len(rows))
+
+
+def _boost(rows, scores, snapshot, source):
+    """Engagement boost, then the recommendation boosts relative to the `source` row (if any)."""
+    from src.services.recommendation import _apply_boosts
+
+    engagement = np.minimum(snapshot.catalog.engagement_rate[rows] / ENGAGEMENT_REFERENCE, 1.0)
+    scores = scores * (1.0 + SEARCH_ENGAGEMENT_WEIGHT * engagement)
+    if source is not None:
+        scores = _apply_boosts(rows, scores, source, snapshot.content_category_matrix, snapshot.catalog)
+    return scores
+
+
+def _max_boost(snapshot, source):
+    """Upper bound of the factor _boost multiplies a text score by."""
+    bound = 1.0 + SEARCH_ENGAGEMENT_WEIGHT
+    if source is not None:
+        # Same channel x same category x best compatibility with the source's category
+        category_row = snapshot.content_category_matrix[snapshot.catalog.category_codes[source]]
+        bound *= 1.5 * 1.3 * float(category_row.max())
+    return bound
+
+
+def query_vector(query, snapshot):
+    """TF-IDF columns (sorted) and weights of a query string, vectorized like the catalog."""
+    vector = snapshot.tfidf.transform([query]).tocsr()
+    vector.sort_indices()
+    return vector.indices.astype(np.int64), vector.data.astype(np.float64)
+
+
+def search(query, k, snapshot, source=None):
+    """
+    The `k` best videos for a keyword query.
+
+    Args:
+        query (str): Free text; tokenized like the catalog's TF-IDF.
+        k (int): Number of results.
+        snapshot (ModelSnapshot): A snapshot with the TF-IDF loaded ('content' stage or later).
+        source (int, optional): Row of the video being watched, for the channel/category boosts.
+
+    Returns:
+        tuple: (int64 rows, float64 scores) best first (ties by row), and stats: query terms,
+        postings read, rows scored exactly and rounds.
+    """
+    columns, weights = query_vector(query, snapshot)
+    stats = {'terms': len(columns), 'postings': 0, 'scored': 0, 'rounds': 0}
+    if len(columns) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), stats
+    index = snapshot.search_index
+    if index is None or len(columns) > MAX_INDEXED_TERMS:
+        # Builds without an index, and queries with more terms than the bitmask holds (rare: q is at
+        # most MAX_QUERY_LENGTH characters)
+        rows, scores = _exhaustive(columns, weights, k, snapshot, source)
+        stats['scored'] = len(snapshot.catalog)
+        return rows, scores, stats
+
+    positions, ends = index.postings(columns)
+    if not (ends > positions).any():
+        return np.empty(0, dtype=np.int64), np.empty(0), stats
+    max_boost = _max_boost(snapshot, source)
+    term_bits = np.left_shift(np.uint64(1), np.arange(len(columns), dtype=np.uint64))
+    # Accumulators of every row read so far: text score from the postings read, and which terms they came from
+    rows, partial, seen = np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.uint64)
+    block = FIRST_BLOCK
+    while True:
+        stats['rounds'] += 1
+        stops = np.minimum(positions + block, ends)
+        lengths = stops - positions
+        stats['postings'] += int(lengths.sum())
+        rows = np.concatenate([rows] + [index.docs[start:stop] for start, stop in zip(positions, stops)])
+        partial = np.concatenate([partial] + [weight * index.impacts[start:stop]
+                                              for weight, start, stop in zip(weights, positions, stops)])
+        seen = np.concatenate([seen, np.repeat(term_bits, lengths)])
+        positions = stops
+        rows, partial, seen = _merge_postings(rows, partial, seen)
+
+        # Weight of the next unread posting of every list (0 once a list is exhausted)
+        remaining = positions < ends
+        frontier = np.where(remaining, weights * index.impacts[np.where(remaining, positions, 0)], 0.0)
+        # A row's text score is at least `partial` and at most `partial` plus the frontier of the lists it
+        # has not been read from yet; the boosts are per row, so they scale both bounds
+        missing = np.zeros(len(rows))
+        for bit, bound in zip(term_bits[remaining], frontier[remaining]):
+            missing += np.where(seen & bit, 0.0, bound)
+        boost = _boost(rows, np.ones(len(rows)), snapshot, source)
+        lower, upper = partial * boost, (partial + missing) * boost
+        if not remaining.any():
+            candidates = np.argsort(-lower, kind='stable')[:k]
+            break
+        if len(rows) >= k:
+            kth = -np.partition(-lower, k - 1)[k - 1]
+            # Done when no unread row can beat the k-th lower bound and few read rows still can
+            candidates = np.flatnonzero(upper >= kth)
+            if max_boost * frontier.sum() <= kth and len(candidates) <= max(RESCORE_FACTOR * k, MIN_RESCORED):
+                break
+        block *= 2
+
+    # Exact scores of the rows that can still make the top k, from their TF-IDF rows
+    rows = rows[candidates]
+    stats['scored'] = len(rows)
+    scores = _boost(rows, _text_scores(rows, columns, weights, snapshot.tfidf_matrix), snapshot, source)
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order], stats
+
+
+def _merge_postings(rows, partial, seen):
+    """Sum the partial scores and OR the term bits of repeated rows (rows come out sorted)."""
+    order = np.argsort(rows, kind='stable')
+    rows, partial, seen = rows[order], partial[order], seen[order]
+    starts = np.flatnonzero(np.concatenate([[True], rows[1:] != rows[:-1]]))
+    return rows[starts].astype(np.int64), np.add.reduceat(partial, starts), np.bitwise_or.reduceat(seen, starts)
+
+
+def _exhaustive(columns, weights, k, snapshot, source):
+    """Score every row (builds without a search index, and the benchmark's reference)."""
+    from scipy import sparse
+
+    tfidf_matrix = snapshot.tfidf_matrix
+    query = sparse.csc_matrix((weights, columns, [0, len(columns)]), shape=(tfidf_matrix.shape[1], 1))
+    scores = (tfidf_matrix @ query).toarray().ravel()
+    rows = np.flatnonzero(scores > 0)
+    scores = _boost(rows, scores[rows], snapshot, source)
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
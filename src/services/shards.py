@@ -0,0 +1,692 @@
+"""
+Sharded catalog with scatter-gather top-k.
+
+A build can be split into N shards by a hash of the video id. Every shard directory holds
+its rows of the catalog columns, the TF-IDF matrix (and its posting lists, see search.py)
+and the embeddings, plus the global row number of each (rows keep their order, so ties
+still break by global row):
+
+    python -m src.services.shards split --shards 4 [--out data/artifacts]
+
+Every shard is served by its own process over a socket, so shards can run on other nodes as
+long as each one has its directory. Connections are HMAC-authenticated with YUGI_SHARD_AUTHKEY
+(required: shards and coordinators refuse to start without it), and messages use a fixed
+format rather than pickle: a length-prefixed JSON header, then the raw bytes of its arrays.
+
+    python -m src.services.shards serve --shard-dir data/artifacts/<build>/shards-4/0 [--port 7100]
+
+The Coordinator answers hybrid recommendations without holding the catalog:
+
+1. lookup: the shard owning the video (by hash) returns its TF-IDF row, embedding,
+   channel and category;
+2. content: every shard returns its own top-k TF-IDF and embedding neighbors of those
+   query vectors; the coordinator merges them into the global top-k of both lists, then
+   blends and boosts them exactly like recommendation._score_content;
+3. engagement: every shard returns its best rows of the video's channel and category
+   and of the whole catalog; merged, they replace the engagement-ranked collaborative
+   candidates (the ALS model is not sharded);
+4. records: the fields of the selected videos, from their shards.
+
+With YUGI_SHARDS set, the server ranks videos with a Coordinator (see get_coordinator and
+pagination.get_ranking) while their build is the one it serves.
+
+Each shard's top-k contains every row of the global top-k that it owns, so the merged
+lists are exact: the content ranking equals that of an unsharded process scoring without
+a top-N table, up to ties and the approximation of its ANN index.
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from src.services.artifacts import (DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, STRING_COLUMNS, _load_string_column,
+                                    _save_string_column, load_artifacts)
+from src.services.catalog import Catalog
+from src.services.fragments import stable_hash
+from src.services.neighbors import top_k_row
+from src.services.search import build_search_index, load_search_index, save_search_index
+
+# Secret shared by the shards and their coordinators (no default: a known key would let anyone in)
+SHARD_AUTHKEY = os.environ.get('YUGI_SHARD_AUTHKEY')
+# Comma-separated host:port addresses of running shards
+SHARD_ADDRESSES = os.environ.get('YUGI_SHARDS', '')
+SHARD_MANIFEST = 'shard.json'
+# Operations a shard serves
+SHARD_OPS = ('info', 'lookup', 'content', 'engagement', 'records')
+# Header key standing for an array whose bytes follow the header (see _encode)
+ARRAY_KEY = '__ndarray__'
+
+_coordinator = None
+_coordinator_pid = None
+_coordinator_lock = threading.Lock()
+
+
+class ShardError(Exception):
+    """Raised when a shard reports an error or cannot be reached."""
+
+
+def shard_authkey(authkey=None):
+    """The key shards and coordinators authenticate each other with (defaults to YUGI_SHARD_AUTHKEY), as bytes."""
+    authkey = authkey or SHARD_AUTHKEY
+    if not authkey:
+        raise ShardError("Set YUGI_SHARD_AUTHKEY to a secret shared by the shards and their coordinators")
+    return authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+
+
+def shard_of(video_id, n_shards):
+    """Shard of a video id, the same on every process and node (see fragments.stable_hash)."""
+    return stable_hash(video_id) % n_shards
+
+
+def split_build(out_dir=DEFAULT_ARTIFACT_DIR, n_shards=2, csv_path=DEFAULT_CSV_PATH):
+    """
+    Split the latest build into `n_shards` shard directories under ``<build>/shards-<n_shards>``.
+
+    Args:
+        out_dir (str): Artifact directory holding the build.
+        n_shards (int): Number of shards.
+        csv_path (str): CSV the build must be current with.
+
+    Returns:
+        list: The shard directories, by shard number.
+    """
+    artifacts = load_artifacts(out_dir, csv_path)
+    build_dir = artifacts['build_dir']
+    columns, tfidf_matrix, embeddings = artifacts['columns'], artifacts['tfidf_matrix'], artifacts['embeddings']
+    engagement = np.asarray(artifacts['numeric']['engagement_rate'])
+    assignment = np.fromiter((shard_of(video_id, n_shards) for video_id in columns['v_id'].to_list()),
+                             dtype=np.int64, count=len(engagement))
+
+    root = os.path.join(build_dir, f'shards-{n_shards}')
+    tmp_root = f'{root}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    for shard in range(n_shards):
+        # Global rows stay in catalog order, so ties still break by global row inside a shard
+        rows = np.flatnonzero(assignment == shard)
+        shard_dir = os.path.join(tmp_root, str(shard))
+        os.makedirs(shard_dir)
+        for name in STRING_COLUMNS:
+            _save_string_column(shard_dir, name, [columns[name][row] for row in rows])
+        np.save(os.path.join(shard_dir, 'rows.npy'), rows)
+        np.save(os.path.join(shard_dir, 'col_engagement_rate.npy'), engagement[rows])
+        shard_tfidf = tfidf_matrix[rows]
+        np.save(os.path.join(shard_dir, 'tfidf_data.npy'), shard_tfidf.data)
+        np.save(os.path.join(shard_dir, 'tfidf_indices.npy'), shard_tfidf.indices)
+        np.save(os.path.join(shard_dir, 'tfidf_indptr.npy'), shard_tfidf.indptr)
+        # Posting lists of the shard's rows: a query scores only the rows sharing a term with it
+        save_search_index(shard_dir, build_search_index(shard_tfidf))
+        np.save(os.path.join(shard_dir, 'embeddings.npy'), np.ascontiguousarray(embeddings[rows]))
+        with open(os.path.join(shard_dir, SHARD_MANIFEST), 'w') as f:
+            json.dump({
+                'shard': shard,
+                'n_shards': n_shards,
+                'version': os.path.basename(build_dir),
+                'n_rows': len(rows),
+                'total_rows': len(engagement),
+                'tfidf_shape': [len(rows), tfidf_matrix.shape[1]],
+                # The unsharded neighbor index keeps this many neighbors per video, which caps its candidates
+                'neighbor_k': int(artifacts['neighbor_index'].k),
+            }, f, indent=2)
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp_root, root)
+    print(f"Split {len(engagement)} videos of {build_dir} into {n_shards} shards -> {root}")
+    return [os.path.join(root, str(shard)) for shard in range(n_shards)]
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB (a launched shard's peak RSS includes its parent's)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def _encode(message):
+    """
+    Serialize a message of dicts, lists, scalars and numeric arrays.
+
+    The frame is a 4-byte big-endian header length, the JSON header (arrays replaced by their
+    dtype and shape) and the arrays' raw bytes, in header order.
+    """
+    buffers = []
+
+    def encode(value):
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                raise TypeError("Object arrays cannot be sent to or from a shard")
+            buffers.append(np.ascontiguousarray(value).tobytes())
+            return {ARRAY_KEY: [value.dtype.str, list(value.shape)]}
+        if isinstance(value, dict):
+            return {key: encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(item) for item in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    header = json.dumps(encode(message)).encode('utf-8')
+    return b''.join([len(header).to_bytes(4, 'big'), header] + buffers)
+
+
+def _decode(data):
+    """
+    A message serialized by _encode; its arrays are read-only views of `data`.
+
+    Raises:
+        ValueError: The frame is malformed.
+    """
+    length = int.from_bytes(data[:4], 'big')
+    offset = 4 + length
+
+    def decode(value):
+        nonlocal offset
+        if isinstance(value, dict):
+            if ARRAY_KEY in value:
+                dtype, shape = np.dtype(value[ARRAY_KEY][0]), value[ARRAY_KEY][1]
+                if dtype.hasobject:
+                    raise ValueError("Object arrays are not accepted")
+                array = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+                offset += array.nbytes
+                return array
+            return {key: decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [decode(item) for item in value]
+        return value
+
+    message = decode(json.loads(data[4:4 + length]))
+    if offset != len(data):
+        raise ValueError("Trailing bytes after the message")
+    return message
+
+
+def _no_delay(conn):
+    """
+    Disable Nagle's algorithm on a connection: large messages go out as a header and a body,
+    and the body would wait for the delayed ACK of the header (~40ms).
+    """
+    sock = socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    finally:
+        # fromfd duplicated the descriptor; the option stays on the shared socket
+        sock.close()
+    return conn
+
+
+class Shard:
+    """The part of the catalog and model one shard process serves (global rows in, global rows out)."""
+
+    def __init__(self, shard_dir):
+        from scipy import sparse
+
+        with open(os.path.join(shard_dir, SHARD_MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(shard_dir, name), mmap_mode='r')
+
+        self.rows = load('rows.npy')
+        self.catalog = Catalog({name: _load_string_column(shard_dir, name) for name in STRING_COLUMNS},
+                               load('col_engagement_rate.npy'))
+        self.tfidf_matrix = sparse.csr_matrix(
+            (load('tfidf_data.npy'), load('tfidf_indices.npy'), load('tfidf_indptr.npy')),
+            shape=tuple(self.manifest['tfidf_shape']), copy=False)
+        self.search_index = load_search_index(shard_dir)
+        self.embeddings = load('embeddings.npy')
+
+    def _local(self, row):
+        """Local row of a global row, or None when another shard holds it."""
+        position = int(np.searchsorted(self.rows, row))
+        return position if position < len(self.rows) and self.rows[position] == row else None
+
+    def _fields(self, local_rows):
+        catalog = self.catalog
+        return {
+            'id': [catalog.video_ids[row] for row in local_rows],
+            'channel': [catalog.channel_of(row) for row in local_rows],
+            'channel_id': [catalog.channel_id_of(row) for row in local_rows],
+            'category': [catalog.category_of(row) for row in local_rows],
+        }
+
+    def info(self):
+        return {**self.manifest, 'rss_mb': _rss_mb()}
+
+    def lookup(self, video_id):
+        """Query vectors and boost fields of a video of this shard, or None."""
+        local = self.catalog.row_of(video_id)
+        if local is None:
+            return None
+        tfidf_row = self.tfidf_matrix[local]
+        return {
+            'row': int(self.rows[local]),
+            'tfidf_indices': np.asarray(tfidf_row.indices),
+            'tfidf_data': np.asarray(tfidf_row.data),
+            'embedding': np.asarray(self.embeddings[local]),
+            **{name: values[0] for name, values in self._fields([local]).items()},
+        }
+
+    def content(self, query, count, semantic):
+        """
+        This shard's `count` best TF-IDF (and, if `semantic`, embedding) neighbors of a query video.
+
+        Returns:
+            dict: Global rows of the union of both lists with both similarities and their boost
+            fields, and the positions of each list's rows in the union (best first).
+        """
+        exclude = self._local(query['row'])
+        # Cosine similarities from the postings of the query's terms (rows sharing no term score 0),
+        # gathered in one pass rather than a slice per term
+        starts, ends = self.search_index.postings(query['tfidf_indices'])
+        lengths = ends - starts
+        entries = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        weights = np.repeat(query['tfidf_data'].astype(np.float64), lengths)
+        tfidf_scores = np.bincount(self.search_index.docs[entries],
+                                   weights=weights * self.search_index.impacts[entries], minlength=len(self.rows))
+        semantic_scores = self.embeddings @ query['embedding']
+        if exclude is not None:
+            tfidf_scores[exclude] = semantic_scores[exclude] = -np.inf
+        count = min(count, len(self.rows) - (exclude is not None))
+        tfidf_top = top_k_row(tfidf_scores, count) if count > 0 else np.empty(0, dtype=np.int64)
+        semantic_top = top_k_row(semantic_scores, count) if semantic and count > 0 else np.empty(0, dtype=np.int64)
+        local_rows, positions = np.unique(np.concatenate([tfidf_top, semantic_top]), return_inverse=True)
+        return {
+            'rows': np.asarray(self.rows[local_rows]),
+            'tfidf': tfidf_scores[local_rows].astype(np.float64),
+            'semantic': semantic_scores[local_rows].astype(np.float64),
+            'tfidf_top': positions[:len(tfidf_top)],
+            'semantic_top': positions[len(tfidf_top):],
+            **self._fields(local_rows),
+        }
+
+    def engagement(self, source, n):
+        """
+        This shard's `n` most engaging rows of the source's channel and category and overall.
+
+        Returns:
+            dict: list name -> (global rows, engagement rates, group size), and the boost fields of those rows.
+        """
+        catalog = self.catalog
+        if source['channel'] is not None:
+            channel_rows = catalog.rows_by_channel[catalog.code_of('channel_name', source['channel'])]
+        else:
+            channel_rows = catalog.rows_by_channel_id[catalog.code_of('channel_id', source['channel_id'])]
+        category_rows = catalog.rows_by_category[catalog.category_code_of.get(source['category'], -1)]
+        lists = {'channel': channel_rows, 'category': category_rows, 'overall': catalog.ranked_rows[0]}
+        local_rows = np.unique(np.concatenate([rows[:n] for rows in lists.values()]).astype(np.int64))
+        return {
+            'lists': {name: (np.asarray(self.rows[rows[:n]]), catalog.engagement_rate[rows[:n]], len(rows))
+                      for name, rows in lists.items()},
+            'rows': np.asarray(self.rows[local_rows]),
+            **self._fields(local_rows),
+        }
+
+    def records(self, rows):
+        """Response fields of global `rows` held by this shard (see Catalog.record)."""
+        return [self.catalog.record(self._local(row)) for row in rows]
+
+
+def serve(shard_dir, host='127.0.0.1', port=0, authkey=None):
+    """Serve a shard over a socket until the process is stopped; one thread per coordinator connection."""
+    authkey = shard_authkey(authkey)
+    shard = Shard(shard_dir)
+    listener = Listener((host, port), authkey=authkey)
+    host, port = listener.address
+    # The launcher reads the address from this line (port 0 picks a free port)
+    print(f"Shard {shard.manifest['shard']}/{shard.manifest['n_shards']} ({shard.manifest['n_rows']} videos) "
+          f"listening on {host}:{port}", flush=True)
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    data = conn.recv_bytes()
+                except (EOFError, OSError):
+                    return
+                try:
+                    op, args = _decode(data)
+                    if op not in SHARD_OPS:
+                        raise ValueError(f"Unknown shard operation {op!r}")
+                    reply = _encode(['ok', getattr(shard, op)(*args)])
+                except Exception as e:
+                    reply = _encode(['error', f"{type(e).__name__}: {e}"])
+                conn.send_bytes(reply)
+
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, AuthenticationError) as e:
+            # A client that fails the authentication handshake, or drops during it
+            print(f"Rejected shard connection: {e}")
+            continue
+        threading.Thread(target=handle, args=(_no_delay(conn),), daemon=True).start()
+
+
+class ShardClient:
+    """Pooled connections to one shard; `call` is thread-safe."""
+
+    def __init__(self, address, authkey=None):
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.authkey = shard_authkey(authkey)
+        self._idle = queue.LifoQueue()
+
+    def call(self, op, *args):
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = _no_delay(Client(self.address, authkey=self.authkey))
+            conn.send_bytes(_encode([op, args]))
+            status, result = _decode(conn.recv_bytes())
+        except (OSError, EOFError, ValueError, AuthenticationError) as e:
+            if conn is not None:
+                conn.close()
+            raise ShardError(f"Shard {self.address[0]}:{self.address[1]} failed: {e or type(e).__name__}") from None
+        self._idle.put(conn)
+        if status != 'ok':
+            raise ShardError(f"Shard {self.address[0]}:{self.address[1]}: {result}")
+        return result
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+class _Rows:
+    """
+    Video ids, boost fields and shards of the global rows one request has seen.
+
+    Quacks like the catalog for _select_candidates (``video_ids[row]``).
+    """
+
+    def __init__(self):
+        self.video_ids, self.channel, self.channel_id, self.category, self.shard = {}, {}, {}, {}, {}
+
+    def add(self, response, shard):
+        rows = response['rows'].tolist()
+        for name, values in (('video_ids', response['id']), ('channel', response['channel']),
+                             ('channel_id', response['channel_id']), ('category', response['category'])):
+            getattr(self, name).update(zip(rows, values))
+        self.shard.update(dict.fromkeys(rows, shard))
+
+    def fields(self, rows, name):
+        values = getattr(self, name)
+        return np.array([values[row] for row in rows.tolist()], dtype=object)
+
+
+class Coordinator:
+    """
+    Scatter-gather hybrid recommendations over running shards.
+
+    Args:
+        addresses (list): ``host:port`` of every shard, in any order (defaults to YUGI_SHARDS).
+        authkey (str, optional): Key of the shards (defaults to YUGI_SHARD_AUTHKEY).
+    """
+
+    def __init__(self, addresses=None, authkey=None):
+        addresses = addresses or [address for address in SHARD_ADDRESSES.split(',') if address]
+        clients = [ShardClient(address, authkey) for address in addresses]
+        infos = [client.call('info') for client in clients]
+        n_shards = infos[0]['n_shards'] if infos else 0
+        if sorted(info['shard'] for info in infos) != list(range(n_shards)) or \
+                len({(info['version'], info['n_shards']) for info in infos}) != 1:
+            raise ShardError(f"Shards {addresses} are not the {n_shards} shards of one build")
+        self.clients = [client for _, client in sorted(zip([info['shard'] for info in infos], clients),
+                                                       key=lambda pair: pair[0])]
+        self.version = infos[0]['version']
+        self.neighbor_k = infos[0]['neighbor_k']
+        self.pool = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix='scatter')
+
+    def close(self):
+        self.pool.shutdown()
+        for client in self.clients:
+            client.close()
+
+    def scatter(self, op, *args):
+        """Run `op` on every shard in parallel; results by shard number."""
+        return list(self.pool.map(lambda client: client.call(op, *args), self.clients))
+
+    def lookup(self, video_id):
+        return self.clients[shard_of(video_id, len(self.clients))].call('lookup', video_id)
+
+    def content_ranking(self, video_id, top_n, rows=None):
+        """
+        The boosted content candidates of a video, best first: recommendation._score_content
+        of an unsharded snapshot without a top-N table.
+
+        Args:
+            video_id (str): The source video.
+            top_n (int): Number of candidates.
+            rows (_Rows, optional): Collects the fields of the rows the shards return.
+
+        Returns:
+            tuple or None: (int64 global rows, float64 scores, the source's lookup), or None for unknown ids.
+        """
+        from src.services.recommendation import SEMANTIC_WEIGHT
+
+        source = self.lookup(video_id)
+        if source is None:
+            return None
+        if rows is None:
+            rows = _Rows()
+        # The unsharded neighbor index keeps neighbor_k rows per video, the video itself first
+        count = min(top_n * 2 - 1, self.neighbor_k - 1)
+        semantic = SEMANTIC_WEIGHT > 0 and count > 0
+        responses = self.scatter('content', source, count, semantic)
+        for shard, response in enumerate(responses):
+            rows.add(response, shard)
+        candidates = {name: np.concatenate([response[name] for response in responses])
+                      for name in ('rows', 'tfidf', 'semantic')}
+        tfidf_top = _merge_top(responses, 'tfidf_top', 'tfidf', count)
+        content_rows = candidates['rows'][tfidf_top]
+        scores = candidates['tfidf'][tfidf_top]
+        if semantic and len(content_rows):
+            # Same blend as recommendation._blend_semantic: semantic neighbors already among the
+            # TF-IDF ones are dropped (-inf); both similarities are blended for every candidate
+            semantic_top = _merge_top(responses, 'semantic_top', 'semantic', len(content_rows))
+            dropped = np.isin(candidates['rows'][semantic_top], content_rows)
+            positions = np.concatenate([tfidf_top, semantic_top])
+            content_rows = candidates['rows'][positions]
+            scores = (1 - SEMANTIC_WEIGHT) * candidates['tfidf'][positions] + \
+                SEMANTIC_WEIGHT * candidates['semantic'][positions]
+            scores[len(tfidf_top):][dropped] = -np.inf
+        scores = _boost(content_rows, scores, source, rows, use_compatibility=True)
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        content_rows, scores = content_rows[order], scores[order]
+        valid = np.isfinite(scores)
+        return content_rows[valid], scores[valid], source
+
+    def collaborative(self, source, top_n, rows):
+        """Engagement-ranked candidates of the source's channel and category, boosted (see _collaborative_scores)."""
+        responses = self.scatter('engagement', source, top_n * 2)
+        for shard, response in enumerate(responses):
+            rows.add(response, shard)
+        merged = {}
+        for name in ('channel', 'category', 'overall'):
+            group_rows = np.concatenate([response['lists'][name][0] for response in responses])
+            engagement = np.concatenate([response['lists'][name][1] for response in responses])
+            # Global ranking: engagement, ties in catalog order
+            order = np.lexsort((group_rows, -engagement))
+            merged[name] = (group_rows[order].astype(np.int64), engagement[order],
+                            sum(response['lists'][name][2] for response in responses))
+        engagement_of = {row: rate for group_rows, rates, _ in merged.values()
+                         for row, rate in zip(group_rows.tolist(), rates.tolist())}
+
+        # Same choice of lists as recommendation._collaborative_candidates
+        if merged['channel'][2] >= top_n // 2:
+            candidates = []
+            seen_ids = set()
+            for row in np.concatenate([merged['channel'][0][:top_n], merged['category'][0][:top_n]]).tolist():
+                if rows.video_ids[row] not in seen_ids and len(candidates) < top_n * 2:
+                    seen_ids.add(rows.video_ids[row])
+                    candidates.append(row)
+            filtered_rows = np.array(candidates, dtype=np.int64)
+        elif merged['category'][2] >= top_n:
+            filtered_rows = merged['category'][0][:top_n * 2]
+        else:
+            filtered_rows = merged['overall'][0][:top_n * 2]
+        collaborative_rows = np.random.permutation(filtered_rows)[:min(top_n, len(filtered_rows))]
+        base_scores = np.array([engagement_of[row] for row in collaborative_rows.tolist()], dtype=np.float64) / 5.0
+        return collaborative_rows, _boost(collaborative_rows, base_scores, source, rows, use_compatibility=False)
+
+    def _selected(self, video_id, top_n, rows):
+        """The best `top_n` (global row, score) pairs of a video, best first, or None for unknown ids."""
+        from src.services.recommendation import _select_candidates
+
+        ranking = self.content_ranking(video_id, top_n, rows)
+        if ranking is None:
+            return None
+        content_rows, content_scores, source = ranking
+        collaborative_rows, collaborative_scores = self.collaborative(source, top_n, rows)
+        return _select_candidates(video_id, top_n, content_rows.tolist(), content_scores,
+                                  collaborative_rows.tolist(), collaborative_scores, rows)
+
+    def hybrid_recommendation(self, video_id, top_n=5):
+        """
+        Hybrid recommendations of a video from the shards (recommendation.hybrid_recommendation
+        with engagement-ranked collaborative candidates).
+
+        Returns:
+            list: Recommendation dicts, or [{"error": ...}] for unknown ids.
+        """
+        rows = _Rows()
+        selected = self._selected(video_id, top_n, rows)
+        if selected is None:
+            return [{"error": "Video ID not found!"}]
+        return self.records([row for row, _ in selected], [score for _, score in selected], rows)
+
+    def ranked_candidates(self, video_id, depth):
+        """
+        The best `depth` hybrid candidates of a video as compact arrays (recommendation.ranked_candidates
+        with engagement-ranked collaborative candidates).
+
+        Returns:
+            tuple or None: (int32 global rows, float32 scores), best first, or None for unknown ids.
+        """
+        selected = self._selected(video_id, depth, _Rows())
+        if selected is None:
+            return None
+        rows = np.fromiter((row for row, _ in selected), dtype=np.int32, count=len(selected))
+        scores = np.fromiter((score for _, score in selected), dtype=np.float32, count=len(selected))
+        return rows, scores
+
+    def records(self, rows, scores, known):
+        """Recommendation dicts of global rows, fetched in parallel from the shards that returned them."""
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(known.shard[row], []).append(row)
+        fetched = {}
+        futures = {shard: self.pool.submit(self.clients[shard].call, 'records', shard_rows)
+                   for shard, shard_rows in by_shard.items()}
+        for shard, future in futures.items():
+            fetched.update(zip(by_shard[shard], future.result()))
+        # Same fields and score as recommendation.build_recommendation
+        return [{**fetched[row], "score": float(score)} for row, score in zip(rows, scores)]
+
+
+def _merge_top(responses, positions_key, score_key, count):
+    """
+    Positions, in the concatenated shard candidates, of the global top `count` of one list.
+
+    Each shard's list is its own top `count`, so the merge is exact; ties break by global row.
+    """
+    offsets = np.cumsum([0] + [len(response['rows']) for response in responses])
+    positions = np.concatenate([response[positions_key] + offset for response, offset in zip(responses, offsets)])
+    rows = np.concatenate([response['rows'] for response in responses])
+    scores = np.concatenate([response[score_key] for response in responses])
+    order = np.lexsort((rows[positions], -scores[positions]))[:count]
+    return positions[order]
+
+
+def _boost(rows, scores, source, known, use_compatibility):
+    """recommendation._apply_boosts on field values instead of catalog codes."""
+    from src.services.recommendation import _category_multiplier
+
+    channel, channel_id = known.fields(rows, 'channel'), known.fields(rows, 'channel_id')
+    category = known.fields(rows, 'category')
+    same_channel = ((channel == source['channel']) & (source['channel'] is not None)) | \
+                   ((channel_id == source['channel_id']) & (source['channel_id'] is not None))
+    scores = np.where(same_channel, scores * 1.5, scores)
+    scores = np.where(category == source['category'], scores * 1.3, scores)
+    multipliers = np.array([_category_multiplier(source['category'], candidate, use_compatibility)
+                            for candidate in category], dtype=np.float64)
+    return scores * multipliers
+
+
+def get_coordinator():
+    """
+    This process' Coordinator over the YUGI_SHARDS shards, or None when they are not set.
+
+    Created on first use in every process: pre-forked workers must not share its connections.
+    """
+    global _coordinator, _coordinator_pid
+    if not SHARD_ADDRESSES:
+        return None
+    with _coordinator_lock:
+        if _coordinator is None or _coordinator_pid != os.getpid():
+            _coordinator = Coordinator()
+            _coordinator_pid = os.getpid()
+    return _coordinator
+
+
+def start_local_shards(shard_dirs, host='127.0.0.1', authkey=None):
+    """
+    Start one shard server process per directory on this machine (free ports).
+
+    Args:
+        shard_dirs (list): Shard directories, by shard.
+        host (str): Interface the shards listen on.
+        authkey (str, optional): Key the shards accept (defaults to YUGI_SHARD_AUTHKEY).
+
+    Returns:
+        tuple: (processes, ``host:port`` addresses), by shard.
+    """
+    env = {**os.environ, 'YUGI_SHARD_AUTHKEY': shard_authkey(authkey).decode('utf-8')}
+    processes, addresses = [], []
+    for shard_dir in shard_dirs:
+        process = subprocess.Popen([sys.executable, '-m', 'src.services.shards', 'serve', '--shard-dir', shard_dir,
+                                    '--host', host, '--port', '0'], stdout=subprocess.PIPE, text=True, env=env)
+        processes.append(process)
+    for process in processes:
+        line = process.stdout.readline()
+        if ' listening on ' not in line:
+            for started in processes:
+                started.kill()
+            raise ShardError(f"Shard process exited before listening: {line!r}")
+        addresses.append(line.strip().rsplit(' ', 1)[-1])
+    return processes, addresses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YUGI catalog shards")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    split_parser = subparsers.add_parser('split', help="Split the latest build into shard directories")
+    split_parser.add_argument('--shards', type=int, required=True)
+    split_parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    split_parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+
+    serve_parser = subparsers.add_parser('serve', help="Serve one shard directory")
+    serve_parser.add_argument('--shard-dir', required=True)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=0, help="0 picks a free port")
+
+    args = parser.parse_args(argv)
+    if args.command == 'split':
+        split_build(args.out, args.shards, args.csv)
+    elif args.command == 'serve':
+        serve(args.shard_dir, args.host, args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
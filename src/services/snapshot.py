@@ -0,0 +1,80 @@
+"""
+Immutable model snapshot.
+
+Everything the request path reads (catalog, neighbor index, TF-IDF and its search index,
+embeddings and their ANN index, category multiplier tables, explore pool, top-N table) is
+bundled into one read-only object. Requests grab the current snapshot once and never take
+a lock: the data is never mutated, and publishing a new model only means replacing the
+reference.
+
+While the server warms up, partial snapshots are published first (see
+recommendation.start_warmup); `stage` says which parts are loaded:
+
+- 'catalog': catalog, category tables and explore pool (the explore feed)
+- 'content': plus the TF-IDF matrix, search index, neighbor index and top-N table (content-only
+  recommendations, search)
+- 'ready': plus the embeddings and their ANN index (the full model)
+"""
+import numpy as np
+
+STAGES = ('catalog', 'content', 'ready')
+
+
+def _read_only(array):
+    """Mark an in-memory array read-only (memory-mapped artifacts already are)."""
+    if isinstance(array, np.ndarray) and array.flags.writeable:
+        array.flags.writeable = False
+    return array
+
+
+class ModelSnapshot:
+    """Read-only bundle of the model data served by one process."""
+
+    def __init__(self, catalog, neighbor_index, tfidf, tfidf_matrix, embeddings, semantic_index,
+                 content_category_matrix, collaborative_category_matrix, explore_pool, version, topn_table=None,
+                 stage='ready', search_index=None):
+        for array in (catalog.engagement_rate,
+                      catalog.category_codes, catalog.channel_codes, catalog.channel_id_codes,
+                      catalog.rows_by_category.rows, catalog.rows_by_channel.rows,
+                      catalog.rows_by_channel_id.rows, catalog.ranked_rows.rows,
+                      embeddings, content_category_matrix, collaborative_category_matrix, explore_pool):
+            _read_only(array)
+        if neighbor_index is not None:
+            _read_only(neighbor_index.ids)
+            _read_only(neighbor_index.scores)
+        if topn_table is not None:
+            _read_only(topn_table.ids)
+            _read_only(topn_table.scores)
+        if search_index is not None:
+            for array in (search_index.terms, search_index.offsets, search_index.docs, search_index.impacts):
+                _read_only(array)
+
+        values = {
+            'catalog': catalog,
+            'neighbor_index': neighbor_index,
+            'tfidf': tfidf,
+            'tfidf_matrix': tfidf_matrix,
+            'embeddings': embeddings,
+            'semantic_index': semantic_index,
+            'content_category_matrix': content_category_matrix,
+            'collaborative_category_matrix': collaborative_category_matrix,
+            'explore_pool': explore_pool,
+            'topn_table': topn_table,
+            # Impact-ordered posting lists of the TF-IDF matrix for keyword search (see search.py)
+            'search_index': search_index,
+            'version': version,
+            # Loaded parts, one of STAGES (the parts of later stages are None)
+            'stage': stage,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def replaced(self, **fields):
+        """A new snapshot with some fields replaced (e.g. the version of the build it was written to)."""
+        return ModelSnapshot(**{**self.__dict__, **fields})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelSnapshot is read-only; build a new snapshot instead")
+
+    def __delattr__(self, name):
+        raise AttributeError("ModelSnapshot is read-only; build a new snapshot instead")
@@ -0,0 +1,263 @@
+"""
+Materialized top-N content candidates.
+
+Every cache miss used to gather and blend the same content candidates of a video (TF-IDF
+neighbors plus semantic ANN neighbors). An offline job computes them once for the whole
+catalog, in parallel chunks over a process pool, and stores the N best per video as two
+(rows x N) arrays, int32 row ids and float32 blended similarities, next to the build:
+
+    python -m src.services.topn [--out data/artifacts] [--size 64] [--workers 8]
+
+The arrays are memory-mapped like the rest of the build. A request reads the N stored
+candidates of its video and only applies the per-request boosts to those rows; the same
+candidates of videos the table does not cover (ids -1) are computed live. Running servers
+pick the table up with recommendation.refresh_snapshot.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.services.neighbors import DEFAULT_BLOCK_BYTES
+
+TOPN_SIZE = int(os.environ.get('YUGI_TOPN_SIZE', 64))
+# Videos per task; bounds the (chunk x candidates x embedding dim) gather of the semantic blend
+TOPN_CHUNK_SIZE = 256
+TOPN_META_NAME = 'topn.json'
+
+# Snapshot read by the forked pool workers (inherited, never pickled)
+_build_snapshot = None
+
+
+class TopNTable:
+    """Best content candidates of every row, by descending blended similarity (-1 padded)."""
+
+    def __init__(self, ids, scores, semantic_weight):
+        self.ids = ids
+        self.scores = scores
+        self.semantic_weight = semantic_weight
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def size(self):
+        return self.ids.shape[1]
+
+    def covers(self, sources):
+        """Which of the source rows have materialized candidates."""
+        sources = np.asarray(sources, dtype=np.int64)
+        covered = sources < len(self)
+        covered[covered] = np.asarray(self.ids[sources[covered], 0]) >= 0
+        return covered
+
+    def candidates(self, sources):
+        """
+        (B, size) candidate rows and scores of covered source rows.
+
+        Unused slots hold the source row itself with a -inf score, like the live path.
+        """
+        return _as_candidates(sources, self.ids[sources], self.scores[sources])
+
+
+def _as_candidates(sources, ids, scores):
+    """Stored (-1 padded) candidates as candidate rows and scores, unused slots the source row scored -inf."""
+    ids = np.asarray(ids, dtype=np.int64)
+    missing = ids < 0
+    return (np.where(missing, np.asarray(sources)[:, None], ids),
+            np.where(missing, -np.inf, np.asarray(scores, dtype=np.float64)))
+
+
+def live_candidates(snapshot, sources, size):
+    """
+    The candidates the table would store for `sources`, computed now, in the layout of
+    TopNTable.candidates (for sources it does not cover, so they rank like covered ones).
+    """
+    return _as_candidates(sources, *compute_candidates(snapshot, sources, size))
+
+
+def compute_candidates(snapshot, sources, size):
+    """
+    The `size` best content candidates of each source row, as stored in the table.
+
+    The pool is every TF-IDF neighbor kept by the neighbor index plus as many semantic
+    neighbors, scored with the same blend as the live path (before any boost).
+
+    Returns:
+        tuple: ((B, size) int32 rows, -1 padded; (B, size) float32 scores, -inf padded)
+    """
+    from src.services.recommendation import _content_candidates, _top_rows
+
+    rows, scores = _content_candidates(sources, snapshot.neighbor_index.k - 1, snapshot)
+    rows, scores = _top_rows(rows, scores, size)
+    ids = np.full((len(sources), size), -1, dtype=np.int32)
+    padded = np.full((len(sources), size), -np.inf, dtype=np.float32)
+    valid = np.isfinite(scores)
+    ids[:, :rows.shape[1]] = np.where(valid, rows, -1)
+    padded[:, :rows.shape[1]] = np.where(valid, scores, -np.inf)
+    return ids, padded
+
+
+def _build_chunk(start, end, size, ids_path, scores_path):
+    # Runs in a forked worker: compute one chunk and write it straight into the shared output files
+    ids, scores = compute_candidates(_build_snapshot, np.arange(start, end, dtype=np.int64), size)
+    out_ids = np.load(ids_path, mmap_mode='r+')
+    out_scores = np.load(scores_path, mmap_mode='r+')
+    out_ids[start:end] = ids
+    out_scores[start:end] = scores
+    out_ids.flush()
+    out_scores.flush()
+    return end - start
+
+
+def build_topn_table(snapshot, build_dir, size=TOPN_SIZE, workers=None, chunk_size=TOPN_CHUNK_SIZE):
+    """
+    Materialize the top-N content candidates of every video of `snapshot` into `build_dir`.
+
+    Args:
+        snapshot (ModelSnapshot): The model the build directory holds.
+        build_dir (str): Build directory the table is written into.
+        size (int): Candidates kept per video.
+        workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        chunk_size (int): Videos per task.
+
+    Returns:
+        dict: The table metadata (rows, size, semantic weight, timings).
+    """
+    global _build_snapshot
+    from src.services.recommendation import SEMANTIC_WEIGHT
+
+    start = time.time()
+    n_rows = len(snapshot.catalog)
+    workers = workers or os.cpu_count() or 1
+    ids_path = os.path.join(build_dir, f'topn_ids.tmp-{os.getpid()}.npy')
+    scores_path = os.path.join(build_dir, f'topn_scores.tmp-{os.getpid()}.npy')
+    np.lib.format.open_memmap(ids_path, mode='w+', dtype=np.int32, shape=(n_rows, size)).flush()
+    np.lib.format.open_memmap(scores_path, mode='w+', dtype=np.float32, shape=(n_rows, size)).flush()
+
+    # Workers are forked, so they share the memory-mapped model with this process
+    _build_snapshot = snapshot
+    try:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            tasks = [pool.submit(_build_chunk, chunk, min(chunk + chunk_size, n_rows), size, ids_path, scores_path)
+                     for chunk in range(0, n_rows, chunk_size)]
+            done = sum(task.result() for task in tasks)
+    finally:
+        _build_snapshot = None
+
+    meta = {
+        'n_rows': done,
+        'size': size,
+        'semantic_weight': SEMANTIC_WEIGHT,
+        'workers': workers,
+        'seconds': time.time() - start,
+    }
+    os.replace(ids_path, os.path.join(build_dir, 'topn_ids.npy'))
+    os.replace(scores_path, os.path.join(build_dir, 'topn_scores.npy'))
+    # The metadata file is written last: readers only use a table once it exists
+    _write_meta(build_dir, meta)
+    print(f"Materialized top-{size} content candidates for {done} videos in {meta['seconds']:.1f}s "
+          f"({workers} workers) -> {build_dir}")
+    return meta
+
+
+def _entering_rows(table, snapshot, n_old, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Existing rows that a new row (``n_old:``) can enter: its blended similarity to the row
+    reaches the row's last stored score (or the row has unused slots).
+    """
+    n_new = len(snapshot.catalog) - n_old
+    tfidf_matrix, embeddings = snapshot.tfidf_matrix, snapshot.embeddings
+    old_t = tfidf_matrix[:n_old].T.tocsc()
+    kth = np.asarray(table.scores[:, table.size - 1], dtype=np.float64)
+    entering = np.zeros(n_old, dtype=bool)
+    block_size = max(1, min(n_new, block_bytes // max(1, n_old * 8)))
+    for block_start in range(n_old, n_old + n_new, block_size):
+        block_end = min(block_start + block_size, n_old + n_new)
+        # Exact similarities of the new rows to every existing one, blended like the live path
+        scores = (1 - table.semantic_weight) * (tfidf_matrix[block_start:block_end] @ old_t).toarray()
+        if table.semantic_weight > 0:
+            scores += table.semantic_weight * (embeddings[block_start:block_end] @ np.asarray(embeddings[:n_old]).T)
+        entering |= (scores >= kth).any(axis=0)
+    return np.flatnonzero(entering)
+
+
+def extend_topn_table(table, snapshot, changed_rows, n_old, chunk_size=TOPN_CHUNK_SIZE):
+    """
+    Carry a table over to a snapshot with rows ``n_old:`` appended (see ingest.py).
+
+    The new rows, the rows whose TF-IDF neighbors changed and the rows a new row can enter
+    are recomputed in-process; every other row is copied.
+
+    Returns:
+        tuple: (in-memory TopNTable covering every row of `snapshot`, int64 array of the recomputed rows)
+    """
+    n_rows = len(snapshot.catalog)
+    stale = np.unique(np.concatenate([np.asarray(changed_rows, dtype=np.int64),
+                                      _entering_rows(table, snapshot, n_old),
+                                      np.arange(n_old, n_rows)]))
+    ids = np.concatenate([np.asarray(table.ids), np.full((n_rows - n_old, table.size), -1, dtype=np.int32)])
+    scores = np.concatenate([np.asarray(table.scores),
+                             np.full((n_rows - n_old, table.size), -np.inf, dtype=np.float32)])
+    for chunk in range(0, len(stale), chunk_size):
+        rows = stale[chunk:chunk + chunk_size]
+        ids[rows], scores[rows] = compute_candidates(snapshot, rows, table.size)
+    return TopNTable(ids, scores, table.semantic_weight), stale
+
+
+def _write_meta(directory, meta):
+    tmp_path = os.path.join(directory, f'{TOPN_META_NAME}.tmp-{os.getpid()}')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, TOPN_META_NAME))
+
+
+def save_topn_table(directory, table):
+    """Write an in-memory table into a build directory."""
+    np.save(os.path.join(directory, 'topn_ids.npy'), table.ids)
+    np.save(os.path.join(directory, 'topn_scores.npy'), table.scores)
+    _write_meta(directory, {'n_rows': len(table), 'size': table.size, 'semantic_weight': table.semantic_weight})
+
+
+def read_topn_meta(directory):
+    """The metadata of the table of a build directory, or None when it has none."""
+    try:
+        with open(os.path.join(directory, TOPN_META_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_topn_table(directory):
+    """Memory-map the table of a build directory (None when it has none)."""
+    meta = read_topn_meta(directory)
+    if meta is None:
+        return None
+    return TopNTable(np.load(os.path.join(directory, 'topn_ids.npy'), mmap_mode='r'),
+                     np.load(os.path.join(directory, 'topn_scores.npy'), mmap_mode='r'),
+                     meta['semantic_weight'])
+
+
+def main(argv=None):
+    from src.services.artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_artifacts
+
+    parser = argparse.ArgumentParser(description="Materialize the top-N content candidates of the latest build")
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument('--size', type=int, default=TOPN_SIZE, help="Candidates kept per video")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to the CPU count)")
+    args = parser.parse_args(argv)
+
+    from src.services.recommendation import build_snapshot
+
+    artifacts = load_artifacts(args.out, args.csv)
+    build_topn_table(build_snapshot(artifacts), artifacts['build_dir'], args.size, args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+"""
+The caches of src/services/cache.py: single-flight, TTL expiry, byte-limit eviction and purge.
+"""
+import threading
+import time
+import types
+
+import pytest
+
+from src.services import cache
+from src.services.cache import LRUCache, ShardedLRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable clock in place of time.time for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_concurrent_misses_compute_once():
+    lru = ShardedLRUCache(100)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(True)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(lru.get_or_compute('key', compute)))
+    leader.start()
+    assert started.wait(5)
+    # Every later miss arrives while the leader is still computing
+    followers = [threading.Thread(target=lambda: results.append(lru.get_or_compute('key', compute)))
+                 for _ in range(8)]
+    for thread in followers:
+        thread.start()
+    # Release the leader only once every follower has missed and is waiting for its result
+    deadline = time.time() + 5
+    while lru.stats()['misses'] < 9 and time.time() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert calls == [True]
+    assert results == ['value'] * 9
+    assert lru.get('key') == 'value'
+
+
+def test_concurrent_misses_share_the_error():
+    lru = LRUCache(10)
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError('boom')
+
+    def call():
+        try:
+            lru.get_or_compute('key', compute)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert [str(e) for e in errors] == ['boom', 'boom']
+    # Failures are not cached: the next call computes again
+    assert lru.get_or_compute('key', lambda: 'value') == 'value'
+
+
+def test_uncacheable_values_are_not_stored():
+    lru = LRUCache(10)
+    assert lru.get_or_compute('key', lambda: None, cacheable=lambda value: value is not None) is None
+    assert 'key' not in lru
+    assert lru.get_or_compute('key', lambda: 1, cacheable=lambda value: value is not None) == 1
+    assert 'key' in lru
+
+
+def test_entries_expire_after_their_ttl(clock):
+    lru = LRUCache(10, ttl=10)
+    lru.put('default', 1)
+    lru.put('short', 2, ttl=1)
+    lru.put('long', 3, ttl=100)
+    clock[0] += 5
+    assert lru.get('short') is None
+    assert lru.get('default') == 1
+    clock[0] += 6
+    assert lru.get('default') is None
+    assert lru.get('long') == 3
+    # Due entries are dropped on the next write even if they are never looked up again
+    lru.put('other', 4, ttl=1)
+    clock[0] += 200
+    lru.put('late', 5)
+    assert len(lru) == 1
+    assert lru.stats()['expirations'] == 4
+
+
+def test_overwrite_resets_the_ttl(clock):
+    lru = LRUCache(10, ttl=10)
+    lru.put('key', 1)
+    clock[0] += 8
+    lru.put('key', 2)
+    clock[0] += 8
+    assert lru.get('key') == 2
+
+
+def test_byte_limit_evicts_least_recently_used():
+    lru = LRUCache(100, max_bytes=10)
+    lru.put('a', b'aaaa')
+    lru.put('b', b'bbbb')
+    assert lru.get('a') == b'aaaa'
+    lru.put('c', b'cccc')
+    # 'b' was the least recently used when the limit was exceeded
+    assert 'b' not in lru
+    assert lru.get('a') == b'aaaa' and lru.get('c') == b'cccc'
+    assert lru.bytes == 8
+    assert lru.stats()['evictions'] == 1
+
+
+def test_an_entry_larger_than_the_limit_is_kept_alone():
+    lru = LRUCache(100, max_bytes=10)
+    lru.put('a', b'aa')
+    lru.put('big', b'x' * 50)
+    assert 'a' not in lru
+    assert lru.get('big') == b'x' * 50
+    assert lru.bytes == 50
+
+
+def test_capacity_evicts_least_recently_used():
+    lru = LRUCache(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    lru.get('a')
+    lru.put('c', 3)
+    assert 'b' not in lru and 'a' in lru and 'c' in lru
+
+
+def test_sharded_cache_splits_the_byte_limit():
+    lru = ShardedLRUCache(1000, shards=4, max_bytes=400)
+    for i in range(200):
+        lru.put(f'key-{i}', b'x' * 10)
+    stats = lru.stats()
+    assert stats['bytes'] <= 400
+    assert stats['entries'] == stats['bytes'] // 10
+    assert stats['evictions'] == 200 - stats['entries']
+
+
+def test_purge_removes_matching_entries_from_every_shard():
+    lru = ShardedLRUCache(1000, shards=4)
+    for i in range(100):
+        lru.put(f'video-{i}_5', i)
+    removed = lru.purge(lambda key, value: value % 2 == 0)
+    assert removed == 50
+    assert len(lru) == 50
+    assert all(lru.get(f'video-{i}_5') == (i if i % 2 else None) for i in range(100))
+    assert lru.stats()['bytes'] == sum(cache.default_sizeof(i) for i in range(1, 100, 2))
@@ -0,0 +1,96 @@
+"""
+The columnar catalog (src/services/catalog.py): sorted-id lookups, and catalogs opened from a build
+or extended with appended rows against one built from plain lists.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate_catalog
+from src.services.artifacts import build_artifacts, load_artifacts, prepare_catalog_frame
+from src.services.catalog import ENCODED_COLUMNS, RANKINGS, Catalog, SortedIndex
+from src.services.encoders import get_encoder
+
+N_VIDEOS = 300
+
+
+def _assert_same_catalog(catalog, expected):
+    assert len(catalog) == len(expected)
+    assert catalog.video_id_list() == expected.video_id_list()
+    np.testing.assert_array_equal(catalog.engagement_rate, expected.engagement_rate)
+    for codes_attr, vocab_attr in ENCODED_COLUMNS.values():
+        np.testing.assert_array_equal(getattr(catalog, codes_attr), getattr(expected, codes_attr))
+        assert [getattr(catalog, vocab_attr)[code] for code in range(len(getattr(catalog, vocab_attr)))] == \
+            list(getattr(expected, vocab_attr))
+    for name in ENCODED_COLUMNS:
+        for code, value in enumerate(getattr(expected, ENCODED_COLUMNS[name][1])):
+            assert catalog.code_of(name, value) == code
+    for attr in RANKINGS.values():
+        np.testing.assert_array_equal(getattr(catalog, attr).rows, getattr(expected, attr).rows)
+        np.testing.assert_array_equal(getattr(catalog, attr).offsets, getattr(expected, attr).offsets)
+    video_ids = expected.video_id_list()
+    assert [catalog.row_of(video_id) for video_id in video_ids] == [expected.row_of(video_id) for video_id in video_ids]
+    np.testing.assert_array_equal(catalog.rows_of(video_ids), [expected.row_of(video_id) for video_id in video_ids])
+    assert all(catalog.record(row) == expected.record(row) for row in range(0, len(expected), 17))
+
+
+def test_sorted_index_lookups():
+    keys = ['b', 'a', 'ünï', 'b', 'abc', 'a']
+    index = SortedIndex.build(keys)
+    # The first position of a duplicated key wins
+    assert [index.get(key) for key in ('a', 'b', 'ünï', 'abc')] == [1, 0, 2, 4]
+    # Missing keys, including ones longer than every indexed key that share a prefix with one
+    assert index.get('ab') is None and index.get('abcd') is None and index.get('ünïcode') is None
+    assert 'abc' in index and 'c' not in index
+    np.testing.assert_array_equal(index.positions(['abc', 'x', 'a', 'abcdef', 'ünï']), [4, -1, 1, -1, 2])
+    assert sorted(index.first_positions().tolist()) == [0, 1, 2, 4]
+
+
+def test_sorted_index_appended_segments():
+    keys = [f'key-{i % 37}' for i in range(60)]
+    index = SortedIndex.build(keys[:20])
+    for start, end in ((20, 25), (25, 26), (26, 40), (40, 41), (41, 45), (45, 50), (50, 52), (52, 55), (55, 60)):
+        index = index.appended(keys[start:end], start)
+    # Appended segments are merged once there are too many, the build's segment is kept
+    assert len(index.segments) <= SortedIndex.MAX_SEGMENTS
+    expected = SortedIndex.build(keys)
+    queries = [f'key-{i}' for i in range(45)]
+    assert [index.get(key) for key in queries] == [expected.get(key) for key in queries]
+    np.testing.assert_array_equal(index.positions(queries), expected.positions(queries))
+    assert sorted(index.first_positions().tolist()) == sorted(expected.first_positions().tolist())
+
+
+@pytest.fixture(scope='module')
+def frame():
+    df = generate_catalog(N_VIDEOS, seed=3)
+    # A duplicated id, a non-ASCII id and missing channels
+    df.loc[10, 'v_id'] = df.loc[4, 'v_id']
+    df.loc[11, 'v_id'] = 'vidéo-ünïcode'
+    df.loc[12:15, 'channel_name'] = None
+    return df
+
+
+def test_build_stores_the_catalog_index_and_codes(frame, tmp_path):
+    csv_path = str(tmp_path / 'catalog.csv')
+    frame.to_csv(csv_path, index=False)
+    out_dir = str(tmp_path / 'artifacts')
+    build_artifacts(csv_path, out_dir, encoder=get_encoder('hashing'), workers=1)
+    artifacts = load_artifacts(out_dir, csv_path)
+    # Codes, vocabularies and indexes come from the build rather than being encoded when it is opened
+    assert artifacts['encoded'] is not None
+    catalog = Catalog.from_artifacts(artifacts)
+    _assert_same_catalog(catalog, Catalog.from_frame(prepare_catalog_frame(frame.copy())))
+    assert catalog.row_of('vidéo-ünïcode') == 11
+    assert catalog.row_of(frame.loc[4, 'v_id']) == 4
+
+
+@pytest.mark.parametrize('n_old', [1, 150, N_VIDEOS - 1])
+def test_appended_equals_a_catalog_of_every_row(frame, n_old):
+    df = prepare_catalog_frame(frame.copy())
+    catalog = Catalog.from_frame(df.iloc[:n_old].reset_index(drop=True))
+    new = df.iloc[n_old:].reset_index(drop=True)
+    columns = {name: [None if value != value else value for value in new[name].tolist()]
+               for name in catalog.columns}
+    appended = catalog.appended(columns, new['engagement_rate'].to_numpy())
+    _assert_same_catalog(appended, Catalog.from_frame(df))
+    # The catalog it was extended from is left untouched
+    assert len(catalog) == n_old and catalog.row_of(df.loc[n_old, 'v_id']) is None
@@ -0,0 +1,42 @@
+"""
+Explore feed pages (src/services/explore.py): each session's order is a permutation of the pool.
+"""
+import numpy as np
+import pytest
+
+from src.services.explore import SessionPermutation, explore_rows
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 7, 64, 1000, 4097])
+def test_permutation_is_a_bijection(n):
+    for seed in (0, 1, 2**63 + 5):
+        values = SessionPermutation(n, seed)[np.arange(n)]
+        assert values.min() >= 0 and values.max() < n
+        np.testing.assert_array_equal(np.sort(values), np.arange(n))
+
+
+def test_permutation_is_evaluated_position_by_position():
+    permutation = SessionPermutation(5000, 42)
+    order = permutation[np.arange(5000)]
+    positions = np.array([4999, 0, 17, 2500])
+    np.testing.assert_array_equal(permutation[positions], order[positions])
+
+
+@pytest.mark.parametrize('limit', [1, 7, 20])
+def test_pages_cover_the_pool_without_repeats(limit):
+    pool = np.arange(0, 3000, 3)
+    pages = [explore_rows(pool, 'session-a', limit, offset) for offset in range(0, len(pool), limit)]
+    assert all(len(page) == limit for page in pages[:-1])
+    rows = np.concatenate(pages)
+    np.testing.assert_array_equal(np.sort(rows), pool)
+    # Past the end there is nothing more
+    assert len(explore_rows(pool, 'session-a', limit, len(pool))) == 0
+
+
+def test_sessions_fix_the_order():
+    pool = np.arange(500)
+    first = explore_rows(pool, 'session-a', 20, 40)
+    np.testing.assert_array_equal(explore_rows(pool, 'session-a', 20, 40), first)
+    assert not np.array_equal(explore_rows(pool, 'session-b', 20, 40), first)
+    # A page of another size starts at the same position of the same order
+    np.testing.assert_array_equal(explore_rows(pool, 'session-a', 10, 40), first[:10])
@@ -0,0 +1,94 @@
+"""
+Incremental ingest (src/services/ingest.py): delta builds and their compaction load back to the
+snapshot the ingest built in memory, and the chained CSV checksum validates the appended catalog.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_catalog
+from src.services import ingest
+from src.services.artifacts import (StaleArtifactsError, build_artifacts, check_artifacts, latest_build_dir,
+                                    load_artifacts)
+from src.services.encoders import get_encoder
+from src.services.recommendation import build_snapshot
+from src.services.topn import build_topn_table
+
+N_VIDEOS = 400
+N_BASE = 300
+BATCHES = [(300, 330), (330, 360), (360, 400)]
+
+
+def _assert_same_snapshot(snapshot, expected):
+    assert len(snapshot.catalog) == len(expected.catalog)
+    assert snapshot.catalog.video_id_list() == expected.catalog.video_id_list()
+    np.testing.assert_array_equal(snapshot.catalog.engagement_rate, expected.catalog.engagement_rate)
+    assert (snapshot.tfidf_matrix != expected.tfidf_matrix).nnz == 0
+    for name in ('terms', 'offsets', 'docs', 'impacts'):
+        np.testing.assert_array_equal(getattr(snapshot.search_index, name), getattr(expected.search_index, name))
+    np.testing.assert_array_equal(snapshot.neighbor_index.ids, expected.neighbor_index.ids)
+    np.testing.assert_array_equal(snapshot.neighbor_index.scores, expected.neighbor_index.scores)
+    np.testing.assert_array_equal(np.asarray(snapshot.embeddings), np.asarray(expected.embeddings))
+    np.testing.assert_array_equal(snapshot.topn_table.ids, expected.topn_table.ids)
+    np.testing.assert_array_equal(snapshot.topn_table.scores, expected.topn_table.scores)
+    np.testing.assert_array_equal(snapshot.explore_pool, expected.explore_pool)
+    np.testing.assert_array_equal(snapshot.content_category_matrix, expected.content_category_matrix)
+
+
+@pytest.fixture()
+def build(tmp_path):
+    df = generate_catalog(N_VIDEOS, seed=5)
+    csv_path = str(tmp_path / 'catalog.csv')
+    df.iloc[:N_BASE].to_csv(csv_path, index=False)
+    out_dir = str(tmp_path / 'artifacts')
+    build_artifacts(csv_path, out_dir, encoder=get_encoder('hashing'), workers=1)
+    artifacts = load_artifacts(out_dir, csv_path)
+    build_topn_table(build_snapshot(artifacts), artifacts['build_dir'], size=20, workers=1)
+    return df, csv_path, out_dir
+
+
+def test_delta_builds_load_the_ingested_snapshot(build, monkeypatch):
+    df, csv_path, out_dir = build
+    monkeypatch.setattr(ingest, 'INGEST_COMPACT_FRACTION', 1.0)
+    expected = build_snapshot(load_artifacts(out_dir, csv_path))
+    encoder = get_encoder('hashing')
+    for start, end in BATCHES:
+        stats = ingest.ingest_videos(df.iloc[start:end], csv_path, out_dir, publish=False)
+        assert stats['added'] == end - start and not stats['compacted']
+        expected = ingest.ingest_frame(df.iloc[start:end], expected, encoder)[0]
+        build_dir = latest_build_dir(out_dir)
+        manifest = json.load(open(os.path.join(build_dir, 'manifest.json')))
+        # Only the appended rows are written
+        assert manifest['delta']['row_start'] == start and manifest['n_rows'] == end
+        assert len(np.load(os.path.join(build_dir, 'col_engagement_rate.npy'))) == end - start
+        _assert_same_snapshot(build_snapshot(load_artifacts(out_dir, csv_path)), expected)
+
+    # A touched CSV is validated through the checksums of its segments, an edited one is rejected
+    os.utime(csv_path, (0, 0))
+    check_artifacts(latest_build_dir(out_dir), csv_path)
+    with open(csv_path, 'r+b') as f:
+        f.seek(os.path.getsize(csv_path) - 2)
+        f.write(b'#')
+    with pytest.raises(StaleArtifactsError):
+        check_artifacts(latest_build_dir(out_dir), csv_path)
+
+
+def test_compaction_writes_a_full_build(build, monkeypatch):
+    df, csv_path, out_dir = build
+    monkeypatch.setattr(ingest, 'INGEST_MAX_DELTAS', 1)
+    monkeypatch.setattr(ingest, 'INGEST_COMPACT_FRACTION', 1.0)
+    assert not ingest.ingest_videos(df.iloc[300:330], csv_path, out_dir, publish=False)['compacted']
+    delta = build_snapshot(load_artifacts(out_dir, csv_path))
+    stats = ingest.ingest_videos(df.iloc[330:400], csv_path, out_dir, publish=False)
+    assert stats['compacted']
+    manifest = json.load(open(os.path.join(latest_build_dir(out_dir), 'manifest.json')))
+    assert 'delta' not in manifest and manifest['n_rows'] == N_VIDEOS
+    expected = ingest.ingest_frame(df.iloc[330:400], delta, get_encoder('hashing'))[0]
+    _assert_same_snapshot(build_snapshot(load_artifacts(out_dir, csv_path)), expected)
+    # The next ingest starts a new chain over the compacted build
+    new = df.iloc[:5].assign(v_id=[f'late-{i}' for i in range(5)])
+    assert not ingest.ingest_videos(new, csv_path, out_dir, publish=False)['compacted']
+    assert len(pd.read_csv(csv_path)) == N_VIDEOS + 5
@@ -0,0 +1,50 @@
+"""
+Incremental extension of the top-K neighbor index (src/services/neighbors.py) against a full build.
+"""
+import numpy as np
+import pytest
+from scipy import sparse
+
+from src.services.neighbors import build_neighbor_index, extend_neighbor_index
+
+
+def _normalized_matrix(n_rows, n_columns, seed):
+    rng = np.random.default_rng(seed)
+    matrix = sparse.random(n_rows, n_columns, density=0.05, format='csr', random_state=seed,
+                           data_rvs=lambda size: rng.random(size) + 0.01)
+    # Every row needs at least one term to be normalized
+    extra = sparse.csr_matrix((np.full(n_rows, 0.01), (np.arange(n_rows), rng.integers(0, n_columns, n_rows))),
+                              shape=matrix.shape)
+    matrix = (matrix + extra).tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+@pytest.mark.parametrize('n_old, n_new, block_bytes', [
+    (400, 1, 256 * 1024 * 1024),
+    (400, 100, 256 * 1024 * 1024),
+    # Blocks of a few new rows each
+    (300, 200, 3 * 500 * 8),
+])
+def test_extension_equals_full_build(n_old, n_new, block_bytes):
+    matrix = _normalized_matrix(n_old + n_new, 200, seed=n_new)
+    old_index, _ = build_neighbor_index(matrix[:n_old], k=16)
+    extended, changed = extend_neighbor_index(old_index, matrix, n_old, block_bytes=block_bytes)
+    full, _ = build_neighbor_index(matrix, k=16)
+
+    np.testing.assert_array_equal(extended.ids, full.ids)
+    np.testing.assert_allclose(extended.scores, full.scores, rtol=1e-6)
+    # The changed rows are exactly the existing rows whose neighbor list is different now
+    differs = (np.asarray(extended.ids[:n_old]) != np.asarray(old_index.ids)).any(axis=1)
+    np.testing.assert_array_equal(changed, np.flatnonzero(differs))
+    # The old index is left untouched
+    np.testing.assert_array_equal(old_index.ids, build_neighbor_index(matrix[:n_old], k=16)[0].ids)
+
+
+def test_repeated_extensions_equal_full_build():
+    matrix = _normalized_matrix(500, 150, seed=7)
+    index, _ = build_neighbor_index(matrix[:200], k=8)
+    for end in (260, 261, 400, 500):
+        index, _ = extend_neighbor_index(index, matrix[:end], index.ids.shape[0])
+    full, _ = build_neighbor_index(matrix, k=8)
+    np.testing.assert_array_equal(index.ids, full.ids)
@@ -0,0 +1,61 @@
+"""
+Cursors of src/services/pagination.py: round trips, malformed and expired cursors.
+"""
+import base64
+import json
+import time
+
+import pytest
+
+from src.services import pagination
+from src.services.pagination import decode_cursor, encode_cursor
+
+
+def _token(fields):
+    return base64.urlsafe_b64encode(json.dumps(fields).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+@pytest.mark.parametrize('feed', [{'video_id': 'dQw4w9WgXcQ'}, {'video_id': 'é-ünïcode_id'}, {'session': 'a1b2c3'}])
+@pytest.mark.parametrize('offset', [0, 5, 499, 10**9])
+def test_cursor_round_trip(feed, offset):
+    started_at = int(time.time()) - 60
+    cursor = encode_cursor(offset, started_at=started_at, **feed)
+    # URL-safe without escaping
+    assert all(c.isalnum() or c in '-_' for c in cursor)
+    assert decode_cursor(cursor) == {
+        'offset': offset,
+        'video_id': feed.get('video_id'),
+        'session': feed.get('session'),
+        'started_at': started_at,
+        'expired': False,
+    }
+
+
+def test_cursor_defaults_to_now():
+    before = int(time.time())
+    assert before <= decode_cursor(encode_cursor(5, session='s'))['started_at'] <= time.time()
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not a cursor!',
+    'bm90IGpzb24',  # "not json"
+    _token([1, 2]),
+    _token('text'),
+    _token({'o': 5}),  # no start time
+    _token({'t': 0, 'v': 'x'}),  # no offset
+    _token({'o': 'five', 't': 0, 'v': 'x'}),
+    _token({'o': -1, 't': 0, 'v': 'x'}),
+    _token({'o': 0, 't': 0}),  # neither video nor session
+    _token({'o': 0, 't': 0, 'v': 'x', 's': 'y'}),  # both
+    base64.urlsafe_b64encode(b'\xff\xfe').decode('ascii'),  # not UTF-8
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_expired_cursor(monkeypatch):
+    monkeypatch.setattr(pagination, 'CURSOR_TTL', 60)
+    assert decode_cursor(encode_cursor(5, video_id='x', started_at=time.time() - 30))['expired'] is False
+    assert decode_cursor(encode_cursor(5, video_id='x', started_at=time.time() - 120))['expired'] is True
@@ -0,0 +1,90 @@
+"""
+Early-terminating keyword search (src/services/search.py) against scoring every row.
+"""
+import types
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from src.services import search
+from src.services.catalog import Catalog
+from src.services.recommendation import build_category_matrix
+
+N_ROWS = 3000
+N_TERMS = 400
+
+
+class _ColumnsTfidf:
+    """Stands in for the build's TF-IDF: a query is a space-separated list of columns, weighted equally."""
+
+    def transform(self, queries):
+        columns = sorted({int(term) for term in queries[0].split()})
+        data = np.full(len(columns), 1 / np.sqrt(max(len(columns), 1)))
+        return sparse.csr_matrix((data, columns, [0, len(columns)]), shape=(1, N_TERMS))
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    rng = np.random.default_rng(0)
+    # Zipf-like term frequencies, so common terms have long posting lists
+    popularity = 1 / np.arange(1, N_TERMS + 1)
+    rows, columns = [], []
+    for row in range(N_ROWS):
+        terms = rng.choice(N_TERMS, size=rng.integers(3, 20), replace=False, p=popularity / popularity.sum())
+        rows += [row] * len(terms)
+        columns += terms.tolist()
+    tfidf_matrix = sparse.csr_matrix((rng.random(len(rows)) + 0.05, (rows, columns)), shape=(N_ROWS, N_TERMS))
+    norms = np.sqrt(np.asarray(tfidf_matrix.multiply(tfidf_matrix).sum(axis=1))).ravel()
+    tfidf_matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ tfidf_matrix, dtype=np.float32)
+    tfidf_matrix.sort_indices()
+
+    categories = ['28', '24', '27', '23', '22', '10']
+    catalog = Catalog({
+        'v_id': [f'video-{row}' for row in range(N_ROWS)],
+        'category_id': [categories[i] for i in rng.integers(0, len(categories), N_ROWS)],
+        'channel_name': [f'channel-{i}' for i in rng.integers(0, 300, N_ROWS)],
+        'channel_id': [None] * N_ROWS,
+    }, rng.lognormal(-4, 1, N_ROWS))
+    return types.SimpleNamespace(catalog=catalog, tfidf=_ColumnsTfidf(), tfidf_matrix=tfidf_matrix,
+                                 search_index=search.build_search_index(tfidf_matrix),
+                                 content_category_matrix=build_category_matrix(catalog.categories, True))
+
+
+@pytest.mark.parametrize('with_source', [False, True])
+@pytest.mark.parametrize('k', [1, 10, 50])
+def test_matches_exhaustive_scoring(snapshot, monkeypatch, k, with_source):
+    # Small blocks, so queries take several rounds and stop before the end of their lists
+    monkeypatch.setattr(search, 'FIRST_BLOCK', 4)
+    monkeypatch.setattr(search, 'MIN_RESCORED', 8)
+    rng = np.random.default_rng(k)
+    early = 0
+    for _ in range(40):
+        query = ' '.join(str(term) for term in rng.choice(60, size=rng.integers(1, 6), replace=False))
+        source = int(rng.integers(N_ROWS)) if with_source else None
+        rows, scores, stats = search.search(query, k, snapshot, source)
+        columns, weights = search.query_vector(query, snapshot)
+        expected_rows, expected_scores = search._exhaustive(columns, weights, k, snapshot, source)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-9)
+        starts, ends = snapshot.search_index.postings(columns)
+        early += stats['postings'] < (ends - starts).sum()
+    # The threshold stops reading most queries' lists early
+    assert early > 20
+
+
+def test_query_without_indexed_terms(snapshot):
+    rows, scores, stats = search.search('', 10, snapshot)
+    assert len(rows) == 0 and len(scores) == 0 and stats['terms'] == 0
+
+
+@pytest.mark.parametrize('n_old', [0, 1, 1800, N_ROWS])
+def test_appended_equals_a_full_build(snapshot, n_old):
+    matrix = snapshot.tfidf_matrix.copy()
+    # Ties across the old and new rows of a term must keep the full build's order (ascending rows)
+    matrix.data[::7] = np.float32(0.25)
+    index = search.build_search_index(matrix[:n_old]).appended(matrix[n_old:], n_old)
+    expected = search.build_search_index(matrix)
+    for name in ('terms', 'offsets', 'docs', 'impacts'):
+        np.testing.assert_array_equal(getattr(index, name), getattr(expected, name))
+        assert getattr(index, name).dtype == getattr(expected, name).dtype
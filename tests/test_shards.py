@@ -0,0 +1,150 @@
+"""
+Scatter-gather over local shard processes (src/services/shards.py) against one process holding the whole model.
+"""
+import secrets
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_catalog
+from src.services import pagination
+from src.services import recommendation as rec
+from src.services import shards
+from src.services.artifacts import build_artifacts, load_artifacts
+from src.services.encoders import get_encoder
+
+N_VIDEOS = 400
+N_SHARDS = 3
+AUTHKEY = secrets.token_hex(16)
+
+
+@pytest.fixture(scope='module')
+def build(tmp_path_factory):
+    """A small build, its unsharded snapshot and a Coordinator over its shards, each served by its own process."""
+    root = tmp_path_factory.mktemp('shards')
+    csv_path = write_catalog(N_VIDEOS, str(root / 'catalog.csv'))
+    out_dir = str(root / 'artifacts')
+    build_artifacts(csv_path, out_dir, encoder=get_encoder('hashing'), workers=1)
+    snapshot = rec.build_snapshot(load_artifacts(out_dir, csv_path))
+    # Shards have no top-N table; the unsharded side must score live as well
+    assert snapshot.topn_table is None
+
+    processes, addresses = shards.start_local_shards(shards.split_build(out_dir, N_SHARDS, csv_path), authkey=AUTHKEY)
+    try:
+        coordinator = shards.Coordinator(addresses, AUTHKEY)
+        yield snapshot, coordinator, processes, addresses
+        coordinator.close()
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+@pytest.mark.parametrize('top_n', [1, 5, 20])
+def test_content_ranking_matches_unsharded(build, monkeypatch, top_n):
+    # Without the semantic blend both sides are exact (the unsharded ANN index is approximate)
+    monkeypatch.setattr(rec, 'SEMANTIC_WEIGHT', 0.0)
+    snapshot, coordinator, _, _ = build
+    catalog = snapshot.catalog
+    for video_id in catalog.video_id_list()[::7]:
+        rows, scores = rec._score_content(catalog.row_of(video_id), top_n, snapshot)
+        sharded_rows, sharded_scores, source = coordinator.content_ranking(video_id, top_n)
+        assert source['row'] == catalog.row_of(video_id)
+        np.testing.assert_array_equal(sharded_rows, rows)
+        np.testing.assert_allclose(sharded_scores, scores, rtol=1e-5)
+
+
+@pytest.mark.parametrize('top_n', [1, 5, 20])
+def test_hybrid_recommendation_matches_unsharded(build, monkeypatch, top_n):
+    monkeypatch.setattr(rec, 'SEMANTIC_WEIGHT', 0.0)
+    # Without an ALS model both sides draw engagement-ranked collaborative candidates; the same
+    # seed shuffles them the same way
+    monkeypatch.setattr(rec, 'get_als_model', lambda: None)
+    snapshot, coordinator, _, _ = build
+    for seed, video_id in enumerate(snapshot.catalog.video_id_list()[::11]):
+        np.random.seed(seed)
+        expected = rec.hybrid_recommendation(video_id, top_n, snapshot)
+        np.random.seed(seed)
+        recommendations = coordinator.hybrid_recommendation(video_id, top_n)
+        assert [rec_['id'] for rec_ in recommendations] == [rec_['id'] for rec_ in expected]
+        assert [{**rec_, 'score': None} for rec_ in recommendations] == [{**rec_, 'score': None} for rec_ in expected]
+        np.testing.assert_allclose([rec_['score'] for rec_ in recommendations], [rec_['score'] for rec_ in expected],
+                                   rtol=1e-5)
+
+
+def test_server_rankings_come_from_the_shards(build, monkeypatch):
+    monkeypatch.setattr(rec, 'SEMANTIC_WEIGHT', 0.0)
+    monkeypatch.setattr(rec, 'get_als_model', lambda: None)
+    snapshot, _, _, addresses = build
+    monkeypatch.setattr(shards, 'SHARD_ADDRESSES', ','.join(addresses))
+    monkeypatch.setattr(shards, 'SHARD_AUTHKEY', AUTHKEY)
+    monkeypatch.setattr(pagination, 'get_snapshot', lambda: snapshot)
+    coordinator = shards.get_coordinator()
+    assert coordinator is shards.get_coordinator() and coordinator.version == snapshot.version
+    try:
+        for seed, video_id in enumerate(snapshot.catalog.video_id_list()[::37]):
+            np.random.seed(seed)
+            ranking = pagination.get_ranking(video_id, snapshot)
+            np.random.seed(seed)
+            rows, scores = rec.ranked_candidates(video_id, pagination.RANKING_DEPTH, snapshot)
+            np.testing.assert_array_equal(ranking.rows, rows)
+            np.testing.assert_allclose(ranking.scores, scores, rtol=1e-5)
+    finally:
+        pagination.ranking_cache.clear()
+        coordinator.close()
+        monkeypatch.setattr(shards, '_coordinator', None)
+
+
+def test_authkey(build, monkeypatch):
+    _, coordinator, _, addresses = build
+    # Shards and coordinators do not start without a key, and reject a wrong one
+    monkeypatch.setattr(shards, 'SHARD_AUTHKEY', None)
+    with pytest.raises(shards.ShardError, match="YUGI_SHARD_AUTHKEY"):
+        shards.Coordinator(addresses)
+    with pytest.raises(shards.ShardError, match="YUGI_SHARD_AUTHKEY"):
+        shards.serve('unused')
+    with pytest.raises(shards.ShardError, match="failed"):
+        shards.ShardClient(addresses[0], 'wrong-key').call('info')
+    assert coordinator.clients[0].call('info')['shard'] == 0
+
+
+def test_wire_format():
+    message = ['ok', {'rows': np.arange(3, dtype=np.int32), 'lists': [(np.ones(2), 2.5, None)], 'id': ['a', 'b']}]
+    decoded = shards._decode(shards._encode(message))
+    np.testing.assert_array_equal(decoded[1]['rows'], message[1]['rows'])
+    assert decoded[1]['rows'].dtype == np.int32 and decoded[1]['id'] == ['a', 'b']
+    assert decoded[1]['lists'][0][1:] == [2.5, None]
+    with pytest.raises(TypeError):
+        shards._encode(['ok', np.array(['a'], dtype=object)])
+    forged = b'{"__ndarray__": ["|O", [1]]}'
+    with pytest.raises(ValueError):
+        shards._decode(len(forged).to_bytes(4, 'big') + forged + bytes(8))
+
+
+def test_unknown_video(build):
+    _, coordinator, _, _ = build
+    assert coordinator.content_ranking('no-such-video', 5) is None
+    assert coordinator.hybrid_recommendation('no-such-video', 5) == [{"error": "Video ID not found!"}]
+
+
+def test_shard_error_reply(build):
+    snapshot, coordinator, _, _ = build
+    client = coordinator.clients[0]
+    with pytest.raises(shards.ShardError, match="Unknown shard operation 'drop'"):
+        client.call('drop')
+    with pytest.raises(shards.ShardError, match="TypeError"):
+        client.call('lookup')
+    # The connection stays usable after an error reply
+    assert client.call('info')['shard'] == 0
+    video_id = snapshot.catalog.video_ids[0]
+    assert coordinator.lookup(video_id)['row'] == 0
+
+
+def test_unreachable_shard(build):
+    _, coordinator, processes, _ = build
+    address = coordinator.clients[-1].address
+    client = shards.ShardClient(f'{address[0]}:{address[1]}', AUTHKEY)
+    processes[-1].kill()
+    processes[-1].wait()
+    with pytest.raises(shards.ShardError, match="failed"):
+        client.call('info')